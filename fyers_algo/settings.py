@@ -7,6 +7,11 @@ env = environ.Env(
     # set casting and default value
     DEBUG=(bool, False),
     REDIS_URL=(str, 'redis://localhost:6379/0'),
+    REDIS_MAX_CONNECTIONS=(int, 50),
+    REDIS_HEALTH_CHECK_INTERVAL=(int, 30),
+    REDIS_POOL_TIMEOUT=(int, 10),
+    CANDLE_DATA_DIR=(str, ''),
+    STRATEGY_PLUGINS=(list, ['trading.strategies.BreakdownStrategy', 'trading.strategies.BreakdownScanner']),
     FYERS_APP_ID=(str, ''),
     FYERS_SECRET_KEY=(str, ''),
     FYERS_CALLBACK_URL=(str, '')
@@ -63,6 +68,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'fyers_algo.wsgi.application'
+ASGI_APPLICATION = 'fyers_algo.asgi.application'
 
 DATABASES = {
     'default': env.db_url(default='sqlite:///db.sqlite3')
@@ -96,4 +102,13 @@ LOGOUT_REDIRECT_URL = '/trading/login/'
 FYERS_APP_ID = env('FYERS_APP_ID')
 FYERS_SECRET_KEY = env('FYERS_SECRET_KEY')
 FYERS_CALLBACK_URL = env('FYERS_CALLBACK_URL')
-REDIS_URL = env('REDIS_URL')
\ No newline at end of file
+REDIS_URL = env('REDIS_URL')
+REDIS_MAX_CONNECTIONS = env('REDIS_MAX_CONNECTIONS')
+REDIS_HEALTH_CHECK_INTERVAL = env('REDIS_HEALTH_CHECK_INTERVAL')
+REDIS_POOL_TIMEOUT = env('REDIS_POOL_TIMEOUT')
+
+# Historical 1m candles (backtests); defaults to <project>/data/candles
+CANDLE_DATA_DIR = env('CANDLE_DATA_DIR') or str(BASE_DIR / 'data' / 'candles')
+
+# Strategies run by run_strategy_host (dotted paths to trading.strategy_host.StrategyPlugin subclasses)
+STRATEGY_PLUGINS = env('STRATEGY_PLUGINS')
@@ -0,0 +1,277 @@
+"""
+Trading accounts and the mirror fan-out.
+
+The primary account (FyersCredentials.objects.primary()) runs the strategy:
+its orders drive the StrategyTrade lifecycle as before. Every active mirror
+account copies each entry and exit, its quantity scaled by
+quantity_multiplier.
+
+Each account is an Account: its own FyersModel (token and keep-alive
+connection pool) behind its own order rate limiter, so one account hitting
+its limit never slows another. Mirror orders run on a thread pool and are
+submitted before the primary order is placed: one signal reaches every
+account in about the time of a single order, and the strategy waits for none
+of the mirrors.
+
+Mirror state lives in Redis:
+
+    mirror_positions:<trade_id>   hash  account id -> quantity entered and not yet exited
+    mirror_orders                 hash  '<account id>:<order id>' -> '<trade_id>:<leg>:<qty>'
+    mirror_exit_retries           zset  trade_id -> when its failed mirror exits are due again
+    mirror_exit_attempts          hash  trade_id -> failed mirror exits so far (sets the backoff)
+
+An exit goes only to the accounts still listed for the trade, and HDEL claims
+each one: a retried exit never doubles up, and an account whose entry failed
+or was rejected (run_order_socket drops it from the list) is never sent a
+naked buy. Accounts are loaded when the worker starts.
+
+A mirror exit that fails to place, or is rejected later, puts the account
+back on the trade and schedules a retry. The primary's exit may have filled
+by then, so no next exit of the trade would ever come: MirrorSweeper exits
+the accounts of every due trade that is no longer live, with backoff, until
+none holds anything.
+"""
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from django.db import connections
+from trading.models import FyersCredentials, StrategyTrade
+from trading.trade_store import LIVE_STATUSES
+from trading.fyers_auth_util import get_fyers_client
+from trading.candle_backfill import RateLimiter
+from trading.redis_client import r
+
+logger = logging.getLogger('accounts')
+
+ORDER_RATE = 10 # Orders per second per account (Fyers order API limit)
+ORDER_POOL_SIZE = 4 # Keep-alive HTTP connections per account
+FANOUT_WORKERS = 32 # Mirror orders in flight at once, all accounts together
+POSITIONS_KEY = "mirror_positions:{}"
+MIRROR_ORDERS_KEY = "mirror_orders"
+RETRY_KEY = "mirror_exit_retries"
+RETRY_ATTEMPTS_KEY = "mirror_exit_attempts"
+LEDGER_TTL = 2 * 86400
+RETRY_BACKOFF = 2 # Seconds before the first retry of a failed mirror exit, doubled per failure
+RETRY_BACKOFF_MAX = 300
+SWEEP_INTERVAL = 5 # Seconds between MirrorSweeper passes
+
+
+def retry_delay(attempt):
+    return min(RETRY_BACKOFF * 2 ** (attempt - 1), RETRY_BACKOFF_MAX)
+
+
+class Account:
+    """
+    One Fyers account. Stands in for its FyersModel: place_order() waits for
+    the account's rate limiter, everything else goes straight to the client.
+    """
+
+    def __init__(self, creds, client=None, rate=ORDER_RATE):
+        self.id = creds.id
+        self.app_id = creds.app_id
+        self.multiplier = float(creds.quantity_multiplier)
+        self.client = client or get_fyers_client(creds.access_token, app_id=creds.app_id, pool_size=ORDER_POOL_SIZE)
+        self.limiter = RateLimiter(rate)
+
+    def __repr__(self):
+        return f"<Account {self.id} {self.app_id}>"
+
+    def __getattr__(self, name):
+        if name == 'client':
+            raise AttributeError(name)
+        return getattr(self.client, name)
+
+    def place_order(self, data):
+        self.limiter.acquire()
+        return self.client.place_order(data=data)
+
+    def scale(self, qty):
+        return max(1, int(qty * self.multiplier))
+
+
+def load_mirror_accounts():
+    return [Account(creds) for creds in FyersCredentials.objects.mirrors()]
+
+
+class MirrorLedger:
+    """Redis side of the mirror accounts (see the module docstring). Safe from any thread."""
+
+    def __init__(self, client=None):
+        self.r = client or r
+
+    def opened(self, trade_id, account_id, qty, order_id):
+        """Entry order accepted: the account holds `qty` until its exit is placed."""
+        pipe = self.r.pipeline(transaction=False)
+        pipe.hset(POSITIONS_KEY.format(trade_id), account_id, qty)
+        pipe.expire(POSITIONS_KEY.format(trade_id), LEDGER_TTL)
+        self._index(pipe, account_id, order_id, trade_id, 'entry', qty)
+        pipe.execute()
+
+    def claim(self, trade_id, account_id):
+        """Take the account's open quantity off the trade (None if there is nothing to exit)."""
+        pipe = self.r.pipeline(transaction=True)
+        pipe.hget(POSITIONS_KEY.format(trade_id), account_id)
+        pipe.hdel(POSITIONS_KEY.format(trade_id), account_id)
+        qty, _ = pipe.execute()
+        return int(qty) if qty is not None else None
+
+    def restore(self, trade_id, account_id, qty):
+        """Exit failed or died: the account holds `qty` again and the exit is retried (MirrorSweeper)."""
+        attempt = self.r.hincrby(RETRY_ATTEMPTS_KEY, trade_id, 1)
+        pipe = self.r.pipeline(transaction=False)
+        pipe.hset(POSITIONS_KEY.format(trade_id), account_id, qty)
+        pipe.expire(POSITIONS_KEY.format(trade_id), LEDGER_TTL)
+        pipe.zadd(RETRY_KEY, {trade_id: time.time() + retry_delay(attempt)})
+        pipe.expire(RETRY_KEY, LEDGER_TTL)
+        pipe.expire(RETRY_ATTEMPTS_KEY, LEDGER_TTL)
+        pipe.execute()
+
+    def due(self, now=None):
+        """Trades with failed mirror exits whose retry is due."""
+        return [int(tid) for tid in self.r.zrangebyscore(RETRY_KEY, '-inf', now or time.time())]
+
+    def postpone(self, trade_id, now=None):
+        """Check the trade again after the backoff of its failures so far."""
+        attempt = int(self.r.hget(RETRY_ATTEMPTS_KEY, trade_id) or 1)
+        self.r.zadd(RETRY_KEY, {trade_id: (now or time.time()) + retry_delay(attempt)})
+
+    def holding(self, trade_id):
+        """Accounts still holding a quantity of the trade."""
+        return self.r.hlen(POSITIONS_KEY.format(trade_id))
+
+    def settled(self, trade_id):
+        """Every mirror account is out of the trade: stop retrying it."""
+        pipe = self.r.pipeline(transaction=False)
+        pipe.zrem(RETRY_KEY, trade_id)
+        pipe.hdel(RETRY_ATTEMPTS_KEY, trade_id)
+        pipe.execute()
+
+    def exited(self, trade_id, account_id, qty, order_id):
+        pipe = self.r.pipeline(transaction=False)
+        self._index(pipe, account_id, order_id, trade_id, 'exit', qty)
+        pipe.execute()
+
+    def _index(self, pipe, account_id, order_id, trade_id, leg, qty):
+        pipe.hset(MIRROR_ORDERS_KEY, f"{account_id}:{order_id}", f"{trade_id}:{leg}:{qty}")
+        pipe.expire(MIRROR_ORDERS_KEY, LEDGER_TTL)
+
+    def resolve(self, account_id, order_ids):
+        """{order_id: (trade_id, leg, qty)} for the account's orders placed by the fan-out."""
+        if not order_ids:
+            return {}
+        values = self.r.hmget(MIRROR_ORDERS_KEY, [f"{account_id}:{oid}" for oid in order_ids])
+        resolved = {}
+        for oid, value in zip(order_ids, values):
+            if value:
+                trade_id, leg, qty = value.decode('utf-8').split(':')
+                resolved[oid] = (int(trade_id), leg, int(qty))
+        return resolved
+
+
+class MirrorFanout:
+    """
+    Copies the primary's entries and exits to the mirror accounts.
+    place(account, symbol, qty, side) places one market order and returns its id (None on failure).
+    """
+
+    def __init__(self, accounts, place, client=None, workers=FANOUT_WORKERS):
+        self.accounts = accounts
+        self.place = place
+        self.ledger = MirrorLedger(client)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='mirror') if accounts else None
+        self.entries = {} # (trade_id, account id) -> future of the entry order: its exit waits for it
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.accounts)
+
+    def entry(self, trade_id, symbol, qty, side):
+        """Submit the entry to every account; returns at once."""
+        for account in self.accounts:
+            future = self.pool.submit(self._entry, account, trade_id, symbol, account.scale(qty), side)
+            with self.lock:
+                self.entries[(trade_id, account.id)] = future
+
+    def exit(self, trade_id, symbol, side):
+        """Submit the exit to every account still holding the trade; returns at once."""
+        for account in self.accounts:
+            with self.lock:
+                entry = self.entries.pop((trade_id, account.id), None)
+            self.pool.submit(self._exit, account, trade_id, symbol, side, entry)
+
+    def _entry(self, account, trade_id, symbol, qty, side):
+        try:
+            oid = self.place(account, symbol, qty, side)
+            if oid:
+                self.ledger.opened(trade_id, account.id, qty, oid)
+                logger.info(f"Mirror entry {account.app_id}: {symbol} x{qty} | Order: {oid}")
+            else:
+                logger.error(f"Mirror entry failed on {account.app_id}: {symbol} x{qty} (trade {trade_id})")
+        except Exception as e:
+            logger.error(f"Mirror entry error on {account.app_id} ({symbol}): {e}")
+
+    def _exit(self, account, trade_id, symbol, side, entry):
+        try:
+            if entry:
+                wait([entry]) # Never overtake our own entry
+            qty = self.ledger.claim(trade_id, account.id)
+            if qty is None:
+                return
+            oid = self.place(account, symbol, qty, side)
+            if oid:
+                self.ledger.exited(trade_id, account.id, qty, oid)
+                logger.info(f"Mirror exit {account.app_id}: {symbol} x{qty} | Order: {oid}")
+            else:
+                self.ledger.restore(trade_id, account.id, qty)
+                logger.error(f"Mirror exit failed on {account.app_id}: {symbol} x{qty} (trade {trade_id}), retrying")
+        except Exception as e:
+            logger.error(f"Mirror exit error on {account.app_id} ({symbol}): {e}")
+
+
+class MirrorSweeper(threading.Thread):
+    """
+    Retries failed mirror exits every `interval` seconds. A trade that is still
+    live is left to the primary's next exit (which takes the accounts along);
+    one that is not gets its remaining accounts exited by the fan-out.
+    """
+
+    def __init__(self, fanout, store, interval=SWEEP_INTERVAL):
+        super().__init__(name='mirror_sweeper', daemon=True)
+        self.fanout = fanout
+        self.store = store
+        self.interval = interval
+
+    def run(self):
+        try:
+            while True:
+                try:
+                    self.sweep()
+                except Exception as e:
+                    logger.error(f"Mirror Sweeper Error: {e}")
+                time.sleep(self.interval)
+        finally:
+            connections.close_all()
+
+    def sweep(self, now=None):
+        """Submit the exits of every due trade that is no longer live. Returns their ids."""
+        ledger = self.fanout.ledger
+        flattened = []
+        for trade_id in ledger.due(now):
+            if not ledger.holding(trade_id):
+                ledger.settled(trade_id)
+                continue
+            ledger.postpone(trade_id, now) # Checked again even if this exit fails before it can reschedule
+            trade = self.store.get(trade_id)
+            if trade and trade['status'] in LIVE_STATUSES:
+                continue
+            # Closed trades leave Redis after a day; the DB still knows the symbol
+            symbol = trade['symbol'] if trade else StrategyTrade.objects.filter(id=trade_id).values_list('symbol', flat=True).first()
+            if symbol is None:
+                ledger.settled(trade_id)
+                logger.critical(f"Mirror accounts still hold unknown trade {trade_id}. Flatten them by hand.")
+                continue
+            logger.warning(f"Trade {trade_id} is {trade['status'] if trade else 'gone'}: exiting its mirror accounts")
+            self.fanout.exit(trade_id, symbol, 1)
+            flattened.append(trade_id)
+        return flattened
@@ -1,3 +1,9 @@
 from django.contrib import admin
+from .models import FyersCredentials
 
-# Register your models here.
+
+@admin.register(FyersCredentials)
+class FyersCredentialsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'app_id', 'is_active', 'is_mirror', 'quantity_multiplier', 'updated_at')
+    list_editable = ('is_active', 'is_mirror', 'quantity_multiplier')
+    exclude = ('secret_key', 'access_token')
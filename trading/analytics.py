@@ -0,0 +1,181 @@
+"""
+Pre-aggregated strategy analytics.
+
+Every closed trade adds its numbers to three buckets: `all`, `symbol:<SYMBOL>`
+and `hour:<HH>` (local hour the setup was created). Each bucket is a Redis hash
+of running sums (`analytics:<bucket>`), updated with HINCRBYFLOAT. Ratios (win
+rate, average R, slippage) are derived from the sums on read, so an update is
+O(1) and a read never touches the trade table.
+
+The transition script that closes a trade also adds it to `trades_closed`, in
+the same atomic step. The order socket then counts each listed trade with
+RECORD_LUA, which flags the trade hash (`recorded`) in the same script: a
+crash before the count leaves the trade listed for the next run, and a retry
+never counts it twice.
+
+rebuild() recomputes every bucket from the DB (hot table + archive) and swaps
+them in atomically; run it after changing the formulas or if counters drift.
+"""
+import json
+from datetime import datetime
+from django.utils import timezone
+from trading.trade_store import CLOSED_KEY
+
+ANALYTICS_PREFIX = "analytics:"
+ANALYTICS_BUCKETS_KEY = "analytics:buckets" # Set of bucket hash keys
+ANALYTICS_CACHE_KEY = "analytics:summary" # Rendered JSON for the endpoint
+ANALYTICS_CACHE_TTL = 5 # Seconds
+
+SUM_FIELDS = (
+    'trades', 'wins', 'pnl', 'gross_win', 'gross_loss',
+    'r_sum', 'r_count', 'slippage_sum', 'slippage_bps_sum', 'slippage_count',
+)
+
+# KEYS[1] closed trades set, KEYS[2] trade hash, KEYS[3] bucket set, KEYS[4] summary cache,
+# KEYS[5..] bucket hashes. ARGV[1] trade id, then the trade's sums as field/value pairs.
+# Takes the trade off the closed set; returns 1 if it was counted now, 0 if it already was
+# (or its hash is gone).
+RECORD_LUA = """
+redis.call('SREM', KEYS[1], ARGV[1])
+if redis.call('EXISTS', KEYS[2]) == 0 or redis.call('HSETNX', KEYS[2], 'recorded', '1') == 0 then
+    return 0
+end
+for k = 5, #KEYS do
+    for i = 2, #ARGV, 2 do
+        redis.call('HINCRBYFLOAT', KEYS[k], ARGV[i], ARGV[i + 1])
+    end
+    redis.call('SADD', KEYS[3], KEYS[k])
+end
+redis.call('DEL', KEYS[4])
+return 1
+"""
+
+
+def _as_float(value):
+    return float(value) if value is not None else None
+
+
+def trade_sums(trade):
+    """Contribution of one CLOSED trade (trade store dict or DB values() row) to each bucket."""
+    pnl = _as_float(trade.get('pnl')) or 0.0
+    sums = {'trades': 1, 'wins': 1 if pnl > 0 else 0, 'pnl': pnl}
+    if pnl > 0:
+        sums['gross_win'] = pnl
+    elif pnl < 0:
+        sums['gross_loss'] = -pnl
+
+    # 1R = distance from entry trigger to the stop the trade was opened with
+    entry_level = _as_float(trade.get('entry_level'))
+    initial_stop = _as_float(trade.get('initial_stop_loss'))
+    quantity = trade.get('quantity') or 0
+    if entry_level and initial_stop and initial_stop > entry_level and quantity:
+        sums['r_sum'] = pnl / ((initial_stop - entry_level) * quantity)
+        sums['r_count'] = 1
+
+    # Entry slippage of a SELL: filling below the trigger is adverse (positive)
+    fill = _as_float(trade.get('actual_entry_price'))
+    if entry_level and fill:
+        sums['slippage_sum'] = entry_level - fill
+        sums['slippage_bps_sum'] = (entry_level - fill) / entry_level * 10000
+        sums['slippage_count'] = 1
+    return sums
+
+
+def trade_buckets(trade):
+    created = trade.get('created_at')
+    if isinstance(created, str):
+        created = datetime.fromisoformat(created) if created else None
+    buckets = ['all', f"symbol:{trade['symbol']}"]
+    if created:
+        buckets.append(f"hour:{timezone.localtime(created).hour:02d}")
+    return buckets
+
+
+def record_closes(store):
+    """Count every trade listed in `trades_closed` into the buckets, each once. Returns the number counted."""
+    ids = sorted(int(tid) for tid in store.r.smembers(CLOSED_KEY))
+    if not ids:
+        return 0
+    trades = store.get_many(ids)
+    script = store.r.register_script(RECORD_LUA)
+    pipe = store.r.pipeline(transaction=False)
+    for tid in ids:
+        trade = trades.get(tid)
+        if trade is None:
+            pipe.srem(CLOSED_KEY, tid) # Expired before it could be counted: rebuild() picks it up from the DB
+            continue
+        buckets = [ANALYTICS_PREFIX + bucket for bucket in trade_buckets(trade)]
+        args = [tid] + [x for field, value in trade_sums(trade).items() for x in (field, value)]
+        script(keys=[CLOSED_KEY, f"trade:{tid}", ANALYTICS_BUCKETS_KEY, ANALYTICS_CACHE_KEY] + buckets, args=args, client=pipe)
+    return sum(1 for result in pipe.execute() if result == 1)
+
+
+def rebuild(r, trades):
+    """Recompute all buckets from an iterable of CLOSED trades. Returns the number of trades."""
+    buckets = {}
+    count = 0
+    for trade in trades:
+        count += 1
+        sums = trade_sums(trade)
+        for bucket in trade_buckets(trade):
+            totals = buckets.setdefault(ANALYTICS_PREFIX + bucket, dict.fromkeys(SUM_FIELDS, 0))
+            for field, value in sums.items():
+                totals[field] += value
+
+    # Swap in one MULTI/EXEC so readers never see a half-built set
+    old = r.smembers(ANALYTICS_BUCKETS_KEY)
+    pipe = r.pipeline(transaction=True)
+    for key in old:
+        pipe.delete(key)
+    pipe.delete(ANALYTICS_BUCKETS_KEY, ANALYTICS_CACHE_KEY)
+    for key, totals in buckets.items():
+        pipe.hset(key, mapping=totals)
+        pipe.sadd(ANALYTICS_BUCKETS_KEY, key)
+    pipe.execute()
+    return count
+
+
+def derive(sums):
+    """Running sums -> the numbers the dashboard shows."""
+    trades = sums.get('trades', 0)
+    r_count = sums.get('r_count', 0)
+    slippage_count = sums.get('slippage_count', 0)
+    gross_loss = sums.get('gross_loss', 0)
+    return {
+        'trades': int(trades),
+        'wins': int(sums.get('wins', 0)),
+        'win_rate': round(sums.get('wins', 0) / trades * 100, 2) if trades else None,
+        'pnl': round(sums.get('pnl', 0), 2),
+        'avg_pnl': round(sums.get('pnl', 0) / trades, 2) if trades else None,
+        'profit_factor': round(sums.get('gross_win', 0) / gross_loss, 2) if gross_loss else None,
+        'avg_r': round(sums.get('r_sum', 0) / r_count, 3) if r_count else None,
+        'avg_slippage': round(sums.get('slippage_sum', 0) / slippage_count, 4) if slippage_count else None,
+        'avg_slippage_bps': round(sums.get('slippage_bps_sum', 0) / slippage_count, 2) if slippage_count else None,
+    }
+
+
+def summary_json(r):
+    """{'all': {...}, 'by_symbol': {...}, 'by_hour': {...}} as JSON, cached for ANALYTICS_CACHE_TTL."""
+    cached = r.get(ANALYTICS_CACHE_KEY)
+    if cached:
+        return cached.decode('utf-8')
+
+    keys = sorted(k.decode('utf-8') for k in r.smembers(ANALYTICS_BUCKETS_KEY))
+    pipe = r.pipeline(transaction=False)
+    for key in keys:
+        pipe.hgetall(key)
+
+    summary = {'all': derive({}), 'by_symbol': {}, 'by_hour': {}}
+    for key, raw in zip(keys, pipe.execute()):
+        stats = derive({k.decode('utf-8'): float(v) for k, v in raw.items()})
+        bucket = key[len(ANALYTICS_PREFIX):]
+        if bucket == 'all':
+            summary['all'] = stats
+        elif bucket.startswith('symbol:'):
+            summary['by_symbol'][bucket[len('symbol:'):]] = stats
+        elif bucket.startswith('hour:'):
+            summary['by_hour'][bucket[len('hour:'):]] = stats
+
+    payload = json.dumps(summary)
+    r.set(ANALYTICS_CACHE_KEY, payload, ex=ANALYTICS_CACHE_TTL)
+    return payload
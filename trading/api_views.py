@@ -0,0 +1,196 @@
+"""
+Read-only JSON API (trades, scans, positions).
+
+Lists are keyset paginated: `?cursor=` is an opaque token for the last row of
+the previous page ((created_at, id) for trades, (scan_time, id) for scans), so
+every page is an index range scan, never an OFFSET. `?fields=a,b` projects the
+columns; `?limit=` caps the page size.
+
+Rendered responses are cached in Redis under the full request URL: the first
+page for a few seconds, cursor pages (history) longer. Every response carries
+an ETag and If-None-Match gets a 304, so a repeat request costs one Redis read
+and no DB query.
+"""
+import json
+import base64
+import hashlib
+from datetime import datetime
+from decimal import Decimal
+from functools import wraps
+from django.db.models import Q
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.http import require_GET
+from .models import StrategyTrade, LiveScanResult
+from .redis_client import r
+from .mtm import MTM_POSITIONS_KEY, MTM_PORTFOLIO_KEY
+
+TRADE_FIELDS = (
+    'id', 'symbol', 'status', 'candle_timestamp', 'entry_level', 'stop_loss', 'initial_stop_loss',
+    'target_price', 'quantity', 'entry_order_id', 'exit_order_id', 'actual_entry_price',
+    'actual_exit_price', 'is_breakeven_moved', 'pnl', 'exit_reason', 'created_at',
+)
+SCAN_FIELDS = ('id', 'symbol', 'pattern', 'scan_time')
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+HEAD_TTL = 5 # First page: live data, short cache
+PAGE_TTL = 300 # Cursor pages: older rows, rarely change
+POSITIONS_TTL = 1
+
+
+class BadRequest(Exception):
+    pass
+
+
+def api_superuser_required(view):
+    """Like superuser_required, but answers JSON 403 instead of redirecting to the login page."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        user = request.user
+        if not (user.is_authenticated and user.is_active and user.is_superuser):
+            return JsonResponse({'error': 'Forbidden'}, status=403)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def cached_json(ttl_for):
+    """
+    Serve from the Redis cache when possible. The view returns (payload, ttl);
+    ttl_for(request) decides the TTL without running the view.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = "api:" + hashlib.sha1(request.get_full_path().encode('utf-8')).hexdigest()
+            cached = r.hgetall(key)
+            if cached:
+                body, etag = cached[b'body'], cached[b'etag'].decode('utf-8')
+            else:
+                try:
+                    payload = view(request, *args, **kwargs)
+                except BadRequest as e:
+                    return JsonResponse({'error': str(e)}, status=400)
+                body = json.dumps(payload, default=_json_default).encode('utf-8')
+                etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+                pipe = r.pipeline(transaction=True)
+                pipe.hset(key, mapping={'body': body, 'etag': etag})
+                pipe.expire(key, ttl_for(request))
+                pipe.execute()
+
+            if request.headers.get('If-None-Match') == etag:
+                response = HttpResponse(status=304)
+            else:
+                response = HttpResponse(body, content_type='application/json')
+            response['ETag'] = etag
+            response['Cache-Control'] = f"private, max-age={ttl_for(request)}"
+            return response
+        return wrapper
+    return decorator
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _page_ttl(request):
+    return PAGE_TTL if request.GET.get('cursor') else HEAD_TTL
+
+
+def _limit(request):
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise BadRequest("limit must be an integer")
+    return max(1, min(MAX_LIMIT, limit))
+
+
+def _fields(request, allowed):
+    """Requested projection; the keyset columns are always selected (needed for the next cursor)."""
+    raw = request.GET.get('fields')
+    if not raw:
+        return list(allowed)
+    fields = [f for f in raw.split(',') if f]
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise BadRequest(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def encode_cursor(ts, row_id):
+    return base64.urlsafe_b64encode(json.dumps([ts.isoformat(), row_id]).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        ts, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.fromisoformat(ts), int(row_id)
+    except (ValueError, TypeError):
+        raise BadRequest("Invalid cursor")
+
+
+def keyset_page(queryset_for, ts_field, request, allowed):
+    """
+    queryset_for(*q) must apply the Q filters and return a queryset that can be
+    ordered and projected. Returns {'results': [...], 'next_cursor': str|None}.
+    """
+    limit = _limit(request)
+    fields = _fields(request, allowed)
+    filters = []
+    cursor = request.GET.get('cursor')
+    if cursor:
+        ts, row_id = decode_cursor(cursor)
+        filters.append(Q(**{f"{ts_field}__lt": ts}) | Q(**{ts_field: ts, 'id__lt': row_id}))
+
+    selected = list(dict.fromkeys(fields + [ts_field, 'id']))
+    rows = list(queryset_for(*filters).values(*selected).order_by(f"-{ts_field}", '-id')[:limit + 1])
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][ts_field], rows[-1]['id'])
+    return {
+        'results': [{f: row[f] for f in fields} for row in rows],
+        'next_cursor': next_cursor,
+    }
+
+
+# =========================================================================
+# ENDPOINTS
+# =========================================================================
+@require_GET
+@api_superuser_required
+@cached_json(_page_ttl)
+def trades_api(request):
+    """Trades, newest first, across the hot table and the archive. Filters: ?symbol= ?status="""
+    filters = {k: request.GET[k] for k in ('symbol', 'status') if request.GET.get(k)}
+    return keyset_page(
+        lambda *q: StrategyTrade.history.combined(*q, **filters), 'created_at', request, TRADE_FIELDS
+    )
+
+
+@require_GET
+@api_superuser_required
+@cached_json(_page_ttl)
+def scans_api(request):
+    """Scanner hits, newest first. Filter: ?symbol="""
+    filters = {'symbol': request.GET['symbol']} if request.GET.get('symbol') else {}
+    return keyset_page(
+        lambda *q: LiveScanResult.objects.filter(*q, **filters), 'scan_time', request, SCAN_FIELDS
+    )
+
+
+@require_GET
+@api_superuser_required
+@cached_json(lambda request: POSITIONS_TTL)
+def positions_api(request):
+    """Open positions and session P&L as last published by the MTM engine (Redis only)."""
+    positions = {k.decode('utf-8'): json.loads(v) for k, v in r.hgetall(MTM_POSITIONS_KEY).items()}
+    portfolio = {k.decode('utf-8'): v.decode('utf-8') for k, v in r.hgetall(MTM_PORTFOLIO_KEY).items()}
+    return {
+        'positions': positions,
+        'portfolio': {k: v if k == 'day' else float(v) for k, v in portfolio.items()},
+    }
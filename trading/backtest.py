@@ -0,0 +1,318 @@
+"""
+Backtest of the cash breakdown strategy on historical 1m candles.
+
+The rules are the live ones (run_algo_worker.on_candle / on_tick): a signal is
+a candle that opens above the previous day's low and closes below it with a
+turnover above 1 Cr (and, when min_relative_volume is set, at least that many
+times the average volume of the 20 candles before it); entry at low * 0.9998,
+stop at high * 1.0002, target at entry - risk * risk_reward_ratio, stop to
+breakeven once price has moved breakeven_trigger_r * risk in favour. Setup
+lifetime, session end, the per-symbol and per-day limits and the notional cap
+come from GlobalTradingSettings.
+
+Candles give four prices per minute, so intrabar order is resolved
+conservatively:
+- an entry fills at the trigger, or at the open if the bar gapped through it
+- on the bar where the position opens (or the stop moves to breakeven) only
+  the close is known to come after the change
+- a bar that touches both stop and target is a stop
+- positions still open on the last bar of the day close at its close
+
+Symbols are independent: signal detection is vectorized over a symbol's whole
+history and every setup is resolved with array scans, one symbol per task on
+a process pool. max_trades_per_day spans symbols, so it is applied afterwards
+in entry order. The open exposure and daily loss limits are not modelled.
+"""
+import csv
+import logging
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from trading.candle_store import open_store
+from trading.indicators import relative_volume
+
+logger = logging.getLogger('backtest')
+
+TURNOVER_MIN = 10000000 # Same filters and buffers as run_algo_worker.on_candle
+ENTRY_BUFFER = 0.9998
+STOP_BUFFER = 1.0002
+
+CANDLE_FIELDS = ('ts', 'open', 'high', 'low', 'close', 'volume')
+HISTORY_WINDOW_DAYS = 100 # Longest range fyers.history serves at 1m resolution
+
+# StrategyTrade columns, plus when the setup triggered and the position closed
+LEDGER_FIELDS = (
+    'symbol', 'status', 'candle_timestamp', 'candle_open', 'candle_high', 'candle_low', 'candle_close',
+    'prev_day_low', 'entry_level', 'stop_loss', 'initial_stop_loss', 'target_price', 'quantity',
+    'actual_entry_price', 'actual_exit_price', 'is_breakeven_moved', 'pnl', 'exit_reason', 'created_at',
+    'entry_time', 'exit_time',
+)
+TIME_FIELDS = ('candle_timestamp', 'created_at', 'entry_time', 'exit_time')
+
+
+def params_from_settings(settings_db):
+    """The strategy knobs of a GlobalTradingSettings row as plain numbers (cheap to send to workers)."""
+    return {
+        'risk_reward_ratio': float(settings_db.risk_reward_ratio),
+        'breakeven_trigger_r': float(settings_db.breakeven_trigger_r),
+        'risk_per_trade_amount': float(settings_db.risk_per_trade_amount),
+        'max_trades_per_day': settings_db.max_trades_per_day,
+        'max_trades_per_symbol': settings_db.max_trades_per_symbol,
+        'max_notional_per_trade': float(settings_db.max_notional_per_trade or 0),
+        'setup_lifetime_minutes': settings_db.setup_lifetime_minutes,
+        'session_end_minute': settings_db.session_end_time.hour * 60 + settings_db.session_end_time.minute,
+        'min_relative_volume': float(settings_db.min_relative_volume or 0),
+    }
+
+
+def session_range(date_from, date_to, tz):
+    """'YYYY-MM-DD' bounds (either may be None) -> [start_ts, end_ts) epoch seconds. ValueError if malformed."""
+    start = datetime.strptime(date_from, '%Y-%m-%d').replace(tzinfo=tz) if date_from else None
+    end = datetime.strptime(date_to, '%Y-%m-%d').replace(tzinfo=tz) + timedelta(days=1) if date_to else None
+    return (int(start.timestamp()) if start else None), (int(end.timestamp()) if end else None)
+
+
+# =========================================================================
+# CANDLES
+# =========================================================================
+def load_candles(data_dir, symbol, start_ts=None, end_ts=None, utc_offset=0):
+    """{field: array} for ts in [start_ts, end_ts) from the candle store, or None when the symbol is not in it."""
+    return open_store(data_dir, utc_offset).history(symbol, start_ts, end_ts)
+
+
+def candles_from_rows(rows):
+    """fyers.history rows [[ts, o, h, l, c, v], ...] -> sorted, de-duplicated arrays."""
+    data = np.asarray(rows, dtype=np.float64).reshape(-1, 6)
+    ts, first = np.unique(data[:, 0].astype(np.int64), return_index=True)
+    data = data[first]
+    candles = {'ts': ts}
+    for col, field in enumerate(CANDLE_FIELDS[1:], start=1):
+        candles[field] = data[:, col]
+    return candles
+
+
+def fetch_history(history, symbol, start, end, limiter):
+    """1m candles for the dates start..end, one history(params) call per HISTORY_WINDOW_DAYS."""
+    rows = []
+    day = start
+    while day <= end:
+        to = min(end, day + timedelta(days=HISTORY_WINDOW_DAYS - 1))
+        limiter.acquire()
+        response = history({
+            "symbol": symbol,
+            "resolution": "1",
+            "date_format": "1",
+            "range_from": day.isoformat(),
+            "range_to": to.isoformat(),
+            "cont_flag": "1"
+        })
+        if response.get('s') not in ('ok', 'no_data'):
+            raise ValueError(response.get('message') or response)
+        rows.extend(response.get('candles', []))
+        day = to + timedelta(days=1)
+    return candles_from_rows(rows)
+
+
+# =========================================================================
+# SIMULATION (one symbol)
+# =========================================================================
+def _first(mask):
+    """Index of the first True, or len(mask) when there is none."""
+    i = int(mask.argmax()) if mask.size else 0
+    return i if mask.size and mask[i] else mask.size
+
+
+def day_layout(ts, utc_offset):
+    """Per bar: session day index and local minute of day; plus the first/last+1 bar of each day."""
+    local = ts + utc_offset
+    day = local // 86400
+    starts = np.flatnonzero(np.r_[True, day[1:] != day[:-1]])
+    ends = np.r_[starts[1:], len(ts)]
+    day_id = np.repeat(np.arange(len(starts)), ends - starts)
+    return day_id, (local % 86400) // 60, starts, ends
+
+
+def detect_signals(c, day_id, day_starts, min_relative_volume=0):
+    """
+    Bar indexes of all signals, each signal's rank within its day (the live
+    count check creates a setup only while rank < max_trades_per_symbol), and
+    the previous day's low of every bar.
+    """
+    prev_low = np.r_[np.nan, np.minimum.reduceat(c['low'], day_starts)[:-1]]
+    pdl = prev_low[day_id]
+    with np.errstate(invalid='ignore'):
+        signal = (c['open'] > pdl) & (c['close'] < pdl) & (c['volume'] * c['close'] > TURNOVER_MIN)
+        if min_relative_volume:
+            signal &= relative_volume(c['volume']) >= min_relative_volume # IndicatorBank.relative_volume, live
+    idx = np.flatnonzero(signal)
+    d = day_id[idx]
+    pos = np.arange(idx.size)
+    group_start = np.maximum.accumulate(np.where(np.r_[True, d[1:] != d[:-1]], pos, 0)) if idx.size else pos
+    return idx, pos - group_start, pdl
+
+
+def find_setups(c, params, utc_offset, max_per_symbol):
+    """
+    Signal detection and entry triggers: everything that does not depend on
+    target, breakeven or size. Yields one tuple per setup:
+    (bar, rank in day, entry level, stop, last bar+1 of the day, entry bar or None,
+    fill or None, previous day low).
+    """
+    ts = c['ts']
+    day_id, minute, day_starts, day_ends = day_layout(ts, utc_offset)
+    idx, rank, pdl = detect_signals(c, day_id, day_starts, params.get('min_relative_volume', 0))
+    lifetime = params['setup_lifetime_minutes'] * 60
+    for i, k in zip(idx[rank < max_per_symbol], rank[rank < max_per_symbol]):
+        entry = c['low'][i] * ENTRY_BUFFER
+        stop = c['high'][i] * STOP_BUFFER
+        end = day_ends[day_id[i]]
+
+        # Trigger window: the rest of the day, cut at session end and at the setup lifetime
+        last = i + 1 + np.searchsorted(minute[i + 1:end], params['session_end_minute'])
+        if lifetime:
+            last = min(last, np.searchsorted(ts, int(ts[i]) + 60 + lifetime))
+        hit = _first(c['low'][i + 1:last] <= entry)
+        if hit == max(0, last - i - 1):
+            yield i, k, entry, stop, end, None, None, pdl[i]
+        else:
+            e = i + 1 + hit
+            yield i, k, entry, stop, end, e, min(c['open'][e], entry), pdl[i]
+
+
+def manage_position(c, e, end, fill, stop, target, be_r):
+    """
+    Exit of a short opened on bar e at `fill` (independent of size, so the
+    sweep runs it once per target / breakeven combination).
+    Returns (exit bar, exit price, reason, breakeven moved, final stop).
+    """
+    o, h, l, cl = c['open'], c['high'], c['low'], c['close']
+    be_level = fill - (stop - fill) * be_r
+    moved = False
+
+    # Entry bar: only the close is known to come after the fill
+    if cl[e] >= stop:
+        return e, stop, 'Stop Loss', moved, stop
+    if cl[e] <= target:
+        return e, target, 'Target', moved, stop
+    if cl[e] <= be_level:
+        stop, moved = fill, True
+
+    start = e + 1
+    while True:
+        stop_at = _first(h[start:end] >= stop)
+        target_at = _first(l[start:end] <= target)
+        exit_at = min(stop_at, target_at)
+        if not moved:
+            be_at = _first(l[start:end] <= be_level)
+            if be_at < exit_at:
+                stop, moved = fill, True
+                j = start + be_at
+                if cl[j] >= stop:
+                    return j, stop, 'Stop Loss', moved, stop
+                start = j + 1
+                continue
+
+        if exit_at == end - start:
+            return end - 1, cl[end - 1], 'Session End', moved, stop
+        j = start + exit_at
+        if stop_at <= target_at:
+            return j, max(o[j], stop), 'Stop Loss', moved, stop
+        return j, min(o[j], target), 'Target', moved, stop
+
+
+def simulate_symbol(symbol, c, params, utc_offset):
+    """All setups and trades of one symbol. Times in the result are epoch seconds."""
+    ts = c['ts']
+    if len(ts) < 2:
+        return []
+    notional_cap = params['max_notional_per_trade']
+    trades = []
+    for i, _, entry, stop, end, e, fill, pdl in find_setups(c, params, utc_offset, params['max_trades_per_symbol']):
+        risk = stop - entry
+        qty = max(1, int(params['risk_per_trade_amount'] / risk))
+        target = entry - risk * params['risk_reward_ratio']
+        trade = {
+            'symbol': symbol, 'status': 'EXPIRED', 'candle_timestamp': int(ts[i]),
+            'candle_open': c['open'][i], 'candle_high': c['high'][i], 'candle_low': c['low'][i],
+            'candle_close': c['close'][i], 'prev_day_low': pdl, 'entry_level': entry, 'stop_loss': stop,
+            'initial_stop_loss': stop, 'target_price': target, 'quantity': qty, 'actual_entry_price': None,
+            'actual_exit_price': None, 'is_breakeven_moved': False, 'pnl': None, 'exit_reason': 'Setup Expired',
+            'created_at': int(ts[i]) + 60, 'entry_time': None, 'exit_time': None,
+        }
+        trades.append(trade)
+        if e is None:
+            continue
+        trade['entry_time'] = int(ts[e])
+        if notional_cap and fill * qty > notional_cap:
+            trade['exit_reason'] = 'Notional Cap Exceeded'
+            continue
+
+        j, exit_price, reason, moved, final_stop = manage_position(
+            c, e, end, fill, stop, target, params['breakeven_trigger_r']
+        )
+        trade.update(
+            status='CLOSED', actual_entry_price=fill, actual_exit_price=exit_price, stop_loss=final_stop,
+            is_breakeven_moved=moved, pnl=(fill - exit_price) * qty, exit_reason=reason, exit_time=int(ts[j]) + 60,
+        )
+    return trades
+
+
+def _simulate_job(job):
+    data_dir, symbol, params, utc_offset, start_ts, end_ts = job
+    candles = load_candles(data_dir, symbol, start_ts, end_ts, utc_offset)
+    if candles is None:
+        return symbol, None
+    return symbol, simulate_symbol(symbol, candles, params, utc_offset)
+
+
+# =========================================================================
+# PORTFOLIO
+# =========================================================================
+def apply_daily_limit(trades, max_per_day, utc_offset):
+    """Reject entries beyond max_trades_per_day (all symbols), in entry order, like the live risk engine."""
+    per_day = {}
+    entered = sorted((t for t in trades if t['status'] == 'CLOSED'), key=lambda t: (t['entry_time'], t['symbol']))
+    for trade in entered:
+        day = (trade['entry_time'] + utc_offset) // 86400
+        if per_day.get(day, 0) >= max_per_day:
+            trade.update(
+                status='EXPIRED', exit_reason='Global Limit Reached', actual_entry_price=None, actual_exit_price=None,
+                stop_loss=trade['initial_stop_loss'], is_breakeven_moved=False, pnl=None, exit_time=None,
+            )
+        else:
+            per_day[day] = per_day.get(day, 0) + 1
+    return trades
+
+
+def run_backtest(symbols, params, data_dir, utc_offset, start_ts=None, end_ts=None, workers=None):
+    """Returns (trades sorted by creation, symbols without candle data)."""
+    jobs = [(data_dir, symbol, params, utc_offset, start_ts, end_ts) for symbol in symbols]
+    trades, missing = [], []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for symbol, result in pool.map(_simulate_job, jobs, chunksize=4):
+            if result is None:
+                missing.append(symbol)
+            else:
+                trades.extend(result)
+    apply_daily_limit(trades, params['max_trades_per_day'], utc_offset)
+    trades.sort(key=lambda t: (t['created_at'], t['symbol']))
+    return trades, missing
+
+
+def ledger_row(trade, tz):
+    row = dict(trade)
+    for field in TIME_FIELDS:
+        if row[field] is not None:
+            row[field] = datetime.fromtimestamp(row[field], tz).isoformat()
+    for field, value in row.items():
+        if isinstance(value, (float, np.floating)):
+            row[field] = round(float(value), 2)
+    return row
+
+
+def write_ledger(path, trades, tz):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=LEDGER_FIELDS)
+        writer.writeheader()
+        for trade in trades:
+            writer.writerow(ledger_row(trade, tz))
@@ -0,0 +1,96 @@
+"""
+Backfill of 1m candles missed while the data socket was down.
+
+Gaps are given as {symbol: [epoch_minute, ...]}. Each symbol costs one
+fyers.history call covering its whole gap; calls run concurrently on a small
+thread pool behind a shared token-bucket limiter so the history API rate limit
+is respected.
+"""
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger('data_engine')
+
+
+class RateLimiter:
+    """Token bucket shared by all backfill threads."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class GapBackfiller:
+    """
+    Fetches missing minutes through history(params) (the fyers.history call) and
+    hands the recovered candles of each symbol to emit(symbol, candles), each
+    candle having minute/open/high/low/close/volume.
+    """
+
+    def __init__(self, history, emit, rate=8, workers=4):
+        self.history = history
+        self.emit = emit
+        self.limiter = RateLimiter(rate)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='backfill')
+
+    def submit(self, gaps):
+        """Schedule a backfill in the background. Returns immediately."""
+        gaps = {sym: sorted(set(minutes)) for sym, minutes in gaps.items() if minutes}
+        if not gaps:
+            return
+        threading.Thread(target=self._run, args=(gaps,), name='backfill_coordinator', daemon=True).start()
+
+    def _run(self, gaps):
+        started = time.time()
+        wanted = sum(len(m) for m in gaps.values())
+        logger.info(f"Backfill: {wanted} missing minutes across {len(gaps)} symbols...")
+
+        filled = sum(self.pool.map(lambda item: self._backfill_symbol(*item), gaps.items()))
+
+        logger.info(f"Backfill: Done. {filled}/{wanted} minutes recovered in {time.time() - started:.1f}s.")
+
+    def _backfill_symbol(self, symbol, minutes):
+        self.limiter.acquire()
+        try:
+            response = self.history({
+                "symbol": symbol,
+                "resolution": "1",
+                "date_format": "0",
+                "range_from": str(minutes[0] * 60),
+                "range_to": str(minutes[-1] * 60 + 59),
+                "cont_flag": "1"
+            })
+        except Exception as e:
+            logger.error(f"Backfill {symbol}: {e}")
+            return 0
+
+        if response.get('s') != 'ok':
+            logger.warning(f"Backfill {symbol} failed: {response.get('message')}")
+            return 0
+
+        wanted = set(minutes)
+        # candles = [[ts, o, h, l, c, v], ...]
+        candles = [
+            {'minute': int(ts) // 60, 'open': o, 'high': h, 'low': l, 'close': c, 'volume': v}
+            for ts, o, h, l, c, v in response.get('candles', []) if int(ts) // 60 in wanted
+        ]
+        if candles:
+            self.emit(symbol, candles)
+        return len(candles)
@@ -0,0 +1,279 @@
+"""
+Columnar, memory-mapped store of 1m candles.
+
+Layout under CANDLE_DATA_DIR:
+    symbols.json             symbol index: the position in the list is the symbol id (append-only)
+    2025-01-02/open.npy      one float64 array per field and session,
+    2025-01-02/high.npy      shape (symbols, SESSION_MINUTES): row = symbol id,
+    ...                      column = minute since the 09:15 open, NaN = no candle
+
+Files are opened with mmap, so a reader pays for the pages it touches only.
+day() returns the mapped arrays; window() slices them and stays zero-copy
+for a single symbol or a run of consecutive ids (anything else needs fancy
+indexing, which copies). Rows are written in place through an r+ map; a day
+file is created (or grown when symbols were added since) by writing a new
+file and renaming it over the old one, so readers never see a torn file.
+
+Written at end of day from candle_stream_1m and backfilled from fyers.history
+by the store_candles command.
+"""
+import os
+import json
+import threading
+from datetime import date, datetime, timedelta, timezone
+import numpy as np
+
+STORE_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+SESSION_OPEN = (9, 15) # Local time of minute 0
+SESSION_MINUTES = 375 # 09:15 - 15:29
+
+
+def _rows(arrays):
+    """Symbols every field of a day covers (files grow one at a time while a writer adds symbols)."""
+    return min(len(a) for a in arrays.values()) if arrays else 0
+
+
+class CandleStore:
+    def __init__(self, root, tz):
+        self.root = root
+        self.tz = tz
+        self.lock = threading.Lock()
+        self._symbols = None
+        self._ids = None
+        self._days = {} # date str -> {field: memmap}
+        self._writable = {} # date str -> {field: r+ memmap}, until flush()
+        self._listing = None # (root mtime, session dirs)
+
+    # =========================================================================
+    # SYMBOL INDEX
+    # =========================================================================
+    def symbols(self):
+        if self._symbols is None:
+            try:
+                with open(os.path.join(self.root, 'symbols.json')) as f:
+                    self._symbols = json.load(f)
+            except FileNotFoundError:
+                self._symbols = []
+            self._ids = {s: i for i, s in enumerate(self._symbols)}
+        return self._symbols
+
+    def symbol_id(self, symbol):
+        self.symbols()
+        return self._ids.get(symbol)
+
+    def register(self, symbols):
+        """Ids for `symbols`, appending unknown ones to the index."""
+        with self.lock:
+            known = self.symbols()
+            new = [s for s in dict.fromkeys(symbols) if s not in self._ids]
+            if new:
+                known.extend(new)
+                self._ids.update((s, i) for i, s in enumerate(known))
+                os.makedirs(self.root, exist_ok=True)
+                tmp = os.path.join(self.root, 'symbols.json.tmp')
+                with open(tmp, 'w') as f:
+                    json.dump(known, f)
+                os.replace(tmp, os.path.join(self.root, 'symbols.json'))
+            return [self._ids[s] for s in symbols]
+
+    # =========================================================================
+    # TIME AXIS
+    # =========================================================================
+    def session_open(self, day):
+        """Epoch seconds of minute 0 of the session `day` (date or 'YYYY-MM-DD')."""
+        if isinstance(day, str):
+            day = date.fromisoformat(day)
+        return int(datetime(day.year, day.month, day.day, *SESSION_OPEN, tzinfo=self.tz).timestamp())
+
+    def locate(self, ts):
+        """Epoch seconds -> ('YYYY-MM-DD', minute index); the index may fall outside the session."""
+        local = datetime.fromtimestamp(ts, self.tz)
+        return local.date().isoformat(), (int(ts) - self.session_open(local.date())) // 60
+
+    def days(self, start=None, end=None):
+        """Stored sessions, optionally limited to start <= day <= end (dates or 'YYYY-MM-DD')."""
+        try:
+            mtime = os.stat(self.root).st_mtime_ns # Changes when a session directory is added
+        except FileNotFoundError:
+            return []
+        if self._listing is None or self._listing[0] != mtime:
+            self._listing = (mtime, sorted(
+                d for d in os.listdir(self.root)
+                if len(d) == 10 and d[4] == '-' and os.path.isdir(os.path.join(self.root, d))
+            ))
+        start, end = str(start) if start else None, str(end) if end else None
+        return [d for d in self._listing[1] if (start is None or d >= start) and (end is None or d <= end)]
+
+    # =========================================================================
+    # READS
+    # =========================================================================
+    def day(self, day):
+        """
+        {field: read-only memmap (symbols, SESSION_MINUTES)} for one session, None if not
+        stored (or still being created: _open_for_write writes the fields one file at a time).
+        """
+        day = str(day)
+        arrays = self._days.get(day)
+        if arrays is None:
+            path = os.path.join(self.root, day)
+            if not all(os.path.exists(os.path.join(path, f + '.npy')) for f in STORE_FIELDS):
+                return None
+            # Plain ndarray views of the maps: same pages, cheaper to slice than np.memmap
+            arrays = {f: np.asarray(np.load(os.path.join(path, f + '.npy'), mmap_mode='r')) for f in STORE_FIELDS}
+            self._days[day] = arrays
+        return arrays
+
+    def window(self, day, symbols, start_minute=0, end_minute=SESSION_MINUTES, fields=STORE_FIELDS):
+        """
+        {field: array (len(symbols), minutes)} for one session. Zero-copy when
+        the symbols have consecutive ids in order; symbols the day does not
+        cover come back as NaN rows (which copies).
+        """
+        arrays = self.day(day)
+        ids = [self.symbol_id(s) for s in symbols]
+        rows = _rows(arrays)
+        if arrays and ids and all(i is not None and i < rows for i in ids):
+            if ids == list(range(ids[0], ids[0] + len(ids))):
+                return {f: arrays[f][ids[0]:ids[-1] + 1, start_minute:end_minute] for f in fields}
+            return {f: arrays[f][ids, start_minute:end_minute] for f in fields}
+
+        out = {f: np.full((len(ids), end_minute - start_minute), np.nan) for f in fields}
+        for k, i in enumerate(ids):
+            if arrays and i is not None and i < rows:
+                for f in fields:
+                    out[f][k] = arrays[f][i, start_minute:end_minute]
+        return out
+
+    def history(self, symbol, start_ts=None, end_ts=None):
+        """One symbol's candles for ts in [start_ts, end_ts) as flat arrays (ts + fields), missing minutes dropped."""
+        i = self.symbol_id(symbol)
+        if i is None:
+            return None
+        start = datetime.fromtimestamp(start_ts, self.tz).date() if start_ts is not None else None
+        end = datetime.fromtimestamp(end_ts - 1, self.tz).date() if end_ts is not None else None
+        days = [d for d in self.days(start, end) if i < _rows(self.day(d))]
+        candles = {f: np.empty((len(days), SESSION_MINUTES)) for f in STORE_FIELDS}
+        for k, day in enumerate(days):
+            arrays = self.day(day)
+            for f in STORE_FIELDS:
+                candles[f][k] = arrays[f][i]
+        opens = np.array([self.session_open(d) for d in days], dtype=np.int64)
+        candles['ts'] = (opens[:, None] + np.arange(SESSION_MINUTES, dtype=np.int64) * 60).reshape(-1)
+        candles = {f: v.reshape(-1) for f, v in candles.items()}
+
+        keep = ~np.isnan(candles['close'])
+        if not keep.all():
+            candles = {f: v[keep] for f, v in candles.items()}
+        lo = np.searchsorted(candles['ts'], start_ts) if start_ts is not None else 0
+        hi = np.searchsorted(candles['ts'], end_ts) if end_ts is not None else len(candles['ts'])
+        return {f: candles[f][lo:hi] for f in ('ts',) + STORE_FIELDS}
+
+    # =========================================================================
+    # WRITES
+    # =========================================================================
+    def _open_for_write(self, day, rows):
+        """r+ maps of the day's files with at least `rows` rows. Caller holds self.lock."""
+        arrays = self._writable.get(day)
+        if arrays is not None and len(arrays['close']) >= rows:
+            return arrays
+        path = os.path.join(self.root, day)
+        os.makedirs(path, exist_ok=True)
+        arrays = {}
+        for f in STORE_FIELDS:
+            file = os.path.join(path, f + '.npy')
+            current = np.load(file, mmap_mode='r') if os.path.exists(file) else None
+            if current is None or len(current) < rows:
+                tmp = file + '.tmp.npy'
+                grown = np.lib.format.open_memmap(tmp, mode='w+', dtype=np.float64, shape=(rows, SESSION_MINUTES))
+                grown[:] = np.nan
+                if current is not None:
+                    grown[:len(current)] = current
+                grown.flush()
+                del grown, current
+                os.replace(tmp, file)
+            arrays[f] = np.load(file, mmap_mode='r+')
+        self._writable[day] = arrays
+        self._days.pop(day, None)
+        return arrays
+
+    def flush(self):
+        """Write dirty pages of every day written through this store to disk and drop the maps."""
+        with self.lock:
+            for arrays in self._writable.values():
+                for a in arrays.values():
+                    a.flush()
+            self._writable.clear()
+
+    def write_day(self, day, rows):
+        """rows = {symbol: {field: array of SESSION_MINUTES}} (NaN = no candle). Replaces those symbols' rows."""
+        ids = dict(zip(rows, self.register(list(rows))))
+        with self.lock:
+            arrays = self._open_for_write(str(day), len(self.symbols()))
+            for symbol, values in rows.items():
+                for f in STORE_FIELDS:
+                    arrays[f][ids[symbol]] = values[f]
+        self.flush()
+
+    def write_candles(self, symbol, candles):
+        """
+        Flat arrays (ts + fields, e.g. from fyers.history) for one symbol, split
+        into sessions and merged in. Returns the candles written; call flush() after the last one.
+        """
+        ts = np.asarray(candles['ts'], dtype=np.int64)
+        if not len(ts):
+            return 0
+        # Local day of every candle (offsets looked up once per UTC day, not per candle)
+        utc_days, inverse = np.unique(ts // 86400, return_inverse=True)
+        offsets = np.array([int(datetime.fromtimestamp(d * 86400 + 43200, self.tz).utcoffset().total_seconds()) for d in utc_days])
+        local_days = (ts + offsets[inverse]) // 86400
+        minutes = (ts + offsets[inverse]) % 86400 // 60 - (SESSION_OPEN[0] * 60 + SESSION_OPEN[1])
+        keep = (minutes >= 0) & (minutes < SESSION_MINUTES)
+        if not keep.any():
+            return 0
+        local_days, minutes = local_days[keep], minutes[keep]
+        values = {f: np.asarray(candles[f], dtype=np.float64)[keep] for f in STORE_FIELDS}
+
+        (i,) = self.register([symbol])
+        bounds = np.flatnonzero(np.r_[True, local_days[1:] != local_days[:-1], True])
+        with self.lock:
+            for lo, hi in zip(bounds[:-1], bounds[1:]):
+                day = date.fromordinal(date(1970, 1, 1).toordinal() + int(local_days[lo])).isoformat()
+                arrays = self._open_for_write(day, len(self.symbols()))
+                for f in STORE_FIELDS:
+                    arrays[f][i, minutes[lo:hi]] = values[f][lo:hi]
+        return int(keep.sum())
+
+
+def empty_row():
+    return np.full(SESSION_MINUTES, np.nan)
+
+
+def stream_rows(entries, store):
+    """
+    candle_stream_1m entries [(id, {b'data': json}), ...] -> ({day: rows}) for
+    write_day. Later entries win, so a backfilled candle replaces a partial one.
+    """
+    days = {}
+    for _, data in entries:
+        payload = json.loads(data[b'data'])
+        ts = datetime.fromisoformat(payload['ts'])
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=store.tz)
+        day, minute = store.locate(ts.timestamp())
+        if not 0 <= minute < SESSION_MINUTES:
+            continue
+        row = days.setdefault(day, {}).setdefault(payload['symbol'], {f: empty_row() for f in STORE_FIELDS})
+        for f in STORE_FIELDS:
+            row[f][minute] = float(payload[f])
+    return days
+
+
+_stores = {}
+
+
+def open_store(root, utc_offset):
+    """One store per (root, offset) and process, so worker processes keep their maps across tasks."""
+    key = (root, utc_offset)
+    if key not in _stores:
+        _stores[key] = CandleStore(root, timezone(timedelta(seconds=utc_offset)))
+    return _stores[key]
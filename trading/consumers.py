@@ -0,0 +1,71 @@
+import copy
+import asyncio
+import logging
+from urllib.parse import parse_qs
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from trading.dashboard_feed import hub, diff_section, DEFAULT_INTERVAL, MIN_INTERVAL, MAX_INTERVAL
+
+logger = logging.getLogger('dashboard_feed')
+
+class DashboardConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Pushes dashboard state to one browser.
+    First message is {'type': 'snapshot', ...}; after that only
+    {'type': 'delta', '<section>': {'set': {...}, 'del': [...]}} for what changed,
+    coalesced to at most one message per `interval` (?interval=<ms>).
+    """
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if not user or not user.is_superuser:
+            await self.close(code=4403)
+            return
+
+        try:
+            interval = float(parse_qs(self.scope['query_string'].decode('utf-8')).get('interval', [''])[0]) / 1000
+        except ValueError:
+            interval = DEFAULT_INTERVAL
+        self.interval = min(MAX_INTERVAL, max(MIN_INTERVAL, interval))
+
+        self.sent = None # State as this client last saw it
+        self.dirty = asyncio.Event()
+        await self.accept()
+        hub.attach(self)
+        self.pusher = asyncio.get_running_loop().create_task(self.push_loop())
+
+    async def disconnect(self, code):
+        if hasattr(self, 'pusher'):
+            hub.detach(self)
+            self.pusher.cancel()
+
+    def wake(self):
+        self.dirty.set()
+
+    async def push_loop(self):
+        try:
+            while True:
+                await self.dirty.wait()
+                self.dirty.clear()
+                await self.push()
+                # Throttle: changes arriving meanwhile are coalesced into the next delta
+                await asyncio.sleep(self.interval)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Dashboard push failed: {e}")
+            await self.close()
+
+    async def push(self):
+        state = hub.state()
+        if self.sent is None:
+            message = {'type': 'snapshot', **state}
+        else:
+            message = {'type': 'delta'}
+            for section, rows in state.items():
+                delta = diff_section(self.sent[section], rows)
+                if delta:
+                    message[section] = delta
+            if len(message) == 1:
+                return
+        self.sent = copy.deepcopy(state)
+        await self.send_json(message)
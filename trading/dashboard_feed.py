@@ -0,0 +1,231 @@
+"""
+Live dashboard feed.
+
+Producers append to the `dashboard_events` stream: the trade store on every
+transition (trade id only) and the scanner on every hit. Each web process runs
+one DashboardHub that tails the stream, keeps the current dashboard state in
+memory (trades from the Redis trade store, scans, positions marked to market
+by run_mtm_engine) and wakes the
+connected clients. Every client is sent the delta between what it last saw and
+the current state, at most once per its throttle interval, so any number of
+open dashboards costs one stream reader and no DB queries.
+"""
+import json
+import asyncio
+import logging
+import redis
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+from trading.models import StrategyTrade
+from trading.mtm import MTM_POSITIONS_KEY, MTM_PORTFOLIO_KEY
+from trading.redis_client import get_async_redis
+from trading.trade_store import (
+    LIVE_STATUSES, FLOAT_FIELDS, DASHBOARD_EVENTS_STREAM, DASHBOARD_EVENTS_MAXLEN, decode_trade,
+)
+
+logger = logging.getLogger('dashboard_feed')
+
+RECENT_SCANS_KEY = "recent_scans" # Newest first, JSON per hit
+RECENT_SCANS_MAX = 10
+RECENT_TRADES_MAX = 20 # Finished trades kept on screen besides the live ones
+POSITION_STATUSES = ('OPEN', 'PENDING_EXIT')
+
+DEFAULT_INTERVAL = 0.5 # Seconds between pushes to one client
+MIN_INTERVAL = 0.2
+MAX_INTERVAL = 5.0
+
+
+def publish_scan(r, symbol, pattern, scan_time):
+    """Scanner hook: remember the hit for new dashboards and notify open ones."""
+    scan = json.dumps({'symbol': symbol, 'pattern': pattern, 'scan_time': scan_time.isoformat()})
+    pipe = r.pipeline(transaction=False)
+    pipe.lpush(RECENT_SCANS_KEY, scan)
+    pipe.ltrim(RECENT_SCANS_KEY, 0, RECENT_SCANS_MAX - 1)
+    pipe.xadd(DASHBOARD_EVENTS_STREAM, {'kind': 'scan', 'data': scan}, maxlen=DASHBOARD_EVENTS_MAXLEN, approximate=True)
+    pipe.execute()
+
+
+def diff_section(old, new):
+    """{key: row} -> {'set': {key: changed fields (whole row if new)}, 'del': [keys]}, or None if equal."""
+    changed = {}
+    for key, row in new.items():
+        prev = old.get(key)
+        if prev is None:
+            changed[key] = row
+        else:
+            fields = {f: v for f, v in row.items() if prev.get(f) != v}
+            if fields:
+                changed[key] = fields
+    removed = [key for key in old if key not in new]
+    if not changed and not removed:
+        return None
+    return {'set': changed, 'del': removed}
+
+
+def trade_row(trade):
+    return {
+        'id': trade['id'], 'symbol': trade['symbol'], 'status': trade['status'],
+        'entry_level': trade.get('entry_level'), 'stop_loss': trade.get('stop_loss'),
+        'target_price': trade.get('target_price'), 'quantity': trade.get('quantity'),
+        'actual_entry_price': trade.get('actual_entry_price'), 'actual_exit_price': trade.get('actual_exit_price'),
+        'pnl': trade.get('pnl'), 'exit_reason': trade.get('exit_reason'), 'created_at': trade.get('created_at'),
+    }
+
+
+def positions_from(trades, marks=None):
+    """Net open quantity per symbol (the strategy only sells short), with the latest MTM marks."""
+    positions = {}
+    for t in trades.values():
+        if t['status'] not in POSITION_STATUSES:
+            continue
+        pos = positions.setdefault(t['symbol'], {'symbol': t['symbol'], 'quantity': 0, 'notional': 0.0})
+        price = t['actual_entry_price'] or t['entry_level'] or 0
+        pos['quantity'] -= t['quantity'] or 0
+        pos['notional'] = round(pos['notional'] + price * (t['quantity'] or 0), 2)
+    for pos in positions.values():
+        pos['avg_price'] = round(pos['notional'] / -pos['quantity'], 2) if pos['quantity'] else None
+        mark = (marks or {}).get(pos['symbol'], {})
+        pos['ltp'] = mark.get('ltp')
+        pos['unrealized'] = mark.get('unrealized')
+    return positions
+
+
+class DashboardHub:
+    """One per web process. Lives on the ASGI event loop; clients attach/detach."""
+
+    def __init__(self):
+        self.trades = {} # str(id) -> row
+        self.scans = {} # stream id -> scan
+        self.positions = {}
+        self.marks = {} # symbol -> {ltp, unrealized} from the MTM engine
+        self.portfolio = {}
+        self.clients = set()
+        self.task = None
+        self.ready = False # Snapshot loaded by the running task
+
+    def state(self):
+        return {'trades': self.trades, 'scans': self.scans, 'positions': self.positions, 'portfolio': self.portfolio}
+
+    def attach(self, client):
+        self.clients.add(client)
+        if self.task is None or self.task.done():
+            self.ready = False
+            self.task = asyncio.get_running_loop().create_task(self.run())
+        elif self.ready:
+            client.wake() # The hub only wakes clients on stream events: send the snapshot now
+
+    def detach(self, client):
+        self.clients.discard(client)
+        if not self.clients and self.task:
+            # Nobody watching: stop reading until the next dashboard opens
+            self.task.cancel()
+            self.task = None
+            self.ready = False
+
+    def wake_clients(self):
+        for client in self.clients:
+            client.wake()
+
+    async def run(self):
+        r = get_async_redis()
+        try:
+            # Take the stream position first so nothing between snapshot and tail is lost
+            last = await r.xrevrange(DASHBOARD_EVENTS_STREAM, count=1)
+            last_id = last[0][0] if last else '0-0'
+            await self.load_snapshot(r)
+            self.ready = True
+            self.wake_clients()
+
+            while True:
+                try:
+                    events = await r.xread({DASHBOARD_EVENTS_STREAM: last_id}, count=500, block=5000)
+                except redis.exceptions.ConnectionError:
+                    logger.error("Dashboard feed lost Redis. Retrying...")
+                    await asyncio.sleep(5)
+                    continue
+                if not events:
+                    continue
+                _, messages = events[0]
+                last_id = messages[-1][0]
+                await self.apply(r, messages)
+                self.wake_clients()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Dashboard feed stopped: {e}")
+        finally:
+            await r.close()
+
+    async def load_snapshot(self, r):
+        # One DB query per hub start (not per client); Redis overrides with live state
+        self.trades = await sync_to_async(self.recent_trades)()
+        await self.load_trades(r, [int(k) for k in self.trades])
+
+        self.scans = {}
+        for i, raw in enumerate(reversed(await r.lrange(RECENT_SCANS_KEY, 0, RECENT_SCANS_MAX - 1))):
+            self.scans[f"snapshot-{i}"] = json.loads(raw)
+
+        raw = await r.hgetall(MTM_POSITIONS_KEY)
+        self.marks = {k.decode('utf-8'): json.loads(v) for k, v in raw.items()}
+        raw = await r.hgetall(MTM_PORTFOLIO_KEY)
+        portfolio = {k.decode('utf-8'): v.decode('utf-8') for k, v in raw.items()}
+        self.portfolio = {'session': {k: v if k == 'day' else float(v) for k, v in portfolio.items() if k != 'ts'}} if portfolio else {}
+        self.positions = positions_from(self.trades, self.marks)
+
+    @staticmethod
+    def recent_trades():
+        day_start = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        fields = ['id', 'symbol', 'status', 'entry_level', 'stop_loss', 'target_price', 'quantity',
+                  'actual_entry_price', 'actual_exit_price', 'pnl', 'exit_reason', 'created_at']
+        live = StrategyTrade.objects.filter(status__in=LIVE_STATUSES, created_at__gte=day_start).values(*fields)
+        recent = StrategyTrade.objects.order_by('-created_at').values(*fields)[:RECENT_TRADES_MAX]
+        trades = {}
+        for row in list(live) + list(recent):
+            row = {k: float(v) if k in FLOAT_FIELDS and v is not None else v for k, v in row.items()}
+            row['created_at'] = row['created_at'].isoformat()
+            trades[str(row['id'])] = trade_row(row)
+        return trades
+
+    async def load_trades(self, r, ids):
+        ids = list(ids)
+        if not ids:
+            return
+        pipe = r.pipeline(transaction=False)
+        for tid in ids:
+            pipe.hgetall(f"trade:{tid}")
+        for tid, raw in zip(ids, await pipe.execute()):
+            if raw:
+                self.trades[str(tid)] = trade_row(decode_trade(raw))
+
+    async def apply(self, r, messages):
+        trade_ids = set()
+        marked = False
+        for msg_id, data in messages:
+            kind = data.get(b'kind')
+            if kind == b'trade':
+                trade_ids.add(int(data[b'id']))
+            elif kind == b'scan':
+                self.scans[msg_id.decode('utf-8')] = json.loads(data[b'data'])
+            elif kind == b'mtm':
+                snapshot = json.loads(data[b'data'])
+                self.marks = snapshot['positions']
+                self.portfolio = {'session': {k: v for k, v in snapshot['portfolio'].items() if k != 'ts'}}
+                marked = True
+
+        if trade_ids:
+            await self.load_trades(r, trade_ids)
+            self.trim_trades()
+        if trade_ids or marked:
+            self.positions = positions_from(self.trades, self.marks)
+
+        while len(self.scans) > RECENT_SCANS_MAX:
+            self.scans.pop(next(iter(self.scans)))
+
+    def trim_trades(self):
+        """Live trades always stay; finished ones are capped to the most recent few."""
+        finished = sorted((int(k) for k, t in self.trades.items() if t['status'] not in LIVE_STATUSES), reverse=True)
+        for tid in finished[RECENT_TRADES_MAX:]:
+            self.trades.pop(str(tid), None)
+
+
+hub = DashboardHub()
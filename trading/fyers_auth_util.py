@@ -1,24 +1,25 @@
-import redis
 import logging
-import ssl
+from requests.adapters import HTTPAdapter
 from django.conf import settings
 from fyers_apiv3 import fyersModel
+from trading.redis_client import r
 
 logger = logging.getLogger(__name__)
 
-# --- SSL FIX ---
-if settings.REDIS_URL.startswith('rediss://'):
-    r = redis.from_url(settings.REDIS_URL, ssl_cert_reqs=ssl.CERT_NONE)
-else:
-    r = redis.from_url(settings.REDIS_URL)
-
-def get_fyers_client(access_token=None):
-    return fyersModel.FyersModel(
-        client_id=settings.FYERS_APP_ID,
+def get_fyers_client(access_token=None, app_id=None, pool_size=None):
+    """
+    REST client. Each one keeps its own HTTP session; pool_size sets how many
+    keep-alive connections it holds, for concurrent orders on one account.
+    """
+    client = fyersModel.FyersModel(
+        client_id=app_id or settings.FYERS_APP_ID,
         token=access_token,
         is_async=False,
         log_path=""
     )
+    if pool_size:
+        client.service.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+    return client
 
 def generate_auth_url(app_id, secret_key, callback_url):
     try:
@@ -0,0 +1,261 @@
+"""
+Streaming indicators over the 1m candle and tick streams.
+
+IndicatorBank keeps every indicator as one numpy array with a row per symbol,
+and updates the rows a candle touches in O(1): no history is re-read per
+event. The same update runs on one candle (live) or on a whole minute of the
+universe at once (warm start), so the two cannot drift apart.
+
+    vwap               session VWAP of the typical price (h + l + c) / 3
+    volume_average     mean volume of the last VOLUME_WINDOW candles
+    relative_volume    the last candle's volume / the average of the candles before it
+    atr                Wilder ATR over ATR_PERIOD candles
+    ema                close EMA per period in EMA_PERIODS
+    opening_range      high / low of the first OPENING_RANGE_MINUTES of the session
+    last               last traded price (ticks)
+
+VWAP and the opening range restart every session; the rolling indicators run
+across sessions, like the backtest's arrays. A candle no newer than the last
+one applied to its symbol is ignored, so replaying the stream over a warm
+start (or a second feeder) never counts a candle twice; late backfilled
+candles are skipped for the same reason.
+
+build_indicators() warm-starts a bank from the last WARMUP_SESSIONS stored
+sessions (trading.candle_store) and today's candles so far in candle_stream_1m.
+"""
+import math
+import logging
+from datetime import datetime
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+from trading.candle_store import open_store, stream_rows, SESSION_OPEN, STORE_FIELDS
+from trading.redis_client import xrange_all
+
+logger = logging.getLogger('indicators')
+
+VOLUME_WINDOW = 20 # Candles in the rolling volume average (relative volume)
+ATR_PERIOD = 14
+EMA_PERIODS = (9, 21)
+OPENING_RANGE_MINUTES = 15
+WARMUP_SESSIONS = 2 # Stored sessions replayed at boot (before today's stream)
+STREAM_CANDLE = "candle_stream_1m"
+
+
+def relative_volume(volume, window=VOLUME_WINDOW):
+    """Whole-history form for the backtest: volume / mean of the previous `window` candles (NaN for the first)."""
+    volume = np.asarray(volume, dtype=np.float64)
+    cs = np.r_[0.0, np.cumsum(volume)]
+    t = np.arange(len(volume))
+    count = np.minimum(t, window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(count > 0, volume / ((cs[t] - cs[t - count]) / count), np.nan)
+
+
+class IndicatorBank:
+    def __init__(self, symbols, utc_offset, volume_window=VOLUME_WINDOW, atr_period=ATR_PERIOD,
+                 ema_periods=EMA_PERIODS, opening_range_minutes=OPENING_RANGE_MINUTES):
+        self.rows = {s: i for i, s in enumerate(dict.fromkeys(symbols))}
+        self.utc_offset = utc_offset
+        self.volume_window = volume_window
+        self.atr_period = atr_period
+        self.opening_range_minutes = opening_range_minutes
+        n = len(self.rows)
+
+        def nan():
+            return np.full(n, np.nan)
+
+        self.last_ts = np.full(n, -1, dtype=np.int64) # Epoch seconds of the last candle applied
+        self.session = np.full(n, -1, dtype=np.int64) # Local day number of that candle
+        self.last = nan()
+        # Session VWAP
+        self.pv_sum, self.v_sum, self.vwap_ = np.zeros(n), np.zeros(n), nan()
+        # Rolling volume: ring of the last volume_window candles and its running sum
+        self.ring = np.zeros((n, volume_window))
+        self.ring_pos = np.zeros(n, dtype=np.int64)
+        self.ring_count = np.zeros(n, dtype=np.int64)
+        self.ring_sum = np.zeros(n)
+        self.rel_volume = nan()
+        # Wilder ATR (simple mean until atr_period candles are in)
+        self.prev_close, self.atr_, self.atr_count = nan(), nan(), np.zeros(n, dtype=np.int64)
+        self.emas = {p: nan() for p in ema_periods}
+        # Opening range
+        self.or_high, self.or_low = nan(), nan()
+        self.or_complete = np.zeros(n, dtype=bool)
+
+    def __len__(self):
+        return len(self.rows)
+
+    # =========================================================================
+    # UPDATES
+    # =========================================================================
+    def update(self, rows, ts, o, h, l, c, v):
+        """
+        Apply one candle per row (arrays of equal length; rows unique within a call).
+        ts is epoch seconds, a scalar or one per row.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        ts = np.broadcast_to(np.asarray(ts, dtype=np.int64), rows.shape)
+        fresh = ts > self.last_ts[rows]
+        if not fresh.all():
+            rows, ts, o, h, l, c, v = (a[fresh] for a in (rows, ts, np.asarray(o), np.asarray(h), np.asarray(l), np.asarray(c), np.asarray(v)))
+        if not rows.size:
+            return
+        local = ts + self.utc_offset
+        day = local // 86400
+        minute = local % 86400 // 60 - (SESSION_OPEN[0] * 60 + SESSION_OPEN[1])
+        self.last_ts[rows] = ts
+
+        # --- New session: VWAP and opening range restart ---
+        new = day != self.session[rows]
+        if new.any():
+            reset = rows[new]
+            self.session[reset] = day[new]
+            self.pv_sum[reset] = 0.0
+            self.v_sum[reset] = 0.0
+            self.or_high[reset] = np.nan
+            self.or_low[reset] = np.nan
+            self.or_complete[reset] = False
+
+        # --- VWAP ---
+        self.pv_sum[rows] += (h + l + c) / 3 * v
+        self.v_sum[rows] += v
+        v_sum = self.v_sum[rows]
+        self.vwap_[rows] = np.where(v_sum > 0, self.pv_sum[rows] / np.where(v_sum > 0, v_sum, 1), np.nan)
+
+        # --- Rolling volume (relative volume against the candles before this one) ---
+        pos, count = self.ring_pos[rows], self.ring_count[rows]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.rel_volume[rows] = np.where(count > 0, v / (self.ring_sum[rows] / np.maximum(count, 1)), np.nan)
+        self.ring_sum[rows] += v - self.ring[rows, pos]
+        self.ring[rows, pos] = v
+        self.ring_pos[rows] = (pos + 1) % self.volume_window
+        self.ring_count[rows] = np.minimum(count + 1, self.volume_window)
+        wrapped = rows[self.ring_pos[rows] == 0] # Re-sum once per cycle so rounding never accumulates
+        if wrapped.size:
+            self.ring_sum[wrapped] = self.ring[wrapped].sum(axis=1)
+
+        # --- ATR ---
+        pc = self.prev_close[rows]
+        tr = h - l
+        gap = ~np.isnan(pc)
+        tr = np.where(gap, np.maximum(tr, np.maximum(np.abs(h - np.where(gap, pc, 0)), np.abs(l - np.where(gap, pc, 0)))), tr)
+        n, p = self.atr_count[rows], self.atr_period
+        atr = np.nan_to_num(self.atr_[rows])
+        self.atr_[rows] = np.where(n < p, (atr * n + tr) / (n + 1), (atr * (p - 1) + tr) / p)
+        self.atr_count[rows] = np.minimum(n + 1, p)
+        self.prev_close[rows] = c
+
+        # --- EMAs ---
+        for period, ema in self.emas.items():
+            current = ema[rows]
+            ema[rows] = np.where(np.isnan(current), c, current + 2 / (period + 1) * (c - current))
+
+        # --- Opening range ---
+        inside = (minute >= 0) & (minute < self.opening_range_minutes)
+        if inside.any():
+            r = rows[inside]
+            self.or_high[r] = np.fmax(self.or_high[r], h[inside])
+            self.or_low[r] = np.fmin(self.or_low[r], l[inside])
+        self.or_complete[rows[minute >= self.opening_range_minutes]] = True
+
+    def on_candle(self, candle):
+        """trading.strategy_host.Candle (or anything with the same fields); unknown symbols are ignored."""
+        row = self.rows.get(candle.symbol)
+        if row is None:
+            return
+        ts = int(datetime.fromisoformat(candle.ts).timestamp()) # Naive ts: local time of the data engine host, as published
+        self.update(
+            np.array([row]), ts, np.array([candle.open]), np.array([candle.high]),
+            np.array([candle.low]), np.array([candle.close]), np.array([candle.volume]),
+        )
+
+    def on_tick(self, symbol, ltp):
+        row = self.rows.get(symbol)
+        if row is not None:
+            self.last[row] = ltp
+
+    def replay(self, session_open, symbols, window):
+        """
+        A session of candles for `symbols` ({field: array (len(symbols), minutes)}
+        from CandleStore.window, NaN = no candle), one vectorized update per minute.
+        """
+        rows = np.array([self.rows[s] for s in symbols], dtype=np.int64)
+        for m in range(window['close'].shape[1]):
+            close = window['close'][:, m]
+            have = ~np.isnan(close)
+            if have.any():
+                self.update(rows[have], session_open + m * 60, *(window[f][have, m] for f in STORE_FIELDS))
+
+    # =========================================================================
+    # QUERIES (NaN / None until there is data)
+    # =========================================================================
+    def _get(self, array, symbol):
+        row = self.rows.get(symbol)
+        return float(array[row]) if row is not None else math.nan
+
+    def vwap(self, symbol):
+        return self._get(self.vwap_, symbol)
+
+    def relative_volume(self, symbol):
+        return self._get(self.rel_volume, symbol)
+
+    def volume_average(self, symbol):
+        row = self.rows.get(symbol)
+        if row is None or not self.ring_count[row]:
+            return math.nan
+        return float(self.ring_sum[row] / self.ring_count[row])
+
+    def atr(self, symbol):
+        return self._get(self.atr_, symbol)
+
+    def ema(self, symbol, period):
+        return self._get(self.emas[period], symbol)
+
+    def opening_range(self, symbol):
+        """(high, low) of the session's opening range, None until it is complete."""
+        row = self.rows.get(symbol)
+        if row is None or not self.or_complete[row]:
+            return None
+        return float(self.or_high[row]), float(self.or_low[row])
+
+    def last_price(self, symbol):
+        return self._get(self.last, symbol)
+
+    def snapshot(self, symbol):
+        return {
+            'vwap': self.vwap(symbol), 'relative_volume': self.relative_volume(symbol),
+            'volume_average': self.volume_average(symbol), 'atr': self.atr(symbol),
+            **{f'ema_{p}': self.ema(symbol, p) for p in self.emas},
+            'opening_range': self.opening_range(symbol), 'last': self.last_price(symbol),
+        }
+
+
+def build_indicators(symbols, sessions=WARMUP_SESSIONS, client=None):
+    """Bank for `symbols` warm-started from the candle store and today's candle stream."""
+    utc_offset = int(timezone.localtime().utcoffset().total_seconds())
+    bank = IndicatorBank(symbols, utc_offset)
+    store = open_store(settings.CANDLE_DATA_DIR, utc_offset)
+    symbols = list(bank.rows)
+    today = timezone.localdate().isoformat()
+
+    # 1. Stored sessions before today (the store is written after the close)
+    stored = [d for d in store.days(end=today) if d < today][-sessions:] if sessions else []
+    for day in stored:
+        bank.replay(store.session_open(day), symbols, store.window(day, symbols))
+
+    # 2. Today so far, from the stream (the consumers' own reads skip what this already applied)
+    try:
+        entries = xrange_all(STREAM_CANDLE, min=store.session_open(today) * 1000, client=client)
+    except Exception as e:
+        logger.error(f"Indicator warm start could not read {STREAM_CANDLE}: {e}")
+        entries = []
+    days = stream_rows(entries, store)
+    for day in sorted(days):
+        rows = {s: v for s, v in days[day].items() if s in bank.rows}
+        if rows:
+            window = {f: np.stack([rows[s][f] for s in rows]) for f in STORE_FIELDS}
+            bank.replay(store.session_open(day), list(rows), window)
+
+    logger.info(f"Indicators warm for {len(bank)} symbols ({len(stored)} stored sessions + {len(entries)} stream candles).")
+    return bank
@@ -0,0 +1,46 @@
+import logging
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from trading.models import StrategyTrade, StrategyTradeArchive
+
+logger = logging.getLogger('archive_trades')
+
+class Command(BaseCommand):
+    help = 'Moves finished trades from past sessions into the archive table (e.g. nightly from Heroku Scheduler)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-days', type=int, default=0, help='Sessions to keep in the hot table besides today')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        session_start = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        cutoff = session_start - timedelta(days=options['keep_days'])
+        # INSERT ... SELECT: rows never leave the DB, and created_at is copied as is
+        # (bulk_create would re-stamp it through auto_now_add)
+        qn = connection.ops.quote_name
+        columns = ", ".join(qn(f.column) for f in StrategyTrade._meta.concrete_fields)
+        copy_sql = (
+            f"INSERT INTO {qn(StrategyTradeArchive._meta.db_table)} ({columns}) "
+            f"SELECT {columns} FROM {qn(StrategyTrade._meta.db_table)} WHERE id IN (%s)"
+        )
+
+        moved = 0
+        while True:
+            # Each batch is copied and deleted in one transaction: a crash never leaves a trade in both tables
+            with transaction.atomic():
+                ids = list(
+                    StrategyTrade.objects.select_for_update()
+                    .filter(status__in=StrategyTradeArchive.ARCHIVED_STATUSES, created_at__lt=cutoff)
+                    .order_by('id').values_list('id', flat=True)[:options['batch_size']]
+                )
+                if not ids:
+                    break
+                with connection.cursor() as cursor:
+                    cursor.execute(copy_sql % ", ".join(["%s"] * len(ids)), ids)
+                StrategyTrade.objects.filter(id__in=ids).delete()
+            moved += len(ids)
+            logger.info(f"Archived {moved} trades so far...")
+
+        self.stdout.write(f"Archived {moved} trades created before {cutoff:%Y-%m-%d}.")
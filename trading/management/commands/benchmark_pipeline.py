@@ -0,0 +1,510 @@
+import os
+import json
+import time
+import queue
+import logging
+import resource
+import tempfile
+import itertools
+import threading
+import multiprocessing
+from datetime import datetime
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+from trading.models import FyersCredentials, GlobalTradingSettings, StrategyTrade
+from trading.trade_store import TradeStore, ORDER_EVENTS_STREAM, TRANSITION_LUA
+from trading.risk_engine import RESERVE_LUA, RELEASE_LUA
+from trading.symbol_master import sync, decode_symbol
+from trading.strategy_host import StrategyHost, GROUP_NAME as HOST_GROUP
+from trading.strategies import BreakdownStrategy, BreakdownScanner
+from trading.redis_client import r
+from trading.management.commands.run_data_engine import Command as DataEngine
+from trading.management.commands.run_scanner_worker import Command as ScannerWorker, GROUP_NAME as SCANNER_GROUP
+from trading.management.commands.run_order_socket import Command as OrderSocket, ORDER_FILLED
+from trading.management.commands.run_algo_worker import (
+    Command as AlgoWorker, LoopLag, GROUP_NAME as ALGO_GROUP, STREAM_CANDLE, STREAM_TICK, REDIS_PDL_KEY,
+)
+
+logger = logging.getLogger('benchmark')
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+PROBE_INTERVAL = 0.25 # Seconds between stats snapshots from each process
+LAG_SAMPLE_INTERVAL = 0.1
+READY_TIMEOUT = 30
+DRAIN_TIMEOUT = 15 # Seconds to wait for the consumers to catch up after the last tick
+
+# Consumer groups whose backlog is sampled (age of the oldest undelivered entry)
+LAG_GROUPS = (
+    (STREAM_TICK, ALGO_GROUP), (STREAM_CANDLE, ALGO_GROUP),
+    (STREAM_CANDLE, SCANNER_GROUP), (ORDER_EVENTS_STREAM, ALGO_GROUP),
+)
+HOST_LAG_GROUPS = ((STREAM_TICK, HOST_GROUP), (STREAM_CANDLE, HOST_GROUP), (ORDER_EVENTS_STREAM, HOST_GROUP))
+
+# Every symbol's price falls from above PDL (100) through a PENDING short setup:
+# entry at ENTRY, stop to breakeven at 1R, target at 2R. The per-symbol offset
+# spreads the triggers over the run.
+PDL = 100.0
+ENTRY, STOP = 99.5, 100.5
+TOP, DROP, SPREAD = 100.6, 4.0, 0.5
+VOLUME_PER_TICK = 500
+
+# Compared with --baseline: (path in the results, True if higher is better)
+REGRESSION_METRICS = (
+    (('throughput', 'processed_per_sec'), True),
+    (('tick_to_order_ms', 'p50'), False),
+    (('tick_to_order_ms', 'p99'), False),
+    (('db_queries_per_tick',), False),
+)
+
+
+class ProcessProbe(threading.Thread):
+    """
+    Stats of one benchmark process, sent to the parent every PROBE_INTERVAL:
+    SQL statements on every connection this process opens, peak RSS, counters
+    and latency samples recorded by the instrumented workers.
+    """
+    def __init__(self, name, results):
+        super().__init__(name='probe', daemon=True)
+        self.process_name = name
+        self.results = results
+        self.lock = threading.Lock()
+        self.queries = 0
+        self.counters = {}
+        self.latencies = []
+        connection_created.connect(self.on_connection, weak=False)
+
+    def on_connection(self, sender, connection, **kwargs):
+        if self.count_query not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self.count_query)
+
+    def count_query(self, execute, sql, params, many, context):
+        with self.lock:
+            self.queries += 1
+        return execute(sql, params, many, context)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def mark(self, name, value):
+        with self.lock:
+            self.counters[name] = value
+
+    def latency(self, ms):
+        with self.lock:
+            self.latencies.append(ms)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'queries': self.queries, 'counters': dict(self.counters), 'latencies': list(self.latencies),
+                'rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            }
+
+    def send(self):
+        self.results.put((self.process_name, self.snapshot()))
+
+    def run(self):
+        while True:
+            time.sleep(PROBE_INTERVAL)
+            self.send()
+
+
+class SimulatedBroker:
+    """fyers client stand-in: accepts every order and reports it filled at the last price to the order socket process."""
+
+    def __init__(self, fills, prices):
+        self.fills = fills
+        self.prices = prices
+        self.ids = itertools.count(1)
+
+    def place_order(self, data):
+        oid = f"BENCH{os.getpid()}{next(self.ids):07d}"
+        self.fills.put({'id': oid, 'status': ORDER_FILLED, 'tradedPrice': self.prices.get(data['symbol'], 0)})
+        return {'s': 'ok', 'id': oid}
+
+
+class BenchDataEngine(DataEngine):
+    """run_data_engine's tick path (candle building + XADD), fed by a generator instead of the socket."""
+
+    def __init__(self, symbols):
+        super().__init__()
+        self.symbols = symbols
+        self.candle_map = {}
+        self.last_emitted = {}
+        self.lock = threading.Lock()
+
+
+class BenchAlgoWorker(AlgoWorker):
+    """run_algo_worker with the broker simulated and tick-to-order latency recorded."""
+
+    def __init__(self, probe, fills):
+        super().__init__()
+        self.probe = probe
+        self.fills = fills
+        self.prices = {}
+        self.tick_ts = None
+
+    def initialize(self):
+        if not super().initialize():
+            return False
+        self.fyers = SimulatedBroker(self.fills, self.prices)
+        self.probe.mark('ready', 1)
+        return True
+
+    def process_tick(self, data, fyers, settings_db):
+        self.tick_ts = float(data[b'ts']) # Socket receive time in the data engine
+        self.prices[decode_symbol(data)] = float(data[b'ltp'])
+        super().process_tick(data, self.fyers, settings_db)
+        self.probe.count('ticks')
+        self.probe.mark('last_tick_at', time.time())
+
+    def send_order(self, fyers, symbol, qty, side, on_result):
+        self.probe.latency((time.time() - self.tick_ts) * 1000)
+        self.probe.count('orders')
+        super().send_order(fyers, symbol, qty, side, on_result)
+
+
+class BenchBreakdownStrategy(BreakdownStrategy):
+    """The strategy host's breakdown plugin on BenchAlgoWorker (same probes, fed decoded ticks)."""
+
+    def __init__(self, probe, fills):
+        self.probe = probe
+        self.fills = fills
+
+    def start(self, host):
+        self.worker = BenchAlgoWorker(self.probe, self.fills)
+        self.worker.indicators = host.indicators
+        return self.worker.initialize()
+
+    def on_tick(self, tick):
+        self.worker.tick_ts = tick.ts
+        self.worker.prices[tick.symbol] = tick.ltp
+        super().on_tick(tick)
+        self.probe.count('ticks')
+        self.probe.mark('last_tick_at', time.time())
+
+
+class Command(BaseCommand):
+    help = (
+        'End-to-end load test: synthetic ticks through the data engine, scanner, algo worker and '
+        'order socket (one process each, simulated broker). Runs against an in-memory Redis server '
+        '(needs fakeredis[lua]) or --redis-url, and a throwaway test database. Writes the results as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--symbols', type=int, default=200, help='Number of synthetic symbols')
+        parser.add_argument('--rate', type=int, default=2000, help='Ticks per second (all symbols)')
+        parser.add_argument('--duration', type=int, default=60, help='Seconds of ticks (at least 60 to include a candle close)')
+        parser.add_argument('--redis-url', help='Benchmark on this Redis database instead of in memory. It is FLUSHED before and after the run')
+        parser.add_argument('--output', default='pipeline_benchmark.json', help='Results file')
+        parser.add_argument('--baseline', help='Earlier results file: fail if this run is worse by more than --tolerance')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative regression against --baseline')
+        parser.add_argument('--strategy-host', action='store_true', help='Run the strategy plugins in one run_strategy_host process instead of the algo and scanner workers')
+
+    def handle(self, *args, **options):
+        if options['symbols'] < 1 or options['rate'] < 1 or options['duration'] < 1:
+            raise CommandError("--symbols, --rate and --duration must be positive")
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read baseline: {e}")
+
+        server = self.start_redis(options['redis_url'])
+        old_db_name = self.create_database()
+        processes = []
+        try:
+            r.flushdb()
+            symbols = [f"NSE:BENCH{i}-EQ" for i in range(options['symbols'])]
+            self.seed(symbols)
+            results = self.run(symbols, options['rate'], options['duration'], processes, options['strategy_host'])
+        finally:
+            for p in processes:
+                p.terminate()
+            for p in processes:
+                p.join(5)
+                if p.is_alive():
+                    p.kill()
+            connections.close_all()
+            connection.creation.destroy_test_db(old_db_name, verbosity=0)
+            r.flushdb()
+            if server:
+                server.shutdown()
+                server.server_close()
+
+        results['config'] = {
+            'symbols': options['symbols'], 'rate': options['rate'], 'duration': options['duration'],
+            'redis': 'external' if options['redis_url'] else 'in_memory', 'database': connection.vendor,
+            'topology': 'strategy_host' if options['strategy_host'] else 'workers',
+            'started_at': results.pop('started_at'),
+        }
+        with open(options['output'], 'w') as f:
+            json.dump(results, f, indent=2)
+        self.report(results, options['output'])
+        if baseline:
+            self.compare(results, baseline, options['tolerance'])
+
+    # =========================================================================
+    # ENVIRONMENT
+    # =========================================================================
+    def start_redis(self, url):
+        """Points REDIS_URL (read lazily by trading.redis_client, so inherited by the forked workers) at the benchmark server."""
+        if url:
+            if url == settings.REDIS_URL:
+                raise CommandError("--redis-url must not be the live REDIS_URL (the benchmark flushes it)")
+            settings.REDIS_URL = url
+            return None
+        try:
+            from fakeredis import TcpFakeServer
+        except ImportError:
+            raise CommandError("The in-memory Redis needs fakeredis with Lua support (pip install 'fakeredis[lua]'), or pass --redis-url")
+        server = TcpFakeServer(('127.0.0.1', 0), server_type='redis')
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name='fake_redis', daemon=True).start()
+        host, port = server.server_address
+        settings.REDIS_URL = f"redis://{host}:{port}/0"
+        return server
+
+    def create_database(self):
+        """Test database, as the test runner makes it. SQLite gets a file so the worker processes share it."""
+        old_name = connection.settings_dict['NAME']
+        if connection.vendor == 'sqlite':
+            connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.mkdtemp(), 'benchmark.sqlite3')
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        return old_name
+
+    def seed(self, symbols):
+        """Active credentials, loose limits, PDL for every symbol and one PENDING short setup each."""
+        user = User.objects.create(username='benchmark')
+        FyersCredentials.objects.create(user=user, app_id='BENCH-100', secret_key='-', access_token='-', is_active=True)
+        GlobalTradingSettings.objects.create(
+            user=user, max_trades_per_day=len(symbols) * 4, max_trades_per_symbol=4,
+            risk_reward_ratio=2, breakeven_trigger_r=1, setup_lifetime_minutes=0,
+            session_end_time=datetime.strptime('23:59', '%H:%M').time(),
+        )
+        r.hset(REDIS_PDL_KEY, mapping={
+            s: json.dumps({'open': PDL + 1, 'high': PDL + 2, 'low': PDL, 'close': PDL + 1, 'volume': 1000000}) for s in symbols
+        })
+        sync(symbols) # Ticks carry symbol master ids, as in production
+        store = TradeStore(r)
+        now = timezone.now()
+        for symbol in symbols:
+            trade = StrategyTrade.objects.create(
+                symbol=symbol, status='PENDING', candle_timestamp=now, candle_open=PDL + 0.5, candle_high=STOP / 1.0002,
+                candle_low=ENTRY / 0.9998, candle_close=PDL - 0.2, prev_day_low=PDL, entry_level=ENTRY,
+                stop_loss=STOP, initial_stop_loss=STOP, target_price=ENTRY - 2 * (STOP - ENTRY), quantity=500,
+            )
+            store.put(trade)
+        # Cached up front: the first EVALSHA of each worker would otherwise miss (and the
+        # in-memory server drops a connection after any error reply)
+        for script in (TRANSITION_LUA, RESERVE_LUA, RELEASE_LUA):
+            r.script_load(script)
+
+    # =========================================================================
+    # RUN
+    # =========================================================================
+    def run(self, symbols, rate, duration, processes, use_host=False):
+        started_at = timezone.now().isoformat()
+        ctx = multiprocessing.get_context('fork') # Workers inherit the benchmark settings and seeded state
+        stats = ctx.Queue()
+        fills = ctx.Queue()
+        connections.close_all() # Every process opens its own
+
+        def spawn(name, target, *args):
+            p = ctx.Process(target=self.child, args=(name, stats, target) + args, name=name)
+            p.start()
+            processes.append(p)
+
+        spawn('order_socket', self.run_order_socket, fills)
+        if use_host:
+            strategy, lag_groups = 'strategy_host', HOST_LAG_GROUPS
+            spawn(strategy, self.run_strategy_host, fills)
+        else:
+            strategy, lag_groups = 'algo_worker', LAG_GROUPS
+            spawn(strategy, self.run_algo_worker, fills)
+            spawn('scanner_worker', self.run_scanner)
+
+        latest = {}
+        self.wait_for(stats, latest, lambda: latest.get(strategy, {}).get('counters', {}).get('ready'), READY_TIMEOUT, strategy)
+        logger.info(f"Workers ready. {duration}s of ticks at {rate}/s over {len(symbols)} symbols...")
+
+        lags = {f"{stream}/{group}": [] for stream, group in lag_groups}
+        sampling = threading.Event()
+        sampler = threading.Thread(target=self.sample_lag, args=(lags, lag_groups, sampling), daemon=True)
+        sampler.start()
+        spawn('data_engine', self.run_data_engine, symbols, rate, duration)
+
+        def engine(key):
+            return latest.get('data_engine', {}).get('counters', {}).get(key)
+
+        self.wait_for(stats, latest, lambda: engine('done'), duration * 2 + READY_TIMEOUT, "data engine")
+        sent = engine('ticks')
+
+        def algo(key):
+            return latest.get(strategy, {}).get('counters', {}).get(key, 0)
+
+        try:
+            self.wait_for(stats, latest, lambda: algo('ticks') >= sent, DRAIN_TIMEOUT, "tick drain")
+        except CommandError as e:
+            logger.warning(f"{e} ({algo('ticks')}/{sent} ticks processed)")
+        self.wait_for(stats, latest, lambda: False, PROBE_INTERVAL * 4) # Orders in flight, final snapshots
+        sampling.set()
+        sampler.join()
+
+        tick_to_order = LoopLag('tick_to_order', window=None)
+        tick_to_order.samples.extend(latest[strategy]['latencies'])
+        queries = {name: s['queries'] for name, s in latest.items()}
+        processed = algo('ticks')
+        first, last = engine('started_at'), algo('last_tick_at') or engine('started_at')
+        return {
+            'started_at': started_at,
+            'throughput': {
+                'ticks_sent': sent, 'ticks_processed': processed,
+                'sent_per_sec': round(sent / engine('elapsed'), 1),
+                'processed_per_sec': round(processed / max(last - first, 1e-9), 1),
+                'candles': engine('candles') or 0, 'orders': algo('orders'),
+            },
+            'tick_to_order_ms': self.rounded(tick_to_order.summary()),
+            'stream_lag_ms': {key: self.rounded(self.percentiles(samples)) for key, samples in lags.items()},
+            'db_queries': queries,
+            'db_queries_per_tick': round(sum(queries.values()) / max(processed, 1), 4),
+            'rss_mb': {name: s['rss_mb'] for name, s in latest.items()},
+        }
+
+    def wait_for(self, stats, latest, condition, timeout, what=None):
+        """Collects snapshots into `latest` until condition() holds. CommandError on timeout (if `what` is given)."""
+        deadline = time.time() + timeout
+        while not condition():
+            if time.time() > deadline:
+                if what:
+                    raise CommandError(f"Timed out waiting for {what}")
+                return
+            try:
+                name, snapshot = stats.get(timeout=0.1)
+                latest[name] = snapshot
+            except queue.Empty:
+                pass
+
+    def sample_lag(self, lags, groups, stop):
+        while not stop.is_set():
+            now_ms = time.time() * 1000
+            for stream, group in groups:
+                try:
+                    info = next((g for g in r.xinfo_groups(stream) if g['name'] == group.encode()), None)
+                    if info is None:
+                        continue
+                    pending = r.xrange(stream, min=b'(' + info['last-delivered-id'], max='+', count=1)
+                    age = now_ms - int(pending[0][0].split(b'-')[0]) if pending else 0.0
+                    lags[f"{stream}/{group}"].append(max(age, 0.0))
+                except Exception as e:
+                    logger.error(f"Lag sample failed ({stream}/{group}): {e}")
+            stop.wait(LAG_SAMPLE_INTERVAL)
+
+    def percentiles(self, samples):
+        lag = LoopLag('stream', window=None)
+        lag.samples.extend(samples)
+        return lag.summary()
+
+    def rounded(self, summary):
+        return {k: round(v, 3) for k, v in summary.items()} if summary else None
+
+    # =========================================================================
+    # WORKER PROCESSES
+    # =========================================================================
+    def child(self, name, stats, target, *args):
+        logging.disable(logging.INFO) # Per-event INFO lines would dominate the measurement
+        probe = ProcessProbe(name, stats)
+        probe.start()
+        target(probe, *args)
+
+    def run_order_socket(self, probe, fills):
+        handle_order = OrderSocket().start_pipeline()
+        while True:
+            handle_order(fills.get())
+
+    def run_algo_worker(self, probe, fills):
+        BenchAlgoWorker(probe, fills).handle()
+
+    def run_scanner(self, probe):
+        ScannerWorker().handle()
+
+    def run_strategy_host(self, probe, fills):
+        host = StrategyHost([BenchBreakdownStrategy(probe, fills), BreakdownScanner()])
+        if host.start():
+            host.run()
+
+    def run_data_engine(self, probe, symbols, rate, duration):
+        engine = BenchDataEngine(symbols)
+        threading.Thread(target=engine.checkpoint_loop, daemon=True).start()
+        publish = engine.publish_candles
+
+        def count_candles(payloads):
+            probe.count('candles', len(payloads))
+            publish(payloads)
+
+        engine.publish_candles = count_candles
+
+        n = len(symbols)
+        total = rate * duration
+        volume = [0] * n
+        start = time.time()
+        probe.mark('started_at', start)
+        for i in range(total):
+            delay = start + i / rate - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            k = i % n
+            volume[k] += VOLUME_PER_TICK
+            ltp = TOP - DROP * i / total + SPREAD * k / n
+            engine.on_tick({'type': 'sf', 'symbol': symbols[k], 'ltp': round(ltp, 2), 'vol_traded_today': volume[k]})
+            if k == 0:
+                probe.mark('ticks', i + 1)
+        probe.mark('ticks', total)
+        probe.mark('elapsed', time.time() - start)
+        probe.mark('done', 1)
+        probe.send()
+        threading.Event().wait() # Stay up (checkpoints) until the parent terminates us
+
+    # =========================================================================
+    # OUTPUT
+    # =========================================================================
+    def report(self, results, path):
+        t = results['throughput']
+        self.stdout.write(
+            f"Pipeline: {t['ticks_processed']}/{t['ticks_sent']} ticks, {t['sent_per_sec']}/s sent, "
+            f"{t['processed_per_sec']}/s processed, {t['candles']} candles, {t['orders']} orders"
+        )
+        s = results['tick_to_order_ms']
+        if s:
+            self.stdout.write(f"  tick_to_order  p50={s['p50']:.2f}ms p99={s['p99']:.2f}ms max={s['max']:.2f}ms n={s['n']}")
+        for key, s in results['stream_lag_ms'].items():
+            if s:
+                self.stdout.write(f"  lag {key:<30} p50={s['p50']:.1f}ms p99={s['p99']:.1f}ms max={s['max']:.1f}ms")
+        self.stdout.write(f"  DB queries per tick: {results['db_queries_per_tick']} ({results['db_queries']})")
+        self.stdout.write(f"  Peak RSS (MB): {results['rss_mb']}")
+        self.stdout.write(f"  Results: {path}")
+
+    def compare(self, results, baseline, tolerance):
+        regressions = []
+        for path, higher_is_better in REGRESSION_METRICS:
+            now, before = results, baseline
+            for key in path:
+                now = (now or {}).get(key)
+                before = (before or {}).get(key)
+            if now is None or not before:
+                continue
+            change = (now - before) / before
+            worse = -change if higher_is_better else change
+            name = '.'.join(path)
+            self.stdout.write(f"  {name}: {before} -> {now} ({change:+.1%})")
+            if worse > tolerance:
+                regressions.append(name)
+        if regressions:
+            raise CommandError(f"Regression beyond {tolerance:.0%}: {', '.join(regressions)}")
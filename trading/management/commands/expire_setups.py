@@ -0,0 +1,22 @@
+import logging
+from django.core.management.base import BaseCommand
+from trading.models import FyersCredentials, GlobalTradingSettings
+from trading.trade_store import TradeStore
+from trading.setup_sweeper import expire_stale_setups
+from trading.redis_client import r
+
+logger = logging.getLogger('setup_sweeper')
+
+class Command(BaseCommand):
+    help = 'Expires stale PENDING setups (one-off run of the sweeper, e.g. from Heroku Scheduler)'
+
+    def handle(self, *args, **options):
+        try:
+            creds = FyersCredentials.objects.primary()
+            settings_db, _ = GlobalTradingSettings.objects.get_or_create(user=creds.user)
+        except Exception as e:
+            logger.error(f"Settings not available: {e}")
+            return
+
+        expired = expire_stale_setups(TradeStore(r), settings_db)
+        self.stdout.write(f"Expired {len(expired)} setups.")
@@ -1,28 +1,21 @@
 import json
-import redis
 import logging
 import time
-import ssl
 from datetime import datetime, timedelta
-from django.conf import settings
 from django.core.management.base import BaseCommand
 from trading.models import FyersCredentials
 from trading.fyers_auth_util import get_fyers_client
 from trading.constants import get_strategy_symbols # Import List
+from trading.redis_client import r
 
 logger = logging.getLogger('data_engine')
 
-if settings.REDIS_URL.startswith('rediss://'):
-    r = redis.from_url(settings.REDIS_URL, ssl_cert_reqs=ssl.CERT_NONE)
-else:
-    r = redis.from_url(settings.REDIS_URL)
-
 class Command(BaseCommand):
     help = 'Fetches previous day OHLC for strategy symbols'
 
     def handle(self, *args, **options):
         try:
-            creds = FyersCredentials.objects.get(is_active=True)
+            creds = FyersCredentials.objects.primary()
             fyers = get_fyers_client(creds.access_token)
         except Exception as e:
             logger.error(f"Auth failed: {e}")
@@ -40,6 +33,7 @@ class Command(BaseCommand):
         logger.info(f"Fetching History for {len(symbols)} symbols ({range_from} -> {range_to})")
 
         cached_count = 0
+        pending = {} # Written to Redis in batches of 50 (one HSET each)
 
         for symbol in symbols:
             try:
@@ -89,13 +83,17 @@ class Command(BaseCommand):
                 }
 
                 # Store in Redis Hash
-                r.hset("prev_day_ohlc", symbol, json.dumps(ohlc_data))
+                pending[symbol] = json.dumps(ohlc_data)
                 cached_count += 1
                 
                 if cached_count % 50 == 0:
+                    r.hset("prev_day_ohlc", mapping=pending)
+                    pending = {}
                     logger.info(f"Progress: {cached_count}/{len(symbols)} cached.")
 
             except Exception as e:
                 logger.error(f"Error {symbol}: {e}")
 
+        if pending:
+            r.hset("prev_day_ohlc", mapping=pending)
         logger.info(f"DONE. Cached Previous Day Data for {cached_count} symbols.")
\ No newline at end of file
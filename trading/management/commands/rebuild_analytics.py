@@ -0,0 +1,16 @@
+import logging
+from django.core.management.base import BaseCommand
+from trading.models import StrategyTrade
+from trading.analytics import rebuild
+from trading.redis_client import r
+
+logger = logging.getLogger('analytics')
+
+class Command(BaseCommand):
+    help = 'Recomputes the analytics counters from every closed trade (hot table + archive)'
+
+    def handle(self, *args, **options):
+        fields = ['symbol', 'pnl', 'entry_level', 'initial_stop_loss', 'quantity', 'actual_entry_price', 'created_at']
+        trades = StrategyTrade.history.combined(status='CLOSED').values(*fields).iterator()
+        count = rebuild(r, trades)
+        self.stdout.write(f"Analytics rebuilt from {count} closed trades.")
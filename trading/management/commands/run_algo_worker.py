@@ -1,92 +1,166 @@
 import json
 import redis
 import logging
-import ssl
+import sys
 import time
+import signal
+import threading
+from collections import deque
 from datetime import datetime
-from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from django.db import transaction
+from django.db import connections
 
 # Project Imports
 from trading.models import FyersCredentials, GlobalTradingSettings, StrategyTrade
-from trading.fyers_auth_util import get_fyers_client
+from trading.accounts import Account, MirrorFanout, MirrorSweeper, load_mirror_accounts
+from trading.risk_engine import PreTradeRiskEngine
+from trading.trade_store import TradeStore, TradeBook, TradeWriteBehind, ORDER_EVENTS_STREAM, decode_order_event
+from trading.setup_sweeper import SetupSweeper
+from trading.runner_lease import RunnerLease
+from trading.query_budget import QueryBudget
+from trading.symbol_master import decode_symbol
+from trading.strategy_host import decode_candle
+from trading.indicators import build_indicators
+from trading.constants import get_strategy_symbols
+from trading.profiling import timed, start_control, percentiles
+from trading.redis_client import r, xack_many
 
 # Logging Setup
 logger = logging.getLogger('algo_worker')
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
-# --- SSL FIX FOR HEROKU REDIS ---
-if settings.REDIS_URL.startswith('rediss://'):
-    r = redis.from_url(settings.REDIS_URL, ssl_cert_reqs=ssl.CERT_NONE)
-else:
-    r = redis.from_url(settings.REDIS_URL)
-
 GROUP_NAME = "ALGO_GROUP"
 CONSUMER_NAME = "WORKER_1"
 STREAM_CANDLE = "candle_stream_1m"
 STREAM_TICK = "market_ticks"
+STREAM_ORDER_EVENTS = ORDER_EVENTS_STREAM
 REDIS_PDL_KEY = "prev_day_ohlc"
+LAG_REPORT_INTERVAL = 60 # Seconds between lag summaries per loop
+BACKFILL_SIGNAL_MAX_AGE = 60 # Seconds after its close a backfilled candle may still create a setup
 
-class Command(BaseCommand):
-    help = 'Runs the Fyers V3 Algo Strategy Worker with Volume Filter & Strict Limits'
+# SQL allowed per processed message (see trading.query_budget)
+CANDLE_QUERY_BUDGET = 2 # per-symbol count + insert of a new setup
+TICK_QUERY_BUDGET = 0 # ticks run off the local book and Redis only
+ORDER_EVENT_QUERY_BUDGET = 0
 
-    # --- LUA SCRIPTS FOR ATOMIC LIMIT ENFORCEMENT ---
-    
-    # 1. Check Limits & Increment (Atomic)
-    # Returns: 1 (Allowed), -1 (Global Limit), -2 (Symbol Limit)
-    CHECK_AND_INCR_LUA = """
-    local global_count = tonumber(redis.call('GET', KEYS[1]) or 0)
-    local symbol_count = tonumber(redis.call('GET', KEYS[2]) or 0)
-    local global_limit = tonumber(ARGV[1])
-    local symbol_limit = tonumber(ARGV[2])
-
-    if global_count >= global_limit then
-        return -1 
-    end
-    
-    if symbol_count >= symbol_limit then
-        return -2 
-    end
-
-    redis.call('INCR', KEYS[1])
-    redis.call('INCR', KEYS[2])
-    redis.call('EXPIRE', KEYS[1], ARGV[3])
-    redis.call('EXPIRE', KEYS[2], ARGV[3])
-    
-    return 1 
-    """
 
-    # 2. Rollback (Decrement) on Failure
-    ROLLBACK_LUA = """
-    local global_val = tonumber(redis.call('GET', KEYS[1]) or 0)
-    local symbol_val = tonumber(redis.call('GET', KEYS[2]) or 0)
-    
-    if global_val > 0 then redis.call('DECR', KEYS[1]) end
-    if symbol_val > 0 then redis.call('DECR', KEYS[2]) end
-    return 1
+class LoopLag:
     """
+    Rolling stream lag (publish -> processed) for one consumer loop.
+    Lag is taken from the Redis stream ID, which carries the XADD time in ms.
+    """
+    def __init__(self, name, window=1000):
+        self.name = name
+        self.samples = deque(maxlen=window)
+        self.last_report = time.time()
+
+    def record(self, msg_id):
+        try:
+            raw = msg_id.decode('utf-8') if isinstance(msg_id, bytes) else msg_id
+            published_ms = int(raw.split('-')[0])
+        except (ValueError, AttributeError):
+            return
+        self.samples.append(time.time() * 1000 - published_ms)
+
+    def record_since(self, ts):
+        """Latency from an epoch timestamp carried in the payload (e.g. socket receive time)."""
+        self.samples.append((time.time() - ts) * 1000)
+
+    def summary(self):
+        """p50 / p99 / max in ms over the current window, None when empty."""
+        return percentiles(self.samples)
+
+    def maybe_report(self):
+        now = time.time()
+        if now - self.last_report < LAG_REPORT_INTERVAL or not self.samples:
+            return
+        s = self.summary()
+        logger.info(f"LAG [{self.name}] p50={s['p50']:.1f}ms p99={s['p99']:.1f}ms max={s['max']:.1f}ms n={s['n']}")
+        self.samples.clear()
+        self.last_report = now
+
+
+class Command(BaseCommand):
+    help = 'Runs the Fyers V3 Algo Strategy Worker with Volume Filter & Strict Limits'
+    indicators = None # IndicatorBank; the strategy host hands in the one it feeds
+    mirrors = None # MirrorFanout to the mirror accounts (empty when there are none)
+    runner = 'algo_worker' # Name on the strategy runner lease (run_all_in_one / run_strategy_host set theirs)
+    lease = None
 
     def handle(self, *args, **options):
         logger.info("--- Initializing Algo Worker V3 (Volume + Strict Limits) ---")
 
-        # 1. Initialize Redis Consumer Group
+        # 1. Initialize Redis Consumer Groups (one per loop, created independently)
+        for stream_name, start_id in ((STREAM_CANDLE, '0'), (STREAM_TICK, '$'), (STREAM_ORDER_EVENTS, '$')):
+            try:
+                r.xgroup_create(stream_name, GROUP_NAME, id=start_id, mkstream=True)
+            except redis.exceptions.ResponseError:
+                pass # Group already exists
+
+        if not self.initialize():
+            return
+        fyers, settings_db, prev_day_data_map = self.fyers, self.settings_db, self.prev_day_data_map
+        start_control('algo_worker')
+
+        # 6. Start Signal & Execution Loops
+        # Candles and ticks are consumed on separate threads so a burst of signal
+        # detection at the top of the minute never delays SL/Target checks.
+        # Both loops share trade state through the Redis trade store.
+        loops = [
+            threading.Thread(
+                target=self.consume_stream, name='signal_loop', daemon=True,
+                args=(STREAM_CANDLE, 100, LoopLag('signal'), QueryBudget('candle', CANDLE_QUERY_BUDGET),
+                      lambda data: self.process_candle(data, settings_db, prev_day_data_map))
+            ),
+            threading.Thread(
+                target=self.consume_stream, name='execution_loop', daemon=True,
+                args=(STREAM_TICK, 50, LoopLag('execution'), QueryBudget('tick', TICK_QUERY_BUDGET),
+                      lambda data: self.process_tick(data, fyers, settings_db))
+            ),
+            threading.Thread(
+                target=self.consume_stream, name='order_event_loop', daemon=True,
+                args=(STREAM_ORDER_EVENTS, 100, LoopLag('order_events'),
+                      QueryBudget('order_event', ORDER_EVENT_QUERY_BUDGET), self.apply_order_event)
+            ),
+        ]
+        for loop in loops:
+            loop.start()
+
+        logger.info(">>> Algo Worker Loops Started (signal + execution + order events) <<<")
+
+        # Heroku stops dynos with SIGTERM: turn it into a clean exit so reserved quota is released
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
         try:
-            r.xgroup_create(STREAM_CANDLE, GROUP_NAME, id='0', mkstream=True)
-            r.xgroup_create(STREAM_TICK, GROUP_NAME, id='$', mkstream=True)
-        except redis.exceptions.ResponseError:
-            pass 
+            for loop in loops:
+                loop.join()
+        finally:
+            self.shutdown()
+
+    def initialize(self):
+        """
+        Steps 2-5: runner lease, credentials, PDL cache, trade book and risk engine.
+        Shared with run_all_in_one and run_strategy_host, which host this strategy in-process.
+        """
+        # 1b. Only one strategy runner may trade (see trading.runner_lease)
+        self.lease = RunnerLease(self.runner)
+        if not self.lease.acquire():
+            return False
+        self.lease.start()
 
-        # 2. Authenticate
+        # 2. Authenticate (the primary account trades, mirror accounts copy its orders)
         try:
-            creds = FyersCredentials.objects.get(is_active=True)
-            fyers = get_fyers_client(creds.access_token)
-            settings_db, _ = GlobalTradingSettings.objects.get_or_create(user=creds.user)
+            creds = FyersCredentials.objects.primary()
+            self.fyers = Account(creds)
+            self.settings_db, _ = GlobalTradingSettings.objects.get_or_create(user=creds.user)
             logger.info(f"Authenticated as: {creds.app_id}")
+            self.mirrors = MirrorFanout(load_mirror_accounts(), self.place_mirror_order)
+            if self.mirrors:
+                logger.info(f"Mirroring orders to {len(self.mirrors)} accounts: {', '.join(a.app_id for a in self.mirrors.accounts)}")
         except Exception as e:
             logger.error(f"CRITICAL: Initialization Error: {e}")
-            return
+            self.lease.release()
+            return False
 
         # 3. Load Previous Day Low (PDL) Cache
         try:
@@ -100,80 +174,139 @@ class Command(BaseCommand):
         except Exception as e:
             logger.error(f"Failed to load PDL Cache: {e}")
             prev_day_data_map = {}
+        self.prev_day_data_map = prev_day_data_map
+
+        # 3b. Streaming Indicators (warm from the candle store and today's candle stream)
+        if self.indicators is None:
+            self.indicators = build_indicators(get_strategy_symbols())
+
+        # 4. Trade State (Redis is authoritative, DB is written behind)
+        # The local book mirrors live trades so the tick path reads no shared state;
+        # it is kept current by our own transitions and by order_events.
+        self.store = TradeStore(r)
+        self.store.recover()
+        self.book = TradeBook()
+        self.book.load(self.store)
+        logger.info(f"Trade Book loaded with {len(self.book)} live trades.")
+        TradeWriteBehind(self.store).start()
+        SetupSweeper(self.store, self.settings_db, on_expired=self.forget_trades).start()
+        if self.mirrors:
+            MirrorSweeper(self.mirrors, self.store).start() # Mirror exits that failed after the trade closed
+
+        # 5. Pre-Trade Risk Engine (local limit checks, quota reserved from Redis in blocks)
+        self.risk = PreTradeRiskEngine(r, self.settings_db)
+        today = timezone.localdate().isoformat()
+        self.risk.seed_open_positions([
+            t for t in self.book.by_id.values()
+            if t['status'] in ('PENDING_ENTRY', 'OPEN', 'PENDING_EXIT')
+            and t['created_at'] and timezone.localtime(datetime.fromisoformat(t['created_at'])).date().isoformat() == today
+        ])
+        self.fill_latency = LoopLag('fill_to_monitor')
+        return True
+
+    def shutdown(self):
+        """Clean exit: reserved quota goes back, and the next runner needn't wait out the lease."""
+        self.risk.release_unused()
+        self.lease.release()
+
+    def consume_stream(self, stream_name, batch_size, lag, budget, handler):
+        """
+        Consumer loop for a single stream. Runs on its own thread, so it gets its
+        own DB connection from Django.
+        """
+        try:
+            while True:
+                try:
+                    # Blocking read for new messages
+                    events = r.xreadgroup(
+                        groupname=GROUP_NAME,
+                        consumername=CONSUMER_NAME,
+                        streams={stream_name: '>'},
+                        count=batch_size,
+                        block=1000
+                    )
 
-        logger.info(">>> Algo Worker Loop Started <<<")
+                    if not events:
+                        lag.maybe_report()
+                        budget.maybe_report()
+                        continue
 
-        while True:
-            try:
-                # Blocking read for new messages
-                events = r.xreadgroup(
-                    groupname=GROUP_NAME, 
-                    consumername=CONSUMER_NAME, 
-                    streams={STREAM_CANDLE: '>', STREAM_TICK: '>'}, 
-                    count=10, 
-                    block=1000
-                )
-                
-                if not events:
-                    continue
-
-                for stream, messages in events:
-                    for msg_id, data in messages:
-                        try:
-                            if stream == STREAM_CANDLE:
-                                self.process_candle(data, settings_db, prev_day_data_map)
-                            elif stream == STREAM_TICK:
-                                self.process_tick(data, fyers, settings_db)
-                            
-                            # Acknowledge processed message
-                            r.xack(stream, GROUP_NAME, msg_id)
-                        except Exception as e:
-                            logger.error(f"Error processing MsgID {msg_id}: {e}")
-
-            except redis.exceptions.ConnectionError:
-                logger.error("Redis Connection Lost. Retrying...")
-                time.sleep(5)
-            except Exception as e:
-                logger.error(f"Unhandled Exception in Loop: {e}")
+                    for stream, messages in events:
+                        processed = []
+                        for msg_id, data in messages:
+                            try:
+                                lag.record(msg_id)
+                                with budget.measure():
+                                    handler(data)
+                                processed.append(msg_id)
+                            except Exception as e:
+                                logger.error(f"Error processing MsgID {msg_id}: {e}")
+
+                        # Acknowledge the processed part of the batch in one XACK (failures stay pending)
+                        xack_many(stream, GROUP_NAME, processed)
+
+                    lag.maybe_report()
+                    budget.maybe_report()
+
+                except redis.exceptions.ConnectionError:
+                    logger.error(f"Redis Connection Lost ({stream_name}). Retrying...")
+                    time.sleep(5)
+                except Exception as e:
+                    logger.error(f"Unhandled Exception in {stream_name} Loop: {e}")
+        finally:
+            connections.close_all()
 
     # =========================================================================
     # LOGIC 1: PATTERN RECOGNITION (Runs on Candle Close)
     # =========================================================================
+    @timed('process_candle')
     def process_candle(self, data, settings_db, prev_day_data_map):
         try:
             payload_str = data[b'data'].decode('utf-8') if b'data' in data else data['data']
             payload = json.loads(payload_str)
         except Exception:
             return
-
-        symbol = payload['symbol']
-        pdl_info = prev_day_data_map.get(symbol)
-        if not pdl_info: return
-
-        pdl = float(pdl_info['low'])
-        open_p = float(payload['open'])
-        close_p = float(payload['close'])
-        
-        # Extract Volume (New Feature)
-        volume = float(payload.get('volume', 0))
+        self.on_candle(payload, settings_db, prev_day_data_map)
+
+    def on_candle(self, payload, settings_db, prev_day_data_map):
+        """Decoded candle payload (the dict run_data_engine publishes)."""
+        candle = decode_candle(payload, prev_day_data_map)
+        self.indicators.on_candle(candle)
+        self.on_candle_record(candle, settings_db)
+
+    def on_candle_record(self, candle, settings_db):
+        """trading.strategy_host.Candle: PDL and turnover already worked out (shared with the scanner)."""
+        symbol = candle.symbol
+
+        # 0. Candles recovered after a reconnect are history: only the one that just closed may set up
+        if candle.backfilled:
+            closed_at = datetime.fromisoformat(candle.ts).timestamp() + 60
+            if time.time() - closed_at > BACKFILL_SIGNAL_MAX_AGE:
+                return
 
         # 1. Price Condition: Breakdown (Open > PDL > Close)
-        if open_p > pdl and close_p < pdl:
+        if candle.breakdown:
             
             # 2. Volume Turnover Filter (> 1 Crore)
-            turnover = volume * close_p
+            turnover = candle.turnover
             if turnover <= 10000000:
                 # logger.debug(f"Skipped {symbol}: Low Turnover ({turnover:,.0f})")
                 return
 
+            # 2b. Relative Volume Filter (optional; unknown until the symbol has history)
+            min_rvol = float(settings_db.min_relative_volume or 0)
+            if min_rvol and not self.indicators.relative_volume(symbol) >= min_rvol:
+                return
+
             # 3. Optimistic DB Check (Save resources if clearly maxed out)
-            today = timezone.now().date()
-            if StrategyTrade.objects.filter(symbol=symbol, created_at__date=today).count() >= settings_db.max_trades_per_symbol:
+            # Range on created_at (not __date) so the (symbol, created_at) index is used
+            day_start = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+            if StrategyTrade.objects.filter(symbol=symbol, created_at__gte=day_start).count() >= settings_db.max_trades_per_symbol:
                 return
 
             # 4. Risk Calculations
-            entry_level = float(payload['low']) * 0.9998
-            stop_loss = float(payload['high']) * 1.0002
+            entry_level = candle.low * 0.9998
+            stop_loss = candle.high * 1.0002
             risk = stop_loss - entry_level
             if risk <= 0: return
 
@@ -183,109 +316,163 @@ class Command(BaseCommand):
 
             # 5. Create PENDING Trade
             # Limits are NOT incremented here. They are incremented at Trigger Time.
-            StrategyTrade.objects.create(
-                symbol=symbol, status='PENDING', candle_timestamp=datetime.fromisoformat(payload['ts']),
-                candle_open=open_p, candle_high=payload['high'], candle_low=payload['low'],
-                candle_close=close_p, prev_day_low=pdl, entry_level=entry_level,
-                stop_loss=stop_loss, target_price=target, quantity=qty
+            trade = StrategyTrade.objects.create(
+                symbol=symbol, status='PENDING', candle_timestamp=datetime.fromisoformat(candle.ts),
+                candle_open=candle.open, candle_high=candle.high, candle_low=candle.low,
+                candle_close=candle.close, prev_day_low=candle.pdl, entry_level=entry_level,
+                stop_loss=stop_loss, initial_stop_loss=stop_loss, target_price=target, quantity=qty
             )
+            self.book.add(self.store.put(trade))
             logger.info(f"SIGNAL: {symbol} | Turnover: {turnover:,.0f} | Monitoring Entry < {entry_level}")
 
     # =========================================================================
     # LOGIC 2: EXECUTION (Runs on Every Tick)
     # =========================================================================
+    @timed('process_tick')
     def process_tick(self, data, fyers, settings_db):
         try:
-            symbol = data[b'symbol'].decode('utf-8')
+            symbol = decode_symbol(data)
             ltp = float(data[b'ltp'])
         except KeyError: return
+        if symbol is None: return
+        self.indicators.on_tick(symbol, ltp)
+        self.on_tick(symbol, ltp, fyers, settings_db)
+
+    def on_tick(self, symbol, ltp, fyers, settings_db):
+        # Local book only: no Redis or SQL reads on the tick path
+        for trade in self.book.for_symbol(symbol):
+            if trade['status'] == 'PENDING':
+                self.handle_entry(trade, symbol, ltp, fyers)
+            elif trade['status'] == 'OPEN':
+                self.handle_exit(trade, symbol, ltp, fyers, settings_db)
+
+    # --- A. ENTRY LOGIC (Atomic Limits + Redis Transition) ---
+    def handle_entry(self, trade, symbol, ltp, fyers):
+        if ltp > trade['entry_level']:
+            return
 
-        # --- A. ENTRY LOGIC (Atomic Limits + DB Lock) ---
-        pending_ids = list(StrategyTrade.objects.filter(symbol=symbol, status='PENDING').values_list('id', flat=True))
-        
-        for trade_id in pending_ids:
-            with transaction.atomic():
-                try:
-                    # LOCK ROW
-                    trade = StrategyTrade.objects.select_for_update(skip_locked=True).get(id=trade_id)
-                except StrategyTrade.DoesNotExist:
-                    continue 
-
-                if trade.status != 'PENDING': continue
-
-                if ltp <= float(trade.entry_level):
-                    # --- ATOMIC LIMIT CHECK START ---
-                    today_str = timezone.now().strftime('%Y-%m-%d')
-                    global_key = f"daily_count:{today_str}"
-                    symbol_key = f"symbol_count:{today_str}:{symbol}"
-                    
-                    # Execute Lua Script
-                    limit_result = r.eval(
-                        self.CHECK_AND_INCR_LUA, 2, global_key, symbol_key,
-                        settings_db.max_trades_per_day, settings_db.max_trades_per_symbol, 86400
-                    )
+        trade_id = trade['id']
+        allowed, reason = self.risk.check_and_reserve(symbol, trade_id, ltp * trade['quantity'])
+        if not allowed:
+            self.move(trade_id, symbol, 'PENDING', 'EXPIRED', exit_reason=reason)
+            return
 
-                    if limit_result == -1:
-                        trade.status = 'EXPIRED'; trade.exit_reason = "Global Limit Reached"; trade.save()
-                        continue
-                    elif limit_result == -2:
-                        trade.status = 'EXPIRED'; trade.exit_reason = "Symbol Limit Reached"; trade.save()
-                        continue
-                    # --- ATOMIC LIMIT CHECK END ---
-
-                    logger.info(f"ENTRY TRIGGER: {symbol} @ {ltp} | Placing SELL Order...")
-                    
-                    oid = self.place_fyers_order(fyers, symbol, trade.quantity, -1, 2)
-                    
-                    if oid:
-                        trade.status = 'PENDING_ENTRY'
-                        trade.entry_order_id = oid
-                        trade.save()
-                        logger.info(f"Entry Order Placed: {oid}")
-                    else:
-                        # ROLLBACK LIMITS ON API FAILURE
-                        r.eval(self.ROLLBACK_LUA, 2, global_key, symbol_key)
-                        trade.status = 'FAILED'
-                        trade.save()
-                        logger.error(f"Order Placement Failed. Limits Rolled Back.")
-
-        # --- B. EXIT & TSL LOGIC ---
-        open_ids = list(StrategyTrade.objects.filter(symbol=symbol, status='OPEN').values_list('id', flat=True))
-        
-        for trade_id in open_ids:
-            with transaction.atomic():
-                try:
-                    trade = StrategyTrade.objects.select_for_update(skip_locked=True).get(id=trade_id)
-                except StrategyTrade.DoesNotExist: continue
-
-                if trade.status != 'OPEN': continue
-
-                sl = float(trade.stop_loss)
-                tgt = float(trade.target_price)
-                
-                # Exit Condition
-                if ltp >= sl or ltp <= tgt:
-                    reason = "Stop Loss" if ltp >= sl else "Target"
-                    oid = self.place_fyers_order(fyers, symbol, trade.quantity, 1, 2)
-                    if oid:
-                        trade.status = 'PENDING_EXIT'
-                        trade.exit_order_id = oid
-                        trade.exit_reason = reason
-                        trade.save()
-                        logger.info(f"EXIT TRIGGER: {symbol} ({reason}) | Order: {oid}")
-                
-                # TSL Logic (Breakeven)
-                elif not trade.is_breakeven_moved:
-                    entry = float(trade.actual_entry_price or trade.entry_level)
-                    risk = sl - entry
-                    # Move to Entry if profit > Risk * Factor
-                    if (entry - ltp) >= (risk * float(settings_db.breakeven_trigger_r)):
-                        trade.stop_loss = entry
-                        trade.is_breakeven_moved = True
-                        trade.save()
-                        logger.info(f"TSL UPDATE: {symbol} Moved to Breakeven ({entry})")
+        # Claim the setup atomically (replaces the DB row lock)
+        if not self.move(trade_id, symbol, 'PENDING', 'PENDING_ENTRY'):
+            self.risk.rollback(trade_id, symbol)
+            return
+
+        logger.info(f"ENTRY TRIGGER: {symbol} @ {ltp} | Placing SELL Order...")
+        if self.mirrors:
+            self.mirrors.entry(trade_id, symbol, trade['quantity'], -1) # Submitted first: all accounts at once
+        self.send_order(fyers, symbol, trade['quantity'], -1, lambda oid: self.entry_placed(trade_id, symbol, oid))
+
+    def entry_placed(self, trade_id, symbol, oid):
+        if oid:
+            self.move(trade_id, symbol, None, None, entry_order_id=oid)
+            logger.info(f"Entry Order Placed: {oid}")
+        else:
+            # ROLLBACK LIMITS ON API FAILURE
+            self.risk.rollback(trade_id, symbol)
+            self.move(trade_id, symbol, 'PENDING_ENTRY', 'FAILED')
+            logger.error(f"Order Placement Failed. Limits Rolled Back.")
+            self.flatten_mirrors(trade_id, symbol)
+
+    # --- B. EXIT & TSL LOGIC ---
+    def handle_exit(self, trade, symbol, ltp, fyers, settings_db):
+        trade_id = trade['id']
+        sl = trade['stop_loss']
+        tgt = trade['target_price']
+
+        # Exit Condition
+        if ltp >= sl or ltp <= tgt:
+            reason = "Stop Loss" if ltp >= sl else "Target"
+            if not self.move(trade_id, symbol, 'OPEN', 'PENDING_EXIT', exit_reason=reason):
+                return
+            if self.mirrors:
+                self.mirrors.exit(trade_id, symbol, 1)
+            self.send_order(fyers, symbol, trade['quantity'], 1, lambda oid: self.exit_placed(trade_id, symbol, reason, oid))
+
+        # TSL Logic (Breakeven)
+        elif not trade['is_breakeven_moved']:
+            entry = trade['actual_entry_price'] or trade['entry_level']
+            risk = sl - entry
+            # Move to Entry if profit > Risk * Factor
+            if (entry - ltp) >= (risk * float(settings_db.breakeven_trigger_r)):
+                if self.move(trade_id, symbol, 'OPEN', None, stop_loss=entry, is_breakeven_moved=True):
+                    logger.info(f"TSL UPDATE: {symbol} Moved to Breakeven ({entry})")
+
+    def exit_placed(self, trade_id, symbol, reason, oid):
+        if oid:
+            self.move(trade_id, symbol, None, None, exit_order_id=oid)
+            logger.info(f"EXIT TRIGGER: {symbol} ({reason}) | Order: {oid}")
+        else:
+            # Stay OPEN so the next tick retries the exit
+            self.move(trade_id, symbol, 'PENDING_EXIT', 'OPEN', exit_reason=None)
+
+    # =========================================================================
+    # LOGIC 3: ORDER EVENTS (Fills / Rejections from run_order_socket)
+    # =========================================================================
+    def apply_order_event(self, data):
+        self.on_order_event(decode_order_event(data))
+
+    def on_order_event(self, event):
+        trade_id = event['trade_id']
+
+        if event['leg'] == 'entry':
+            if event['event'] == 'FILLED':
+                if self.book.get(trade_id) is None:
+                    self.book.refresh(self.store, trade_id)
+                self.book.set(trade_id, status='OPEN', actual_entry_price=event['price'])
+                # From here on the position is under SL/Target monitoring
+                self.fill_latency.record_since(event['ts'])
+                self.fill_latency.maybe_report()
+            else:
+                self.book.remove(trade_id)
+                self.risk.close_position(trade_id)
+                self.flatten_mirrors(trade_id, event['symbol'])
+        else:
+            if event['event'] == 'FILLED':
+                self.book.remove(trade_id)
+                self.risk.close_position(trade_id)
+            else:
+                # Exit order died: back to monitoring, next tick retries the exit
+                self.book.set(trade_id, status='OPEN', exit_order_id=None)
+
+    def flatten_mirrors(self, trade_id, symbol):
+        """The primary entry died after the mirrors were sent theirs: close them again."""
+        if self.mirrors:
+            logger.warning(f"Primary entry of {symbol} failed. Exiting mirror accounts...")
+            self.mirrors.exit(trade_id, symbol, 1)
+
+    def forget_trades(self, trade_ids):
+        """Sweeper callback: expired setups leave the local book."""
+        for trade_id in trade_ids:
+            self.book.remove(trade_id)
+
+    def move(self, trade_id, symbol, expected, new_status, **fields):
+        """
+        Transition in the trade store and mirror it in the local book.
+        If Redis disagrees with our expectation, the book is stale: re-read the trade.
+        """
+        if self.store.transition(trade_id, symbol, expected, new_status, **fields):
+            if new_status:
+                fields['status'] = new_status
+            self.book.set(trade_id, **fields)
+            return True
+        self.book.refresh(self.store, trade_id)
+        return False
 
     # --- API WRAPPER ---
+    def send_order(self, fyers, symbol, qty, side, on_result):
+        """Place a market order and hand the order id (None on failure) to on_result.
+        Synchronous here; run_all_in_one queues it to its order gateway instead."""
+        on_result(self.place_fyers_order(fyers, symbol, qty, side, 2))
+
+    def place_mirror_order(self, account, symbol, qty, side):
+        return self.place_fyers_order(account, symbol, qty, side, 2)
+
+    @timed('place_fyers_order')
     def place_fyers_order(self, fyers, symbol, qty, side, type):
         """
         Side: 1=Buy, -1=Sell
@@ -0,0 +1,355 @@
+import json
+import time
+import redis
+import signal
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand
+from trading.ring_buffer import RingBuffer
+from trading.query_budget import QueryBudget
+from trading.trade_store import TradeBook, ORDER_EVENTS_STREAM
+from trading.strategy_host import decode_candle
+from trading.indicators import IndicatorBank
+from trading.profiling import start_control
+from trading.redis_client import r, get_async_redis, xack_many
+from trading.management.commands.run_data_engine import Command as DataEngine, tick_payload
+from trading.management.commands.run_scanner_worker import Command as ScannerWorker, SCAN_QUERY_BUDGET
+from trading.management.commands.run_algo_worker import (
+    Command as AlgoWorker, LoopLag, GROUP_NAME, CONSUMER_NAME, CANDLE_QUERY_BUDGET, LAG_REPORT_INTERVAL,
+)
+
+# Logging Setup
+logger = logging.getLogger('all_in_one')
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+STREAM_TICK = "market_ticks"
+STREAM_CANDLE = "candle_stream_1m"
+
+TICK_RING_SIZE = 65536
+CANDLE_RING_SIZE = 16384
+MIRROR_RING_SIZE = 131072
+TICK_BATCH = 256
+CANDLE_BATCH = 100
+MIRROR_BATCH = 500 # Stream entries per pipelined round trip
+ORDER_CONCURRENCY = 8 # Orders in flight to the broker at once
+ORDER_BACKLOG_WARN = 64 # Queued order intents worth a warning (the queue is unbounded)
+
+BENCH_STREAM = "bench:market_ticks"
+BENCH_GROUP = "BENCH_GROUP"
+BENCH_SYMBOLS = 200
+
+
+class InProcessDataEngine(DataEngine):
+    """run_data_engine with its outputs going to the ring buffers (and the Redis mirror) instead of XADD."""
+
+    def __init__(self, host):
+        super().__init__()
+        self.host = host
+
+    def publish_tick(self, symbol, ltp, ts):
+        self.host.ticks.put((symbol, ltp, ts))
+        self.host.mirror.put((STREAM_TICK, tick_payload(symbol, ltp, ts)))
+
+    def publish_candles(self, payloads):
+        for payload in payloads:
+            self.host.candles.put(payload)
+            self.host.mirror.put((STREAM_CANDLE, {'data': json.dumps(payload)}))
+
+
+def decide(strategy, ticks, lag, fyers, settings_db):
+    """One batch of ticks through the strategy (on the decision thread)."""
+    for symbol, ltp, ts in ticks:
+        try:
+            strategy.indicators.on_tick(symbol, ltp)
+            strategy.on_tick(symbol, ltp, fyers, settings_db)
+        except Exception as e:
+            logger.error(f"Tick Error ({symbol}): {e}")
+        lag.record_since(ts)
+
+
+class InProcessStrategy(AlgoWorker):
+    """run_algo_worker's strategy; orders go to the gateway task instead of blocking the tick path."""
+    runner = 'all_in_one'
+
+    def __init__(self, orders):
+        super().__init__()
+        self.orders = orders
+
+    def send_order(self, fyers, symbol, qty, side, on_result):
+        self.orders.put((fyers, symbol, qty, side, on_result))
+
+
+class Command(BaseCommand):
+    help = (
+        'Low-latency mode: data engine, scanner, strategy and order gateway in one process, '
+        'connected by in-memory ring buffers. Replaces the data_engine, scanner_worker and '
+        'algo_worker dynos (it will not start while another strategy runner holds the lease). Redis only mirrors ticks and candles '
+        'for the dashboard, the MTM engine and recovery.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--benchmark', type=int, default=0, metavar='TICKS',
+                            help='Measure tick-to-decision latency (in-process vs Redis stream hop) and exit')
+        parser.add_argument('--rate', type=int, default=2000, help='Benchmark ticks per second')
+
+    def handle(self, *args, **options):
+        if options['benchmark']:
+            return self.benchmark(options['benchmark'], options['rate'])
+
+        logger.info("--- Initializing All-in-One Engine ---")
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self.ticks = RingBuffer('ticks', TICK_RING_SIZE, loop)
+        self.candles = RingBuffer('candles', CANDLE_RING_SIZE, loop)
+        self.orders = RingBuffer('orders', None, loop) # Never drops: a lost intent strands its trade
+        self.mirror = RingBuffer('mirror', MIRROR_RING_SIZE, loop)
+        # Strategy decisions (ticks, order results, order events) make Redis calls: they run
+        # in order on this one thread, so a slow Redis never stalls the loop
+        self.decisions = ThreadPoolExecutor(max_workers=1, thread_name_prefix='decisions')
+
+        # 1. Strategy state (credentials, PDL, trade book, risk) exactly as run_algo_worker loads it
+        try:
+            r.xgroup_create(ORDER_EVENTS_STREAM, GROUP_NAME, id='$', mkstream=True)
+        except redis.exceptions.ResponseError:
+            pass # Group already exists
+        self.strategy = InProcessStrategy(self.orders)
+        if not self.strategy.initialize():
+            return
+        self.scanner = ScannerWorker()
+        start_control('all_in_one') # First caller names the process: the in-process data engine's call is a no-op
+
+        # 2. Market data socket on its own thread (the SDK calls back on its threads anyway)
+        threading.Thread(target=InProcessDataEngine(self).handle, name='data_engine', daemon=True).start()
+
+        # 3. Everything else is a task on one event loop
+        try:
+            loop.run_until_complete(self.main())
+        finally:
+            self.decisions.shutdown(wait=True)
+            self.strategy.shutdown()
+            loop.close()
+
+    async def main(self):
+        self.stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.stop.set)
+
+        self.aredis = get_async_redis()
+        self.inflight = set()
+        tasks = [asyncio.create_task(coro) for coro in (
+            self.tick_loop(), self.candle_loop(), self.order_gateway(),
+            self.order_event_loop(), self.mirror_loop(), self.report_loop(),
+        )]
+        logger.info(">>> All-in-One Loops Started (ticks + candles + orders + order events + mirror) <<<")
+
+        await self.stop.wait()
+        logger.info("Shutting down...")
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, *self.inflight, return_exceptions=True)
+
+    # =========================================================================
+    # TASKS
+    # =========================================================================
+    async def tick_loop(self):
+        """
+        SL / target / entry checks straight off the socket. Checks read the local
+        book only; a trigger writes to Redis (trade store transition, risk reserve),
+        so each batch runs on the decision thread rather than on the loop.
+        """
+        strategy = self.strategy
+        loop = asyncio.get_running_loop()
+        lag = LoopLag('tick_to_decision')
+        while True:
+            ticks = await self.ticks.get_batch(TICK_BATCH)
+            await loop.run_in_executor(self.decisions, decide, strategy, ticks, lag, strategy.fyers, strategy.settings_db)
+            lag.maybe_report()
+
+    async def candle_loop(self):
+        # New setups and scan results are DB writes: they run on Django's sync thread, never on the loop
+        process = sync_to_async(self.process_candles)
+        self.candle_budget = QueryBudget('candle', CANDLE_QUERY_BUDGET)
+        self.scan_budget = QueryBudget('scan', SCAN_QUERY_BUDGET)
+        while True:
+            await process(await self.candles.get_batch(CANDLE_BATCH))
+
+    def process_candles(self, payloads):
+        strategy = self.strategy
+        for payload in payloads:
+            try:
+                candle = decode_candle(payload, strategy.prev_day_data_map) # Once for both consumers
+                strategy.indicators.on_candle(candle)
+            except Exception as e:
+                logger.error(f"Bad Candle ({payload.get('symbol')}): {e}")
+                continue
+            try:
+                with self.candle_budget.measure():
+                    strategy.on_candle_record(candle, strategy.settings_db)
+            except Exception as e:
+                logger.error(f"Signal Error ({candle.symbol}): {e}")
+            try:
+                with self.scan_budget.measure():
+                    self.scanner.scan(candle)
+            except Exception as e:
+                logger.error(f"Scanner Error ({candle.symbol}): {e}")
+        self.candle_budget.maybe_report()
+        self.scan_budget.maybe_report()
+
+    async def order_gateway(self):
+        slots = asyncio.Semaphore(ORDER_CONCURRENCY)
+        while True:
+            for order in await self.orders.get_batch(ORDER_CONCURRENCY):
+                await slots.acquire()
+                task = asyncio.create_task(self.place_order(slots, *order))
+                self.inflight.add(task)
+                task.add_done_callback(self.inflight.discard)
+
+    async def place_order(self, slots, fyers, symbol, qty, side, on_result):
+        try:
+            oid = await asyncio.to_thread(self.strategy.place_fyers_order, fyers, symbol, qty, side, 2)
+            # Book and store transitions stay on one thread with the tick path
+            await asyncio.get_running_loop().run_in_executor(self.decisions, on_result, oid)
+        except Exception as e:
+            logger.error(f"Order Gateway Error ({symbol}): {e}")
+        finally:
+            slots.release()
+
+    async def order_event_loop(self):
+        """Fills / rejections from run_order_socket (a separate process, so still a Redis stream)."""
+        lag = LoopLag('order_events')
+        while True:
+            try:
+                events = await self.aredis.xreadgroup(
+                    groupname=GROUP_NAME, consumername=CONSUMER_NAME,
+                    streams={ORDER_EVENTS_STREAM: '>'}, count=100, block=1000
+                )
+                for stream, messages in events or []:
+                    processed = await asyncio.get_running_loop().run_in_executor(
+                        self.decisions, self.apply_order_events, messages, lag,
+                    )
+                    if processed:
+                        await self.aredis.xack(stream, GROUP_NAME, *processed)
+                lag.maybe_report()
+            except redis.exceptions.ConnectionError:
+                logger.error("Redis Connection Lost (order events). Retrying...")
+                await asyncio.sleep(5)
+
+    def apply_order_events(self, messages, lag):
+        """Decision thread: the book refresh and risk release behind each event are Redis calls."""
+        processed = []
+        for msg_id, data in messages:
+            try:
+                lag.record(msg_id)
+                self.strategy.apply_order_event(data)
+                processed.append(msg_id)
+            except Exception as e:
+                logger.error(f"Error processing MsgID {msg_id}: {e}")
+        return processed
+
+    async def mirror_loop(self):
+        """Ticks and candles to their Redis streams, batched, off the decision path."""
+        while True:
+            batch = await self.mirror.get_batch(MIRROR_BATCH)
+            try:
+                pipe = self.aredis.pipeline(transaction=False)
+                for stream, fields in batch:
+                    pipe.xadd(stream, fields)
+                await pipe.execute()
+            except redis.exceptions.ConnectionError:
+                logger.error(f"Redis Mirror Lost. Dropped {len(batch)} entries, retrying...")
+                await asyncio.sleep(1)
+
+    async def report_loop(self):
+        while True:
+            await asyncio.sleep(LAG_REPORT_INTERVAL)
+            for ring in (self.ticks, self.candles, self.mirror):
+                dropped = ring.take_dropped()
+                if dropped:
+                    logger.warning(f"RING [{ring.name}] overflowed: {dropped} oldest items dropped (depth {len(ring)})")
+            if len(self.orders) > ORDER_BACKLOG_WARN:
+                logger.warning(f"Order gateway backlog: {len(self.orders)} orders queued, {len(self.inflight)} in flight")
+
+    # =========================================================================
+    # BENCHMARK
+    # =========================================================================
+    def benchmark(self, count, rate):
+        """
+        Tick-to-decision latency of the same strategy code fed two ways:
+        in_process   socket thread -> ring buffer -> tick task -> decision thread (this command)
+        redis_stream XADD -> XREADGROUP -> decode (run_data_engine -> run_algo_worker)
+        Every benchmark symbol has a PENDING setup that never triggers, so each
+        tick runs the full entry check but places no order.
+        """
+        symbols = [f"NSE:BENCH{i}-EQ" for i in range(BENCH_SYMBOLS)]
+        strategy = AlgoWorker()
+        strategy.book = TradeBook()
+        strategy.indicators = IndicatorBank(symbols, 0)
+        for i, symbol in enumerate(symbols):
+            strategy.book.add({'id': -1 - i, 'symbol': symbol, 'status': 'PENDING', 'entry_level': 1.0})
+
+        self.stdout.write(f"Tick-to-decision, {count} ticks at {rate}/s over {len(symbols)} symbols:")
+        for name, run in (('in_process', self.bench_in_process), ('redis_stream', self.bench_redis_stream)):
+            s = run(strategy, symbols, count, rate)
+            self.stdout.write(f"  {name:<13} p50={s['p50']:.3f}ms p99={s['p99']:.3f}ms max={s['max']:.3f}ms n={s['n']}")
+        self.stdout.write("  (redis_stream against the local REDIS_URL; between dynos add the network round trips)")
+
+    def produce_ticks(self, symbols, count, rate, put):
+        start = time.time()
+        for i in range(count):
+            delay = start + i / rate - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            put(symbols[i % len(symbols)], 100.0 + (i % 50) * 0.05, time.time())
+
+    def bench_in_process(self, strategy, symbols, count, rate):
+        lag = LoopLag('in_process', window=count)
+        loop = asyncio.new_event_loop()
+        ring = RingBuffer('bench', count, loop)
+
+        decisions = ThreadPoolExecutor(max_workers=1)
+
+        async def consume():
+            seen = 0
+            while seen < count:
+                ticks = await ring.get_batch(TICK_BATCH)
+                await loop.run_in_executor(decisions, decide, strategy, ticks, lag, None, None)
+                seen += len(ticks)
+
+        producer = threading.Thread(target=self.produce_ticks, args=(symbols, count, rate, lambda *tick: ring.put(tick)))
+        producer.start()
+        try:
+            loop.run_until_complete(consume())
+        finally:
+            producer.join()
+            decisions.shutdown()
+            loop.close()
+        return lag.summary()
+
+    def bench_redis_stream(self, strategy, symbols, count, rate):
+        lag = LoopLag('redis_stream', window=count)
+        r.delete(BENCH_STREAM)
+        r.xgroup_create(BENCH_STREAM, BENCH_GROUP, id='$', mkstream=True)
+        producer = threading.Thread(target=self.produce_ticks, args=(
+            symbols, count, rate, lambda symbol, ltp, ts: r.xadd(BENCH_STREAM, {'symbol': symbol, 'ltp': ltp, 'ts': ts})
+        ))
+        producer.start()
+        try:
+            seen = 0
+            while seen < count:
+                events = r.xreadgroup(groupname=BENCH_GROUP, consumername='bench', streams={BENCH_STREAM: '>'}, count=50, block=1000)
+                if not events and not producer.is_alive():
+                    break
+                for stream, messages in events or []:
+                    for msg_id, data in messages:
+                        strategy.process_tick(data, None, None)
+                        lag.record_since(float(data[b'ts']))
+                        seen += 1
+                    xack_many(stream, BENCH_GROUP, [msg_id for msg_id, _ in messages])
+        finally:
+            producer.join()
+            r.delete(BENCH_STREAM)
+        return lag.summary()
@@ -0,0 +1,58 @@
+import time
+import logging
+from collections import Counter
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from trading.models import GlobalTradingSettings
+from trading.constants import get_strategy_symbols
+from trading.analytics import trade_sums, derive
+from trading.backtest import params_from_settings, session_range, run_backtest, write_ledger
+
+logger = logging.getLogger('backtest')
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+
+class Command(BaseCommand):
+    help = 'Backtests the cash breakdown strategy on historical 1m candles (process pool, one symbol per task)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', help='First session to simulate (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='date_to', help='Last session to simulate (YYYY-MM-DD)')
+        parser.add_argument('--symbols', help='Comma separated symbols (default: the strategy universe)')
+        parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: all cores)')
+        parser.add_argument('--output', default='backtest_ledger.csv', help='Trade ledger CSV')
+
+    def handle(self, *args, **options):
+        symbols = options['symbols'].split(',') if options['symbols'] else get_strategy_symbols()
+        data_dir = settings.CANDLE_DATA_DIR
+
+        settings_db = GlobalTradingSettings.objects.filter(user__fyerscredentials__is_active=True, user__fyerscredentials__is_mirror=False).first() \
+            or GlobalTradingSettings.objects.first() or GlobalTradingSettings()
+        params = params_from_settings(settings_db)
+        tz = timezone.get_current_timezone()
+        utc_offset = int(timezone.localtime().utcoffset().total_seconds())
+        try:
+            start_ts, end_ts = session_range(options['date_from'], options['date_to'], tz)
+        except ValueError as e:
+            raise CommandError(f"Invalid date: {e}")
+
+        started = time.time()
+        trades, missing = run_backtest(symbols, params, data_dir, utc_offset, start_ts, end_ts, options['workers'])
+        elapsed = time.time() - started
+        if missing:
+            logger.warning(f"No candle data for {len(missing)} symbols (store_candles --history): {', '.join(missing[:10])}")
+
+        write_ledger(options['output'], trades, tz)
+
+        closed = [t for t in trades if t['status'] == 'CLOSED']
+        totals = Counter()
+        for trade in closed:
+            totals.update(trade_sums(trade))
+        stats = derive(totals)
+        outcomes = Counter(t['exit_reason'] for t in trades)
+
+        self.stdout.write(f"Backtest: {len(symbols) - len(missing)} symbols in {elapsed:.1f}s, {len(trades)} setups, {len(closed)} trades")
+        self.stdout.write(f"  P&L {stats['pnl']} | win rate {stats['win_rate']}% | avg R {stats['avg_r']} | profit factor {stats['profit_factor']}")
+        self.stdout.write("  " + " | ".join(f"{reason}: {count}" for reason, count in outcomes.most_common()))
+        self.stdout.write(f"  Ledger: {options['output']}")
@@ -1,99 +1,254 @@
 import json
 import time
-import redis
+import queue
 import logging
-import ssl
+import threading
 from datetime import datetime
-from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.utils import timezone
 from trading.models import FyersCredentials
+from trading.fyers_auth_util import get_fyers_client
+from trading.candle_backfill import GapBackfiller
 from fyers_apiv3.FyersWebsocket import data_ws
 from trading.constants import get_strategy_symbols
+from trading.socket_rotation import SocketRotator, isolated_socket_class, format_ws_token
+from trading.symbol_master import get_master
+from trading.profiling import timed, start_control
+from trading.redis_client import r, xadd_many
 
 logger = logging.getLogger('data_engine')
 
-if settings.REDIS_URL.startswith('rediss://'):
-    r = redis.from_url(settings.REDIS_URL, ssl_cert_reqs=ssl.CERT_NONE)
-else:
-    r = redis.from_url(settings.REDIS_URL)
+CHECKPOINT_KEY = "candle_checkpoint" # symbol -> partial candle + last emitted minute
+CHECKPOINT_DAY_KEY = "candle_checkpoint_day"
+CHECKPOINT_INTERVAL = 5 # Seconds
+SESSION_OPEN = (9, 15) # IST, earliest minute worth backfilling
+
+def tick_payload(symbol, ltp, ts):
+    """market_ticks entry: the symbol master id when the symbol has one, else the string."""
+    sid = get_master().id_of(symbol)
+    if sid is None:
+        return {'symbol': symbol, 'ltp': ltp, 'ts': ts}
+    return {'sid': sid, 'ltp': ltp, 'ts': ts}
 
 class Command(BaseCommand):
     help = 'Runs Fyers V3 Data Socket with Batched Subscription'
 
     def handle(self, *args, **options):
+        self.symbols = get_strategy_symbols()
+        self.candle_map = {}
+        self.last_emitted = {} # symbol -> epoch minute of the last candle sent downstream
+        self.lock = threading.Lock() # candle_map / last_emitted are shared with backfill & checkpoint threads
+        self.fyers = None
+        self.backfiller = GapBackfiller(lambda params: self.fyers.history(data=params), self.emit_backfilled)
+        start_control('data_engine')
+
+        # Token changes (dashboard login or a 403) rotate the socket in place:
+        # the new socket subscribes while the old one keeps streaming.
+        self.rotation_requests = queue.Queue()
+        self.rotator = SocketRotator('data_engine', self.connect_socket, cut_on_first_message=True)
+        threading.Thread(target=self.listen_for_token_update, daemon=True).start()
+
+        # Resume the minute in progress and backfill whatever we missed while down
+        self.restore_checkpoint()
+        threading.Thread(target=self.checkpoint_loop, daemon=True).start()
+
+        token = self.load_token()
+        self.rotator.start(token)
+        self.backfill_gaps()
+
         while True:
+            reason = self.rotation_requests.get()
+            new_token = self.load_token()
+            if new_token == token:
+                logger.warning(f"Rotation requested ({reason}) but token is unchanged. Waiting for a new login...")
+                continue
+            logger.info(f"Rotating data socket ({reason})...")
             try:
-                creds = FyersCredentials.objects.get(is_active=True)
-                raw_token = creds.access_token
-                app_id = creds.app_id
-                
-                # --- CRITICAL FIX: FORMAT TOKEN ---
-                if ":" not in raw_token:
-                    full_token = f"{app_id}:{raw_token}"
-                else:
-                    full_token = raw_token
-                    
-                logger.info(f"Data Engine Token Loaded for App: {app_id}")
+                self.rotator.rotate(new_token)
+                token = new_token
+            except Exception as e:
+                logger.error(f"Rotation Failed: {e}")
+
+    def load_token(self):
+        while True:
+            try:
+                creds = FyersCredentials.objects.primary()
+                logger.info(f"Data Engine Token Loaded for App: {creds.app_id}")
+                self.fyers = get_fyers_client(creds.access_token) # REST client for backfills
+                return format_ws_token(creds.app_id, creds.access_token)
             except FyersCredentials.DoesNotExist:
                 logger.error("No active credentials.")
                 time.sleep(10)
-                continue
 
-            symbols = get_strategy_symbols()
-            candle_map = {}
-
-            def on_message(message):
-                if not isinstance(message, dict) or 'type' not in message: return
-                if 'symbol' in message and 'ltp' in message:
-                    symbol = message['symbol']
-                    ltp = float(message['ltp'])
-                    curr_vol = int(message.get('vol_traded_today', 0))
-                    ts = time.time()
-                    curr_min = int(ts // 60)
-
-                    r.xadd('market_ticks', {'symbol': symbol, 'ltp': ltp, 'ts': ts})
-
-                    if symbol not in candle_map:
-                        candle_map[symbol] = {'minute': curr_min, 'open': ltp, 'high': ltp, 'low': ltp, 'close': ltp, 'start_vol': curr_vol}
-                    
-                    c = candle_map[symbol]
-                    if curr_min > c['minute']:
-                        vol = curr_vol - c['start_vol']
-                        if vol < 0: vol = 0
-                        final = {'symbol': symbol, 'open': c['open'], 'high': c['high'], 'low': c['low'], 'close': c['close'], 'volume': vol, 'ts': datetime.fromtimestamp(c['minute']*60).isoformat()}
-                        r.xadd('candle_stream_1m', {'data': json.dumps(final)})
-                        candle_map[symbol] = {'minute': curr_min, 'open': ltp, 'high': ltp, 'low': ltp, 'close': ltp, 'start_vol': curr_vol}
-                    else:
-                        c['high'] = max(c['high'], ltp); c['low'] = min(c['low'], ltp); c['close'] = ltp
-
-            def on_error(msg):
-                logger.error(f"Socket Error: {msg}")
-                if '403' in str(msg):
-                    logger.critical("Token 403. Restarting...")
-                    # Raising exception breaks the internal loop to force outer loop restart
-                    raise Exception("Token Expired")
-
-            def on_close(msg): logger.info("Socket Closed")
-            
-            def on_open():
-                logger.info(f"Connected. Subscribing to {len(symbols)} symbols...")
-                batch_size = 50
-                for i in range(0, len(symbols), batch_size):
-                    batch = symbols[i : i + batch_size]
-                    fyers_socket.subscribe(symbols=batch, data_type="SymbolUpdate")
-                    time.sleep(0.5) 
-                fyers_socket.keep_running()
+    def listen_for_token_update(self):
+        while True:
+            try:
+                pubsub = r.pubsub()
+                pubsub.subscribe('fyers_token_update')
+                for message in pubsub.listen():
+                    if message['type'] == 'message':
+                        self.rotation_requests.put('token update')
+            except Exception as e:
+                logger.error(f"Token Listener Error: {e}")
+                time.sleep(5)
+
+    def connect_socket(self, token, generation):
+        """Builds, connects and subscribes one socket generation (blocks until subscribed)."""
+        holder = {}
+
+        @timed('on_message')
+        def on_message(message):
+            if self.rotator.accept(generation):
+                self.on_tick(message)
+
+        def on_error(msg):
+            logger.error(f"Socket Error (gen {generation}): {msg}")
+            if '403' in str(msg) and self.rotator.is_active(generation):
+                logger.critical("Token 403. Requesting rotation...")
+                self.rotation_requests.put('403')
+
+        def on_close(msg): logger.info(f"Socket Closed (gen {generation})")
 
+        def on_open():
+            fyers_socket = holder['socket']
+            logger.info(f"Connected (gen {generation}). Subscribing to {len(self.symbols)} symbols...")
+            batch_size = 50
+            for i in range(0, len(self.symbols), batch_size):
+                batch = self.symbols[i : i + batch_size]
+                fyers_socket.subscribe(symbols=batch, data_type="SymbolUpdate")
+                time.sleep(0.5)
+            fyers_socket.keep_running()
+
+            # The SDK calls on_open again after an internal reconnect of the live socket:
+            # that is a real gap. A new generation during rotation is not (the old one kept feeding).
+            if self.rotator.is_active(generation):
+                logger.warning(f"Reconnected (gen {generation}). Checking for missed minutes...")
+                self.backfill_gaps()
+
+        socket_class = isolated_socket_class(data_ws.FyersDataSocket)
+        fyers_socket = socket_class(
+            access_token=token, # Use the formatted token
+            log_path="",
+            litemode=False,
+            write_to_file=False,
+            reconnect=True,
+            on_connect=on_open, on_close=on_close, on_error=on_error, on_message=on_message
+        )
+        holder['socket'] = fyers_socket
+        fyers_socket.connect()
+        return fyers_socket
+
+    def on_tick(self, message):
+        if not isinstance(message, dict) or 'type' not in message: return
+        if 'symbol' in message and 'ltp' in message:
+            symbol = message['symbol']
+            ltp = float(message['ltp'])
+            curr_vol = int(message.get('vol_traded_today', 0))
+            ts = time.time()
+            curr_min = int(ts // 60)
+
+            self.publish_tick(symbol, ltp, ts)
+
+            with self.lock:
+                candle_map = self.candle_map
+                if symbol not in candle_map:
+                    candle_map[symbol] = {'minute': curr_min, 'open': ltp, 'high': ltp, 'low': ltp, 'close': ltp, 'start_vol': curr_vol}
+
+                c = candle_map[symbol]
+                if curr_min > c['minute']:
+                    vol = curr_vol - c['start_vol']
+                    if vol < 0: vol = 0
+                    self.emit_candle(symbol, dict(c, volume=vol))
+                    candle_map[symbol] = {'minute': curr_min, 'open': ltp, 'high': ltp, 'low': ltp, 'close': ltp, 'start_vol': curr_vol}
+                else:
+                    c['high'] = max(c['high'], ltp); c['low'] = min(c['low'], ltp); c['close'] = ltp
+
+    def candle_payload(self, symbol, c, backfilled=False):
+        final = {'symbol': symbol, 'open': c['open'], 'high': c['high'], 'low': c['low'], 'close': c['close'], 'volume': c['volume'], 'ts': datetime.fromtimestamp(c['minute']*60).isoformat()}
+        if backfilled:
+            final['backfilled'] = True
+        return final
+
+    def emit_candle(self, symbol, c):
+        """Publish one finished candle. Caller holds self.lock."""
+        self.publish_candles([self.candle_payload(symbol, c)])
+        self.last_emitted[symbol] = max(c['minute'], self.last_emitted.get(symbol, 0))
+
+    def emit_backfilled(self, symbol, candles):
+        """All recovered candles of one symbol in one pipelined round trip."""
+        with self.lock:
+            self.publish_candles([self.candle_payload(symbol, c, backfilled=True) for c in candles])
+            self.last_emitted[symbol] = max([c['minute'] for c in candles] + [self.last_emitted.get(symbol, 0)])
+
+    # --- Outputs (run_all_in_one overrides these to feed its ring buffers) ---
+    def publish_tick(self, symbol, ltp, ts):
+        r.xadd('market_ticks', tick_payload(symbol, ltp, ts))
+
+    def publish_candles(self, payloads):
+        if len(payloads) == 1:
+            r.xadd('candle_stream_1m', {'data': json.dumps(payloads[0])})
+        else:
+            xadd_many('candle_stream_1m', [{'data': json.dumps(p)} for p in payloads])
+
+    # =========================================================================
+    # GAP DETECTION & CHECKPOINTS
+    # =========================================================================
+    def backfill_gaps(self):
+        """
+        Every minute between a symbol's last emitted candle and the current minute
+        is missing. Partial candles from before the gap are dropped (history has the
+        complete ones).
+        """
+        now_min = int(time.time() // 60)
+        session_open = timezone.localtime().replace(hour=SESSION_OPEN[0], minute=SESSION_OPEN[1], second=0, microsecond=0)
+        first_min = int(session_open.timestamp() // 60)
+
+        gaps = {}
+        with self.lock:
+            for symbol, c in list(self.candle_map.items()):
+                if c['minute'] < now_min:
+                    del self.candle_map[symbol]
+            for symbol, last in self.last_emitted.items():
+                start = max(last + 1, first_min)
+                if start < now_min:
+                    gaps[symbol] = list(range(start, now_min))
+
+        if gaps:
+            self.backfiller.submit(gaps)
+
+    def checkpoint_loop(self):
+        while True:
+            time.sleep(CHECKPOINT_INTERVAL)
             try:
-                fyers_socket = data_ws.FyersDataSocket(
-                    access_token=full_token, # Use the formatted token
-                    log_path="",
-                    litemode=False,
-                    write_to_file=False,
-                    reconnect=True,
-                    on_connect=on_open, on_close=on_close, on_error=on_error, on_message=on_message
-                )
-                fyers_socket.connect()
+                with self.lock:
+                    snapshot = {
+                        sym: json.dumps({'candle': self.candle_map.get(sym), 'last_emitted': self.last_emitted.get(sym)})
+                        for sym in set(self.candle_map) | set(self.last_emitted)
+                    }
+                if snapshot:
+                    pipe = r.pipeline(transaction=True)
+                    pipe.hset(CHECKPOINT_KEY, mapping=snapshot)
+                    pipe.set(CHECKPOINT_DAY_KEY, timezone.localdate().isoformat())
+                    pipe.execute()
             except Exception as e:
-                logger.error(f"Engine Exception: {e}")
-                time.sleep(5)
\ No newline at end of file
+                logger.error(f"Checkpoint Failed: {e}")
+
+    def restore_checkpoint(self):
+        try:
+            day = r.get(CHECKPOINT_DAY_KEY)
+            if not day or day.decode('utf-8') != timezone.localdate().isoformat():
+                return
+            now_min = int(time.time() // 60)
+            resumed = 0
+            for k, v in r.hgetall(CHECKPOINT_KEY).items():
+                sym = k.decode('utf-8')
+                state = json.loads(v)
+                if state.get('last_emitted'):
+                    self.last_emitted[sym] = state['last_emitted']
+                c = state.get('candle')
+                if c and c['minute'] == now_min:
+                    self.candle_map[sym] = c
+                    resumed += 1
+            logger.info(f"Checkpoint restored: {len(self.last_emitted)} symbols, {resumed} candles resumed mid-minute.")
+        except Exception as e:
+            logger.error(f"Checkpoint Restore Failed: {e}")
@@ -0,0 +1,98 @@
+import json
+import time
+import redis
+import logging
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from trading.trade_store import TradeStore, ORDER_EVENTS_STREAM, DASHBOARD_EVENTS_STREAM, DASHBOARD_EVENTS_MAXLEN, decode_order_event
+from trading.mtm import MarkToMarket, seed_session, MTM_POSITIONS_KEY, MTM_PORTFOLIO_KEY, encode_positions
+from trading.symbol_master import get_master, decode_symbol
+from trading.profiling import start_control
+from trading.redis_client import r
+
+# Logging Setup
+logger = logging.getLogger('mtm_engine')
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+STREAM_TICK = "market_ticks"
+PUBLISH_INTERVAL = 1.0 # Seconds between snapshots (only when something changed)
+HEARTBEAT_INTERVAL = 10 # Republish unchanged snapshots so readers can tell we are alive
+
+class Command(BaseCommand):
+    help = 'Live mark-to-market of open positions from market_ticks (snapshots to Redis)'
+
+    def handle(self, *args, **options):
+        logger.info("--- Initializing MTM Engine ---")
+        self.store = TradeStore(r)
+        self.mtm = MarkToMarket()
+        start_control('mtm_engine')
+
+        # 1. Stream positions first, so no fill between tailing and loading is lost. Fills
+        # after the tail are replayed: a trade already open is not opened again, and one
+        # already counted as closed is ignored by both open() and close()
+        last_ids = {STREAM_TICK: self.stream_tail(STREAM_TICK), ORDER_EVENTS_STREAM: self.stream_tail(ORDER_EVENTS_STREAM)}
+
+        # 2. Open positions and realized P&L of the session, both from one read of the trade store
+        seed_session(self.mtm, self.store)
+        self.day = timezone.localdate()
+        logger.info(f"MTM: {len(self.mtm.positions)} open positions, realized today {self.mtm.realized:.2f}")
+
+        # 3. One loop for both streams: no locks, ticks for flat symbols are skipped with one dict lookup
+        master = get_master()
+        last_publish = 0
+        while True:
+            try:
+                events = r.xread(last_ids, count=1000, block=int(PUBLISH_INTERVAL * 1000))
+                for stream, messages in events or []:
+                    stream = stream.decode('utf-8')
+                    last_ids[stream] = messages[-1][0]
+                    if stream == STREAM_TICK:
+                        for _, data in messages:
+                            symbol = decode_symbol(data, master)
+                            if symbol is not None:
+                                self.mtm.on_tick(symbol, float(data[b'ltp']))
+                    else:
+                        for _, data in messages:
+                            self.apply_order_event(decode_order_event(data))
+
+                now = time.time()
+                elapsed = now - last_publish
+                if (self.mtm.dirty and elapsed >= PUBLISH_INTERVAL) or elapsed >= HEARTBEAT_INTERVAL:
+                    self.publish()
+                    last_publish = now
+            except redis.exceptions.ConnectionError:
+                logger.error("Redis Connection Lost. Retrying...")
+                time.sleep(5)
+            except Exception as e:
+                logger.error(f"Unhandled Exception in MTM Loop: {e}")
+
+    def stream_tail(self, stream):
+        last = r.xrevrange(stream, count=1)
+        return last[0][0] if last else '0-0'
+
+    def apply_order_event(self, event):
+        if event['event'] != 'FILLED':
+            return
+        if event['leg'] == 'entry':
+            trade = self.store.get(event['trade_id'])
+            if trade:
+                self.mtm.open(trade['id'], trade['symbol'], trade['quantity'], event['price'])
+        else:
+            self.mtm.close(event['trade_id'], event['price'])
+
+    def publish(self):
+        if timezone.localdate() != self.day:
+            self.day = timezone.localdate()
+            self.mtm.new_session()
+
+        portfolio, positions = self.mtm.snapshot()
+        pipe = r.pipeline(transaction=True)
+        pipe.delete(MTM_POSITIONS_KEY)
+        if positions:
+            pipe.hset(MTM_POSITIONS_KEY, mapping=encode_positions(positions))
+        pipe.hset(MTM_PORTFOLIO_KEY, mapping=portfolio)
+        pipe.xadd(
+            DASHBOARD_EVENTS_STREAM, {'kind': 'mtm', 'data': json.dumps({'portfolio': portfolio, 'positions': positions})},
+            maxlen=DASHBOARD_EVENTS_MAXLEN, approximate=True
+        )
+        pipe.execute()
@@ -1,24 +1,246 @@
-import redis
 import logging
-import ssl
 import time
 import os
+import queue
 import threading
+from collections import OrderedDict
 from multiprocessing import Process
-from django.conf import settings
 from django.core.management.base import BaseCommand
-from trading.models import FyersCredentials, StrategyTrade
+from trading.models import FyersCredentials
+from trading.trade_store import TradeStore, TradeWriteBehind, PLACEMENT_CHANNEL
 from fyers_apiv3.FyersWebsocket import order_ws
+from trading.socket_rotation import SocketRotator, isolated_socket_class, format_ws_token
+from trading.analytics import record_closes
+from trading.accounts import MirrorLedger
+from trading.profiling import timed, start_control
+from trading.redis_client import get_redis
 
 logger = logging.getLogger('order_socket')
 
-def get_redis():
-    if settings.REDIS_URL.startswith('rediss://'):
-        return redis.from_url(settings.REDIS_URL, ssl_cert_reqs=ssl.CERT_NONE)
-    return redis.from_url(settings.REDIS_URL)
+# Fyers order status codes we act on
+ORDER_FILLED = 2
+ORDER_DEAD = (1, 5) # Cancelled, Rejected
+EVENT_NAMES = {2: 'FILLED', 1: 'CANCELLED', 5: 'REJECTED'}
+RESOLVE_TIMEOUT = 2.0 # Seconds to wait for a fill that beats its own placement event
+RETRY_DELAY = 1.0 # Seconds before retrying a batch that failed to apply
+ORDER_INDEX_MAX = 10000 # Order ids kept in memory (older ones are looked up in Redis)
+ROTATION_GRACE = 5.0 # Seconds the old socket stays accepted after a token swap
+SEEN_UPDATES_MAX = 10000
+
+
+class OrderUpdateWriter(threading.Thread):
+    """
+    Applies order updates to the trade store off the socket callback thread.
+
+    Updates are queued by the socket, coalesced per order id (latest status wins)
+    and applied as one pipelined batch of transitions; the DB follows through the
+    store's write-behind (bulk_update). Each transition publishes its order event
+    in the same script call, so consumers see exactly the transitions that won.
+    A batch that fails (e.g. Redis down) is kept and retried, never dropped.
+    Order ids are resolved through a bounded in-memory map seeded from the store
+    and kept current by placement events.
+    """
+    def __init__(self, store, batch_size=200):
+        super().__init__(name='order_update_writer', daemon=True)
+        self.store = store
+        self.batch_size = batch_size
+        self.queue = queue.Queue()
+        self.index_lock = threading.Lock() # The placement listener writes the index too
+        self.order_index = OrderedDict(list(store.order_index().items())[-ORDER_INDEX_MAX:]) # order_id -> trade_id
+        self.deferred = {} # order_id -> ((status, price, received_ts), first seen)
+        self.closes_pending = True # Closed trades may be waiting for the analytics (also after a crash)
+        logger.info(f"Order index seeded with {len(self.order_index)} orders.")
+
+    def submit(self, order_id, status, price):
+        self.queue.put((order_id, status, price, time.time()))
+
+    def remember(self, order_id, trade_id):
+        with self.index_lock:
+            self.order_index[order_id] = trade_id
+            self.order_index.move_to_end(order_id)
+            if len(self.order_index) > ORDER_INDEX_MAX:
+                self.order_index.popitem(last=False)
+
+    def run(self):
+        while True:
+            self.process(self._drain())
+
+    def process(self, updates):
+        try:
+            if updates:
+                self._apply(updates)
+        except Exception as e:
+            logger.error(f"Order Writer Error: {e}. Retrying {len(updates)} updates...")
+            self._retry(updates)
+            time.sleep(RETRY_DELAY)
+        try:
+            if self.closes_pending:
+                record_closes(self.store)
+                self.closes_pending = False
+        except Exception as e:
+            logger.error(f"Analytics Update Failed: {e}. Retrying with the next batch.")
+
+    def _drain(self):
+        """Block briefly for the first update, then take everything already queued."""
+        updates = {oid: update for oid, (update, _) in self.deferred.items()}
+        try:
+            oid, *update = self.queue.get(timeout=0.1)
+            updates[oid] = tuple(update)
+            while len(updates) < self.batch_size:
+                oid, *update = self.queue.get_nowait()
+                updates[oid] = tuple(update)
+        except queue.Empty:
+            pass
+        return updates
+
+    def _retry(self, updates):
+        """Put a failed batch back (newer updates of the same order still win in _drain)."""
+        now = time.monotonic()
+        for oid, update in updates.items():
+            self.deferred[oid] = (update, now) # A full resolve window once Redis is back
+
+    def _apply(self, updates):
+        # 1. Resolve order ids (memory first, Redis index for anything we haven't heard about)
+        with self.index_lock:
+            resolved = {oid: self.order_index[oid] for oid in updates if oid in self.order_index}
+        unknown = [oid for oid in updates if oid not in resolved]
+        if unknown:
+            found = self.store.trades_for_orders(unknown)
+            for oid, trade_id in found.items():
+                self.remember(oid, trade_id)
+            resolved.update(found)
+
+        now = time.monotonic()
+        for oid, update in updates.items():
+            if oid in resolved:
+                self.deferred.pop(oid, None)
+                continue
+            first_seen = self.deferred.get(oid, (None, now))[1]
+            if now - first_seen >= RESOLVE_TIMEOUT:
+                self.deferred.pop(oid, None)
+                logger.info(f"Order {oid} does not belong to a strategy trade. Ignored.")
+            else:
+                self.deferred[oid] = (update, first_seen)
+
+        if not resolved:
+            return
+
+        # 2. One round trip for the current state of every affected trade
+        trades = self.store.get_many(sorted(set(resolved.values())))
+
+        # 3. Build the transitions, each with the order event it publishes when it wins
+        changes, events = [], []
+        for oid, trade_id in resolved.items():
+            trade = trades.get(trade_id)
+            if not trade: continue
+            status, price, received = updates[oid]
+            if trade['entry_order_id'] == oid:
+                leg = 'entry'
+                if status == ORDER_FILLED:
+                    changes.append((trade_id, trade['symbol'], 'PENDING_ENTRY', 'OPEN', {'actual_entry_price': price}))
+                elif status in ORDER_DEAD:
+                    changes.append((trade_id, trade['symbol'], 'PENDING_ENTRY', 'FAILED', {}))
+                else: continue
+            elif trade['exit_order_id'] == oid:
+                leg = 'exit'
+                if status == ORDER_FILLED:
+                    entry = trade['actual_entry_price'] or trade['entry_level']
+                    pnl = round((entry - price) * trade['quantity'], 2)
+                    changes.append((trade_id, trade['symbol'], 'PENDING_EXIT', 'CLOSED', {'actual_exit_price': price, 'pnl': pnl}))
+                elif status in ORDER_DEAD:
+                    changes.append((trade_id, trade['symbol'], 'PENDING_EXIT', 'OPEN', {'exit_order_id': None}))
+                else: continue
+            else: continue
+            events.append({
+                'trade_id': trade_id, 'order_id': oid, 'symbol': trade['symbol'], 'leg': leg,
+                'event': EVENT_NAMES[status], 'price': price, 'ts': received,
+            })
+
+        # 4. Apply them as a single pipeline. A winning close lists its trade for the
+        # analytics in the same script (counted by record_closes, exactly once)
+        results = self.store.apply(changes, events)
+        for (trade_id, _, _, new_status, fields), ok in zip(changes, results):
+            if ok:
+                logger.info(f"Trade {trade_id} -> {new_status}")
+                if new_status == 'CLOSED':
+                    self.closes_pending = True
+
+
+class MirrorUpdateWriter(threading.Thread):
+    """
+    Order updates of the mirror accounts (see trading.accounts), applied off the
+    socket callback thread. A dead entry takes the account off the trade so its
+    exit is never sent; a dead exit puts it back and schedules a retry
+    (MirrorSweeper). Updates that fail to apply are kept and retried.
+    """
+    def __init__(self, ledger):
+        super().__init__(name='mirror_update_writer', daemon=True)
+        self.ledger = ledger
+        self.queue = queue.Queue()
+        self.deferred = {} # (account id, order_id) -> ((status, price), first seen)
+
+    def submit(self, account_id, order_id, status, price):
+        self.queue.put((account_id, order_id, status, price))
+
+    def run(self):
+        while True:
+            updates = {key: update for key, (update, _) in self.deferred.items()}
+            try:
+                account_id, oid, *update = self.queue.get(timeout=0.1)
+                updates[(account_id, oid)] = tuple(update)
+                while True:
+                    account_id, oid, *update = self.queue.get_nowait()
+                    updates[(account_id, oid)] = tuple(update)
+            except queue.Empty:
+                pass
+            self.process(updates)
+
+    def process(self, updates):
+        try:
+            if updates:
+                self._apply(updates)
+        except Exception as e:
+            # _apply removes each update it has applied: only the rest is retried
+            logger.error(f"Mirror Writer Error: {e}. Retrying {len(updates)} updates...")
+            now = time.monotonic()
+            for key, update in updates.items():
+                self.deferred[key] = (update, now)
+            time.sleep(RETRY_DELAY)
+
+    def _apply(self, updates):
+        by_account = {}
+        for account_id, oid in updates:
+            by_account.setdefault(account_id, []).append(oid)
+        for account_id, oids in by_account.items():
+            resolved = self.ledger.resolve(account_id, oids)
+            now = time.monotonic()
+            for oid in oids:
+                key = (account_id, oid)
+                (status, price), first_seen = updates[key], self.deferred.get(key, (None, now))[1]
+                if oid in resolved:
+                    self._apply_one(account_id, resolved[oid], status, price)
+                    self.deferred.pop(key, None)
+                elif now - first_seen < RESOLVE_TIMEOUT:
+                    # The update may beat the fan-out recording its own placement
+                    self.deferred[key] = ((status, price), first_seen)
+                else:
+                    self.deferred.pop(key, None)
+                del updates[key]
+
+    def _apply_one(self, account_id, order, status, price):
+        trade_id, leg, qty = order
+        if status == ORDER_FILLED:
+            logger.info(f"Mirror {leg} filled: account {account_id}, trade {trade_id}, {qty} @ {price}")
+        elif leg == 'entry':
+            self.ledger.claim(trade_id, account_id)
+            logger.warning(f"Mirror entry {EVENT_NAMES[status]}: account {account_id}, trade {trade_id}. No exit will be sent.")
+        else:
+            self.ledger.restore(trade_id, account_id, qty)
+            logger.critical(f"Mirror exit {EVENT_NAMES[status]}: account {account_id}, trade {trade_id} still holds {qty}. Retrying the exit.")
+
 
 class Command(BaseCommand):
-    help = 'Runs Fyers Order Socket with Supervisor Process'
+    help = 'Runs Fyers Order Socket with Supervisor Process (one connection per active account)'
 
     def handle(self, *args, **options):
         # Supervisor Loop
@@ -29,96 +251,161 @@ class Command(BaseCommand):
             p.join()
 
             if p.exitcode == 0:
-                logger.info("[Supervisor] Token Update Detected. Restarting...")
+                logger.info("[Supervisor] Socket process exited. Restarting...")
             else:
                 logger.error("[Supervisor] Crashed. Retrying in 5s...")
                 time.sleep(5)
 
     def run_socket_process(self):
-        # Redis Listener for Hot Reload
-        def listen_for_token_update():
-            try:
-                r_sub = get_redis()
-                pubsub = r_sub.pubsub()
-                pubsub.subscribe('fyers_token_update')
-                for message in pubsub.listen():
-                    if message['type'] == 'message':
-                        os._exit(0)
-            except Exception: pass
-
-        threading.Thread(target=listen_for_token_update, daemon=True).start()
-
         try:
             from django.db import connections
             connections.close_all()
-            
-            # 1. FETCH CREDENTIALS
-            try:
-                creds = FyersCredentials.objects.get(is_active=True)
-                raw_token = creds.access_token
-                app_id = creds.app_id
-                
-                # --- CRITICAL FIX: FORMAT TOKEN ---
-                # Fyers WebSockets require "APP_ID:ACCESS_TOKEN"
-                if ":" not in raw_token:
-                    full_token = f"{app_id}:{raw_token}"
-                else:
-                    full_token = raw_token
-                
-                logger.info(f"🔑 Connecting with AppID: {app_id}...")
-
-            except Exception:
-                logger.error("No Credentials. Sleeping...")
-                time.sleep(10)
-                os._exit(1)
-
-            def on_order(message):
-                # Standard Order Processing Logic...
-                order_id = message.get('id')
-                status = message.get('status')
-                price = float(message.get('tradedPrice', 0) or 0)
-                if not order_id: return
-                logger.info(f"Order Update: ID={order_id} Status={status}")
+
+            handle_order = self.start_pipeline()
+            start_control('order_socket')
+
+            # 4. SOCKET GENERATIONS (one rotator per account, hot token swap, no process restart)
+            rotation_requests = queue.Queue() # (account id, reason)
+            rotators = {}
+
+            def socket_factory(account_id, mirror):
+                def connect_socket(token, generation):
+                    holder = {}
+                    rotator = rotators[account_id]
+
+                    @timed('on_order')
+                    def on_order(message):
+                        if rotator.accept(generation):
+                            handle_order(message, account_id if mirror else None)
+
+                    def on_error(msg):
+                        logger.error(f"Socket Error (account {account_id}, gen {generation}): {msg}")
+                        # 403 means Forbidden (Wrong Token Format or Expired)
+                        if ('403' in str(msg) or 'Forbidden' in str(msg)) and rotator.is_active(generation):
+                            logger.critical(f"⛔ 403 FORBIDDEN (account {account_id}). Requesting rotation...")
+                            rotation_requests.put((account_id, '403'))
+
+                    def on_open():
+                        logger.info(f"Socket Connected (account {account_id}, gen {generation}). Subscribing...")
+                        holder['socket'].subscribe(data_type="OnOrders")
+                        holder['socket'].keep_running()
+
+                    socket_class = isolated_socket_class(order_ws.FyersOrderSocket)
+                    fyers_socket = socket_class(
+                        access_token=token,
+                        write_to_file=False,
+                        log_path="",
+                        on_connect=on_open,
+                        on_error=on_error,
+                        on_orders=on_order
+                    )
+                    holder['socket'] = fyers_socket
+                    fyers_socket.connect()
+                    return fyers_socket
+                return connect_socket
+
+            def listen_for_token_update():
                 try:
-                    t_entry = StrategyTrade.objects.filter(entry_order_id=order_id).first()
-                    if t_entry:
-                        if status == 2: t_entry.status = 'OPEN'; t_entry.actual_entry_price = price; t_entry.save()
-                        elif status in [1, 5]: t_entry.status = 'FAILED'; t_entry.save()
-                        return
-                    t_exit = StrategyTrade.objects.filter(exit_order_id=order_id).first()
-                    if t_exit:
-                        if status == 2: 
-                            t_exit.status = 'CLOSED'; t_exit.actual_exit_price = price
-                            entry = float(t_exit.actual_entry_price or t_exit.entry_level)
-                            t_exit.pnl = (entry - price) * t_exit.quantity
-                            t_exit.save()
-                        elif status in [1, 5]: 
-                            t_exit.status = 'OPEN'; t_exit.exit_order_id = None; t_exit.save()
-                except Exception as e: logger.error(f"DB Error: {e}")
-
-            def on_error(msg):
-                logger.error(f"Socket Error: {msg}")
-                # 403 means Forbidden (Wrong Token Format or Expired)
-                if '403' in str(msg) or 'Forbidden' in str(msg):
-                    logger.critical("⛔ 403 FORBIDDEN. Exiting to reload...")
-                    os._exit(0)
-
-            def on_open():
-                logger.info("Socket Connected. Subscribing...")
-                fyers_socket.subscribe(data_type="OnOrders")
-                fyers_socket.keep_running()
-
-            # Connect using the CORRECT full_token
-            fyers_socket = order_ws.FyersOrderSocket(
-                access_token=full_token, 
-                write_to_file=False, 
-                log_path="",
-                on_connect=on_open, 
-                on_error=on_error, 
-                on_orders=on_order
-            )
-            fyers_socket.connect()
+                    pubsub = get_redis().pubsub()
+                    pubsub.subscribe('fyers_token_update')
+                    for message in pubsub.listen():
+                        if message['type'] == 'message':
+                            rotation_requests.put((None, 'token update'))
+                except Exception as e:
+                    logger.error(f"Token Listener Error: {e}")
+
+            threading.Thread(target=listen_for_token_update, daemon=True).start()
+
+            tokens = {}
+
+            def sync_sockets(reason):
+                """Connect new accounts and rotate the ones whose token changed."""
+                for account_id, (token, mirror) in self.load_tokens().items():
+                    if account_id not in rotators:
+                        rotators[account_id] = SocketRotator(
+                            f"order_socket:{account_id}", socket_factory(account_id, mirror),
+                            cut_on_first_message=False, grace=ROTATION_GRACE,
+                        )
+                        rotators[account_id].start(token)
+                    elif token != tokens[account_id]:
+                        logger.info(f"Rotating order socket of account {account_id} ({reason})...")
+                        rotators[account_id].rotate(token)
+                    tokens[account_id] = token
+
+            sync_sockets('start')
+
+            while True:
+                account_id, reason = rotation_requests.get()
+                if account_id is not None and self.load_tokens().get(account_id, (None,))[0] == tokens[account_id]:
+                    logger.warning(f"Rotation requested ({reason}) but the token of account {account_id} is unchanged. Waiting for a new login...")
+                    continue
+                sync_sockets(reason)
 
         except Exception as e:
             logger.error(f"Process Exception: {e}")
-            os._exit(1)
\ No newline at end of file
+            os._exit(1)
+
+    def start_pipeline(self):
+        """
+        Steps 1-3: trade store, update writer and placement listener. Returns the
+        handler for raw order messages (benchmark_pipeline feeds it simulated fills).
+        """
+        # 1. TRADE STATE (Redis is authoritative; this process also flushes to the DB)
+        store = TradeStore(get_redis())
+        TradeWriteBehind(store).start()
+        writer = OrderUpdateWriter(store)
+        writer.start()
+
+        # 2. Keep the in-memory order index current from placement events
+        def listen_for_placements():
+            try:
+                pubsub = get_redis().pubsub()
+                pubsub.subscribe(PLACEMENT_CHANNEL)
+                for message in pubsub.listen():
+                    if message['type'] == 'message':
+                        order_id, trade_id = message['data'].decode('utf-8').rsplit(':', 1)
+                        writer.remember(order_id, int(trade_id))
+            except Exception as e:
+                logger.error(f"Placement Listener Error: {e}")
+
+        threading.Thread(target=listen_for_placements, daemon=True).start()
+
+        # Mirror accounts' orders are tracked by the fan-out's ledger, not the trade store
+        mirror_writer = MirrorUpdateWriter(MirrorLedger(get_redis()))
+        mirror_writer.start()
+
+        # 3. ORDER HANDLING (shared by every socket generation and account)
+        # During a token rotation both sockets deliver for a few seconds: drop repeats.
+        seen = OrderedDict()
+        seen_lock = threading.Lock()
+
+        def handle_order(message, mirror_account=None):
+            """mirror_account: id of the mirror account the socket belongs to, None for the primary."""
+            # Socket thread only parses and queues; the writer threads do the I/O
+            order_id = message.get('id')
+            status = message.get('status')
+            if not order_id: return
+            with seen_lock:
+                if (mirror_account, order_id, status) in seen: return
+                seen[(mirror_account, order_id, status)] = True
+                if len(seen) > SEEN_UPDATES_MAX: seen.popitem(last=False)
+            logger.info(f"Order Update: ID={order_id} Status={status}" + (f" (mirror account {mirror_account})" if mirror_account else ""))
+            if status == ORDER_FILLED or status in ORDER_DEAD:
+                price = float(message.get('tradedPrice', 0) or 0)
+                if mirror_account is None:
+                    writer.submit(order_id, status, price)
+                else:
+                    mirror_writer.submit(mirror_account, order_id, status, price)
+
+        return handle_order
+
+    def load_tokens(self):
+        """{account id: (ws token, is_mirror)} for the primary and every active mirror account."""
+        try:
+            accounts = [FyersCredentials.objects.primary(), *FyersCredentials.objects.mirrors()]
+            logger.info(f"🔑 Accounts: {', '.join(creds.app_id for creds in accounts)}")
+            return {creds.id: (format_ws_token(creds.app_id, creds.access_token), creds.is_mirror) for creds in accounts}
+        except Exception:
+            logger.error("No Credentials. Sleeping...")
+            time.sleep(10)
+            os._exit(1)
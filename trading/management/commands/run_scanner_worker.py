@@ -1,29 +1,26 @@
 import json
 import redis
 import logging
-import ssl
 import time
 from datetime import datetime
-from django.conf import settings
 from django.core.management.base import BaseCommand
 from trading.models import LiveScanResult
+from trading.query_budget import QueryBudget
+from trading.dashboard_feed import publish_scan
+from trading.strategy_host import decode_candle
+from trading.profiling import timed, start_control
+from trading.redis_client import r, xack_many
 
 # Logging Setup
 logger = logging.getLogger('scanner_worker')
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
-# --- SSL FIX FOR HEROKU REDIS ---
-# Essential for connecting to Heroku's secure Redis instance
-if settings.REDIS_URL.startswith('rediss://'):
-    r = redis.from_url(settings.REDIS_URL, ssl_cert_reqs=ssl.CERT_NONE)
-else:
-    r = redis.from_url(settings.REDIS_URL)
-
 # Constants
 GROUP_NAME = "SCANNER_GROUP"
 CONSUMER_NAME = "SCANNER_1"
 STREAM_CANDLE = "candle_stream_1m"
 REDIS_PDL_KEY = "prev_day_ohlc"
+SCAN_QUERY_BUDGET = 4 # insert + hygiene (count, oldest, delete)
 
 class Command(BaseCommand):
     help = 'Runs the Live Scanner for Cash Breakdown Strategy on all tracked symbols'
@@ -52,6 +49,8 @@ class Command(BaseCommand):
             logger.error(f"Failed to load PDL Cache: {e}")
             prev_day_data_map = {}
 
+        budget = QueryBudget('scan', SCAN_QUERY_BUDGET)
+        start_control('scanner_worker')
         logger.info(">>> Scanner Loop Started <<<")
 
         while True:
@@ -65,17 +64,19 @@ class Command(BaseCommand):
                     block=2000
                 )
                 
+                budget.maybe_report()
                 if not events:
                     continue
 
                 for stream, messages in events:
                     for msg_id, data in messages:
                         try:
-                            self.scan_candle(data, prev_day_data_map)
-                            # Acknowledge immediately (we don't need strict retry logic for scanner)
-                            r.xack(stream, GROUP_NAME, msg_id)
+                            with budget.measure():
+                                self.scan_candle(data, prev_day_data_map)
                         except Exception as e:
                             logger.error(f"Scanner Error processing MsgID {msg_id}: {e}")
+                    # Acknowledge the whole batch in one XACK (we don't need strict retry logic for scanner)
+                    xack_many(stream, GROUP_NAME, [msg_id for msg_id, _ in messages])
 
             except redis.exceptions.ConnectionError:
                 logger.error("Redis Connection Lost. Retrying...")
@@ -83,6 +84,7 @@ class Command(BaseCommand):
             except Exception as e:
                 logger.error(f"Unhandled Exception in Loop: {e}")
 
+    @timed('scan_candle')
     def scan_candle(self, data, prev_day_data_map):
         """
         Check Strategy Condition:
@@ -94,26 +96,23 @@ class Command(BaseCommand):
             payload = json.loads(payload_str)
         except Exception:
             return
+        self.scan_payload(payload, prev_day_data_map)
 
-        symbol = payload['symbol']
-        pdl_info = prev_day_data_map.get(symbol)
-        
-        # If we don't have PDL data, we can't scan this symbol
-        if not pdl_info: 
-            return
+    def scan_payload(self, payload, prev_day_data_map):
+        self.scan(decode_candle(payload, prev_day_data_map))
 
-        pdl = float(pdl_info['low'])
-        open_p = float(payload['open'])
-        close_p = float(payload['close'])
-        volume = float(payload.get('volume', 0))
+    def scan(self, candle):
+        """trading.strategy_host.Candle (PDL and turnover already worked out)."""
+        symbol = candle.symbol
+        open_p, close_p, pdl, volume = candle.open, candle.close, candle.pdl, candle.volume
         
         # --- 1. PRICE LOGIC ---
-        # Breakdown Pattern
-        if open_p > pdl and close_p < pdl:
+        # Breakdown Pattern (never true without PDL data)
+        if candle.breakdown:
             
             # --- 2. VOLUME LOGIC ---
             # Filter out illiquid stocks (Turnover > 10,000,000)
-            turnover = volume * close_p
+            turnover = candle.turnover
             if turnover <= 10000000:
                 return
 
@@ -124,10 +123,12 @@ class Command(BaseCommand):
             )
             
             # Save to Database for Dashboard Display
-            LiveScanResult.objects.create(
+            scan = LiveScanResult.objects.create(
                 symbol=symbol,
                 pattern=pattern_desc
             )
+            # Push to open dashboards
+            publish_scan(r, symbol, pattern_desc, scan.scan_time)
             
             # Database Hygiene: Keep only the last 50 scans to prevent DB bloat
             if LiveScanResult.objects.count() > 50:
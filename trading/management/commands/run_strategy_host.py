@@ -0,0 +1,45 @@
+import sys
+import signal
+import logging
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+from trading.strategy_host import StrategyHost
+from trading.profiling import start_control
+
+# Logging Setup
+logger = logging.getLogger('strategy_host')
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs the strategy plugins (settings.STRATEGY_PLUGINS) on one read of the candle, tick and '
+        'order event streams. Replaces the algo_worker and scanner_worker dynos (the strategy will not start while another '
+        'strategy runner holds the lease).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--plugins', help='Comma separated dotted paths (default: settings.STRATEGY_PLUGINS)')
+
+    def handle(self, *args, **options):
+        paths = options['plugins'].split(',') if options['plugins'] else settings.STRATEGY_PLUGINS
+        try:
+            plugins = [import_string(path.strip())() for path in paths]
+        except ImportError as e:
+            raise CommandError(f"Unknown plugin: {e}")
+        if len({p.name for p in plugins}) != len(plugins):
+            raise CommandError("Plugin names must be unique")
+
+        logger.info(f"--- Initializing Strategy Host ({len(plugins)} plugins) ---")
+        host = StrategyHost(plugins)
+        if not host.start():
+            return
+        start_control('strategy_host')
+
+        # Heroku stops dynos with SIGTERM: turn it into a clean exit so plugins release what they hold
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        try:
+            host.run()
+        finally:
+            host.stop()
@@ -0,0 +1,82 @@
+import time
+import logging
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from trading.models import GlobalTradingSettings
+from trading.constants import get_strategy_symbols
+from trading.backtest import params_from_settings, session_range
+from trading.sweep import SWEEP_KNOBS, INT_KNOBS, METRICS, grid, random_search, run_sweep, rank_results
+
+logger = logging.getLogger('backtest')
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+
+class Command(BaseCommand):
+    help = 'Grid or random search over the strategy settings (shared signal pass, resumable results file)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--param', action='append', default=[], metavar='KNOB=VALUES',
+                            help='e.g. risk_reward_ratio=1.5,2,2.5 (grid values) or breakeven_trigger_r=0.5:2 (random range). '
+                                 f"Knobs: {', '.join(SWEEP_KNOBS)}. Unlisted knobs keep their current setting.")
+        parser.add_argument('--samples', type=int, default=0, help='Random search with N draws instead of the full grid')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--results', default='sweep_results.jsonl', help='Results file (appended, reruns resume)')
+        parser.add_argument('--order-by', default='-pnl', help=f"Comma separated, '-' for descending. Metrics: {', '.join(METRICS)}")
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument('--from', dest='date_from', help='First session (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='date_to', help='Last session (YYYY-MM-DD)')
+        parser.add_argument('--symbols', help='Comma separated symbols (default: the strategy universe)')
+        parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: all cores)')
+
+    def handle(self, *args, **options):
+        space = dict(self.parse_param(p) for p in options['param'])
+        order_by = [f for f in options['order_by'].split(',') if f]
+        unknown = [f for f in order_by if f.lstrip('-') not in METRICS]
+        if unknown:
+            raise CommandError(f"Unknown metric(s): {', '.join(unknown)}")
+        if options['samples']:
+            candidates = random_search(space, options['samples'], options['seed'])
+        elif any(isinstance(v, tuple) for v in space.values()):
+            raise CommandError("Ranges (low:high) need --samples")
+        else:
+            candidates = grid(space)
+
+        symbols = options['symbols'].split(',') if options['symbols'] else get_strategy_symbols()
+        settings_db = GlobalTradingSettings.objects.filter(user__fyerscredentials__is_active=True, user__fyerscredentials__is_mirror=False).first() \
+            or GlobalTradingSettings.objects.first() or GlobalTradingSettings()
+        base = params_from_settings(settings_db)
+        tz = timezone.get_current_timezone()
+        utc_offset = int(timezone.localtime().utcoffset().total_seconds())
+        try:
+            start_ts, end_ts = session_range(options['date_from'], options['date_to'], tz)
+        except ValueError as e:
+            raise CommandError(f"Invalid date: {e}")
+
+        logger.info(f"Sweep: {len(candidates)} parameter sets over {len(symbols)} symbols -> {options['results']}")
+        started = time.time()
+        results, missing = run_sweep(
+            candidates, base, symbols, settings.CANDLE_DATA_DIR, utc_offset, options['results'],
+            start_ts, end_ts, options['workers'],
+        )
+        if missing:
+            logger.warning(f"No candle data for {len(missing)} symbols (store_candles --history): {', '.join(missing[:10])}")
+        logger.info(f"Sweep: done in {time.time() - started:.1f}s, {len(results)} results in file.")
+
+        self.stdout.write(" | ".join(SWEEP_KNOBS + METRICS))
+        for result in rank_results(results, order_by)[:options['top']]:
+            values = [result['params'][k] for k in SWEEP_KNOBS] + [result['metrics'][m] for m in METRICS]
+            self.stdout.write(" | ".join(str(v) for v in values))
+
+    def parse_param(self, raw):
+        knob, _, values = raw.partition('=')
+        if knob not in SWEEP_KNOBS or not values:
+            raise CommandError(f"Bad --param {raw!r} (knobs: {', '.join(SWEEP_KNOBS)})")
+        cast = int if knob in INT_KNOBS else float
+        try:
+            if ':' in values:
+                low, high = values.split(':')
+                return knob, (cast(low), cast(high))
+            return knob, [cast(v) for v in values.split(',')]
+        except ValueError:
+            raise CommandError(f"Bad --param {raw!r}")
@@ -0,0 +1,82 @@
+import logging
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from trading.models import FyersCredentials
+from trading.fyers_auth_util import get_fyers_client
+from trading.constants import get_strategy_symbols
+from trading.candle_backfill import RateLimiter
+from trading.candle_store import CandleStore, stream_rows
+from trading.backtest import fetch_history
+from trading.redis_client import xrange_all
+
+logger = logging.getLogger('candle_store')
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+CANDLE_STREAM = 'candle_stream_1m'
+STREAM_PAGE = 5000 # Entries per XRANGE
+HISTORY_RATE = 8 # fyers.history calls per second while downloading
+
+
+class Command(BaseCommand):
+    help = 'Writes 1m candles into the columnar store: the session from candle_stream_1m (after the close, e.g. from Heroku Scheduler) or history from fyers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Session to take from the stream (YYYY-MM-DD, default: today)')
+        parser.add_argument('--history', action='store_true', help='Backfill from fyers.history instead of the stream')
+        parser.add_argument('--days', type=int, default=365, help='History to download with --history')
+        parser.add_argument('--symbols', help='Comma separated symbols for --history (default: the strategy universe)')
+
+    def handle(self, *args, **options):
+        store = CandleStore(settings.CANDLE_DATA_DIR, timezone.get_current_timezone())
+        if options['history']:
+            symbols = options['symbols'].split(',') if options['symbols'] else get_strategy_symbols()
+            self.backfill(store, symbols, options['days'])
+        else:
+            try:
+                day = datetime.strptime(options['date'], '%Y-%m-%d').date() if options['date'] else timezone.localdate()
+            except ValueError as e:
+                raise CommandError(f"Invalid date: {e}")
+            self.snapshot(store, day)
+
+    def snapshot(self, store, day):
+        """Every candle the data engine published for `day`, one write per session."""
+        start_ms = store.session_open(day) * 1000
+        end_ms = store.session_open(day + timedelta(days=1)) * 1000
+        entries = xrange_all(CANDLE_STREAM, start_ms, end_ms, page=STREAM_PAGE)
+
+        days = stream_rows(entries, store)
+        rows = days.get(day.isoformat(), {})
+        if not rows:
+            logger.warning(f"No candles for {day} in {CANDLE_STREAM}.")
+            return
+        store.write_day(day, rows)
+        logger.info(f"DONE. {len(rows)} symbols for {day} ({len(entries)} stream entries) in {store.root}.")
+
+    def backfill(self, store, symbols, days):
+        try:
+            creds = FyersCredentials.objects.primary()
+            fyers = get_fyers_client(creds.access_token)
+        except Exception as e:
+            raise CommandError(f"Auth failed: {e}")
+
+        end = timezone.localdate()
+        start = end - timedelta(days=days)
+        limiter = RateLimiter(HISTORY_RATE)
+        store.register(symbols) # Ids up front, so day files are created at full size once
+        logger.info(f"Fetching 1m history for {len(symbols)} symbols ({start} -> {end})")
+
+        def fetch_one(symbol):
+            try:
+                candles = fetch_history(lambda params: fyers.history(data=params), symbol, start, end, limiter)
+                return store.write_candles(symbol, candles) > 0
+            except Exception as e:
+                logger.error(f"History failed for {symbol}: {e}")
+                return False
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            done = sum(pool.map(fetch_one, symbols))
+        store.flush()
+        logger.info(f"DONE. History stored for {done}/{len(symbols)} symbols in {store.root}.")
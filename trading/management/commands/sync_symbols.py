@@ -0,0 +1,38 @@
+import csv
+import logging
+from decimal import Decimal, InvalidOperation
+from django.core.management.base import BaseCommand, CommandError
+from trading.constants import get_strategy_symbols
+from trading.symbol_master import sync
+
+logger = logging.getLogger('symbol_master')
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+
+class Command(BaseCommand):
+    help = 'Registers the strategy universe in the symbol master (stable integer ids) and publishes it to Redis'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--metadata', help='CSV with a symbol column and any of tick_size, lot_size, sector')
+
+    def handle(self, *args, **options):
+        metadata = self.read_metadata(options['metadata']) if options['metadata'] else {}
+        master = sync(get_strategy_symbols(), metadata)
+        logger.info(f"DONE. Symbol master v{master.version}: {len(master.symbols())} active of {len(master)} symbols.")
+
+    def read_metadata(self, path):
+        metadata = {}
+        try:
+            with open(path, newline='') as f:
+                for row in csv.DictReader(f):
+                    fields = {}
+                    if row.get('tick_size'):
+                        fields['tick_size'] = Decimal(row['tick_size'])
+                    if row.get('lot_size'):
+                        fields['lot_size'] = int(row['lot_size'])
+                    if row.get('sector') is not None:
+                        fields['sector'] = row['sector'].strip()
+                    metadata[row['symbol'].strip()] = fields
+        except (OSError, KeyError, ValueError, InvalidOperation) as e:
+            raise CommandError(f"Bad metadata file {path}: {e}")
+        return metadata
@@ -0,0 +1,86 @@
+import os
+import json
+import time
+import uuid
+from django.core.management.base import BaseCommand, CommandError
+from trading.profiling import CONTROL_CHANNEL, TIMERS_KEY, PROFILE_RESULTS_KEY
+from trading.redis_client import r
+
+RESULT_GRACE = 10 # Seconds to wait for profiles after the run should have ended
+
+
+class Command(BaseCommand):
+    help = (
+        'Live diagnostics of the running workers (see trading.profiling): sample a profile for N seconds '
+        'and save flamegraph-ready collapsed stacks, stop a running profile, or show / toggle the hot-path timers.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['profile', 'stop', 'timers'])
+        parser.add_argument('--worker', default='*', help='Worker name (algo_worker, data_engine, ...; default: all)')
+        parser.add_argument('--seconds', type=float, default=30, help='Profile duration')
+        parser.add_argument('--interval-ms', type=int, default=10, help='Sampling period')
+        parser.add_argument('--remote-dir', help='Workers write their profiles to this directory on their own host instead of Redis')
+        parser.add_argument('--output', default='.', help='Directory for profiles fetched from Redis')
+        parser.add_argument('--on', action='store_true', help='Turn the hot-path timers on')
+        parser.add_argument('--off', action='store_true', help='Turn the hot-path timers off')
+
+    def handle(self, *args, **options):
+        if options['action'] == 'profile':
+            return self.profile(options)
+        if options['action'] == 'stop':
+            receivers = self.send({'cmd': 'profile_stop', 'worker': options['worker']})
+            self.stdout.write(f"Stop sent to {receivers} workers (profiles are saved as usual).")
+            return
+        if options['on'] or options['off']:
+            receivers = self.send({'cmd': 'timers', 'enabled': options['on'], 'worker': options['worker']})
+            self.stdout.write(f"Timers {'on' if options['on'] else 'off'}: sent to {receivers} workers.")
+            return
+        self.show_timers(options['worker'])
+
+    def send(self, command):
+        return r.publish(CONTROL_CHANNEL, json.dumps(command))
+
+    def profile(self, options):
+        profile_id = uuid.uuid4().hex[:8]
+        receivers = self.send({
+            'cmd': 'profile', 'id': profile_id, 'worker': options['worker'], 'seconds': options['seconds'],
+            'interval_ms': options['interval_ms'], 'dir': options['remote_dir'],
+        })
+        if not receivers:
+            raise CommandError("No worker is listening on the control channel.")
+        self.stdout.write(f"Profile {profile_id}: {options['seconds']:.0f}s, sent to {receivers} workers. Waiting...")
+
+        # 1. Collect what the workers report until the run (plus a grace period) is over.
+        # Sent to all, every subscriber answers: stop as soon as they have.
+        results = []
+        expected = receivers if options['worker'] == '*' else None
+        deadline = time.time() + options['seconds'] + RESULT_GRACE
+        while time.time() < deadline and len(results) != expected:
+            item = r.blpop(PROFILE_RESULTS_KEY.format(profile_id), timeout=max(1, int(deadline - time.time())))
+            if item:
+                results.append(json.loads(item[1]))
+
+        # 2. Profiles kept in Redis are fetched to --output
+        os.makedirs(options['output'], exist_ok=True)
+        for result in results:
+            if 'key' in result:
+                path = os.path.join(options['output'], f"{result['worker']}-{result['pid']}-{profile_id}.folded")
+                with open(path, 'wb') as f:
+                    f.write(r.get(result['key']) or b'')
+            else:
+                path = f"{result['path']} (on the worker's host)"
+            self.stdout.write(f"  {result['worker']:<15} pid {result['pid']:<7} {result['samples']:>6} samples -> {path}")
+        if not results:
+            raise CommandError("No profile came back (matching worker not running?)")
+        self.stdout.write("Render with: flamegraph.pl <file>.folded > profile.svg (or open it in speedscope)")
+
+    def show_timers(self, worker):
+        rows = []
+        for field, value in sorted(r.hgetall(TIMERS_KEY).items()):
+            name = field.decode('utf-8')
+            if worker != '*' and not name.startswith(f"{worker}:"):
+                continue
+            s = json.loads(value)
+            rows.append(f"  {name:<35} p50={s['p50']:.3f}ms p99={s['p99']:.3f}ms max={s['max']:.3f}ms n={s['n']} ({time.time() - s['at']:.0f}s ago)")
+        self.stdout.write("\n".join(rows) if rows else "No timers published yet.")
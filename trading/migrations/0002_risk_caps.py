@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-19 02:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='globaltradingsettings',
+            name='max_notional_per_trade',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Max qty * price per trade (0 = no cap)', max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='globaltradingsettings',
+            name='max_open_exposure',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Max total open notional (0 = no cap)', max_digits=14),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2 on 2026-10-19 02:36
+
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading', '0002_risk_caps'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='globaltradingsettings',
+            name='session_end_time',
+            field=models.TimeField(default=datetime.time(15, 15), help_text='All untriggered setups expire at this time'),
+        ),
+        migrations.AddField(
+            model_name='globaltradingsettings',
+            name='setup_lifetime_minutes',
+            field=models.IntegerField(default=60, help_text='Expire untriggered setups after N minutes (0 = end of session)'),
+        ),
+    ]
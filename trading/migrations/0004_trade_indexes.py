@@ -0,0 +1,41 @@
+# Generated by Django 4.2 on 2026-10-19 02:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading', '0003_setup_expiry'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='livescanresult',
+            index=models.Index(fields=['-scan_time'], name='scan_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='strategytrade',
+            index=models.Index(fields=['symbol', 'status'], name='trade_symbol_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='strategytrade',
+            index=models.Index(fields=['symbol', 'created_at'], name='trade_symbol_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='strategytrade',
+            index=models.Index(fields=['status', 'created_at'], name='trade_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='strategytrade',
+            index=models.Index(fields=['entry_order_id'], name='trade_entry_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='strategytrade',
+            index=models.Index(fields=['exit_order_id'], name='trade_exit_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='strategytrade',
+            index=models.Index(fields=['-created_at'], name='trade_created_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2 on 2026-10-19 02:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading', '0004_trade_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StrategyTradeArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=50)),
+                ('status', models.CharField(choices=[('PENDING', 'Monitoring (Wait for Break)'), ('PENDING_ENTRY', 'Order Placed'), ('OPEN', 'Position Open'), ('PENDING_EXIT', 'Exit Order Placed'), ('CLOSED', 'Closed'), ('EXPIRED', 'Setup Expired'), ('FAILED', 'Failed')], default='PENDING', max_length=20)),
+                ('candle_timestamp', models.DateTimeField()),
+                ('candle_open', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('candle_high', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('candle_low', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('candle_close', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('prev_day_low', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('entry_level', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('stop_loss', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('target_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('quantity', models.IntegerField(default=0)),
+                ('entry_order_id', models.CharField(blank=True, max_length=50, null=True)),
+                ('exit_order_id', models.CharField(blank=True, max_length=50, null=True)),
+                ('actual_entry_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('actual_exit_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('is_breakeven_moved', models.BooleanField(default=False)),
+                ('pnl', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('exit_reason', models.CharField(blank=True, max_length=255, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='strategytradearchive',
+            index=models.Index(fields=['-created_at'], name='archive_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='strategytradearchive',
+            index=models.Index(fields=['symbol', 'created_at'], name='archive_symbol_created_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-19 02:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading', '0005_trade_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='globaltradingsettings',
+            name='max_daily_loss',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Stop new entries once realized + unrealized P&L falls below -N (0 = off)', max_digits=12),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2 on 2026-10-19 02:50
+
+from django.db import migrations, models
+from decimal import Decimal
+from django.db.models import F
+
+
+def backfill_initial_stop_loss(apps, schema_editor):
+    # Untouched stops are still the initial ones; moved stops are rebuilt with the
+    # worker's formula (candle high + 0.02%)
+    for name in ('StrategyTrade', 'StrategyTradeArchive'):
+        model = apps.get_model('trading', name)
+        model.objects.filter(is_breakeven_moved=False).update(initial_stop_loss=F('stop_loss'))
+        model.objects.filter(is_breakeven_moved=True).update(initial_stop_loss=F('candle_high') * Decimal('1.0002'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading', '0006_daily_loss_limit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='strategytrade',
+            name='initial_stop_loss',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='strategytradearchive',
+            name='initial_stop_loss',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.RunPython(backfill_initial_stop_loss, migrations.RunPython.noop),
+    ]
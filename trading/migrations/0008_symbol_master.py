@@ -0,0 +1,25 @@
+# Generated by Django 4.2 on 2026-10-19 03:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading', '0007_initial_stop_loss'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Instrument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=50, unique=True)),
+                ('tick_size', models.DecimalField(decimal_places=4, default=0.05, max_digits=8)),
+                ('lot_size', models.IntegerField(default=1)),
+                ('sector', models.CharField(blank=True, default='', max_length=100)),
+                ('is_active', models.BooleanField(default=True)),
+                ('version', models.IntegerField(default=0, help_text='Master version that last changed this row')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-19 03:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading', '0008_symbol_master'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='globaltradingsettings',
+            name='min_relative_volume',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Only set up on candles with at least N x the average volume of the previous 20 (0 = off)', max_digits=6),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-19 03:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading', '0009_relative_volume_filter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fyerscredentials',
+            name='is_mirror',
+            field=models.BooleanField(default=False, help_text='Copies every entry and exit of the primary account'),
+        ),
+        migrations.AddField(
+            model_name='fyerscredentials',
+            name='quantity_multiplier',
+            field=models.DecimalField(decimal_places=2, default=1, help_text='Mirror accounts: strategy quantity x N (at least 1 share)', max_digits=6),
+        ),
+    ]
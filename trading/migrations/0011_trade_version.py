@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-19 04:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading', '0010_mirror_accounts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='strategytrade',
+            name='version',
+            field=models.IntegerField(default=0, help_text='Trade store version last written back (see trading.trade_store)'),
+        ),
+        migrations.AddField(
+            model_name='strategytradearchive',
+            name='version',
+            field=models.IntegerField(default=0, help_text='Trade store version last written back (see trading.trade_store)'),
+        ),
+    ]
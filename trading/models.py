@@ -1,15 +1,29 @@
+import datetime
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
 
+class FyersCredentialsManager(models.Manager):
+    def primary(self):
+        """The account the strategy trades (and the data feed logs in with)."""
+        return self.get(is_active=True, is_mirror=False)
+
+    def mirrors(self):
+        """Accounts copying the primary's orders (see trading.accounts)."""
+        return self.filter(is_active=True, is_mirror=True).order_by('id')
+
 class FyersCredentials(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     app_id = models.CharField(max_length=255)
     secret_key = models.CharField(max_length=255)
     access_token = models.TextField(blank=True, null=True)
     is_active = models.BooleanField(default=False)
+    is_mirror = models.BooleanField(default=False, help_text="Copies every entry and exit of the primary account")
+    quantity_multiplier = models.DecimalField(max_digits=6, decimal_places=2, default=1, help_text="Mirror accounts: strategy quantity x N (at least 1 share)")
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = FyersCredentialsManager()
+
 class GlobalTradingSettings(models.Model):
     """Controls global risk parameters for the strategy."""
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -17,17 +31,26 @@ class GlobalTradingSettings(models.Model):
     max_trades_per_symbol = models.IntegerField(default=2)
     risk_per_trade_amount = models.DecimalField(max_digits=10, decimal_places=2, default=500.0)
     volume_threshold = models.BigIntegerField(default=500000, help_text="Min volume * price to trade")
+    max_notional_per_trade = models.DecimalField(max_digits=12, decimal_places=2, default=0, help_text="Max qty * price per trade (0 = no cap)")
+    max_open_exposure = models.DecimalField(max_digits=14, decimal_places=2, default=0, help_text="Max total open notional (0 = no cap)")
+    max_daily_loss = models.DecimalField(max_digits=12, decimal_places=2, default=0, help_text="Stop new entries once realized + unrealized P&L falls below -N (0 = off)")
+    min_relative_volume = models.DecimalField(max_digits=6, decimal_places=2, default=0, help_text="Only set up on candles with at least N x the average volume of the previous 20 (0 = off)")
     
     # Strategy specific hardcodes (made editable here)
     risk_reward_ratio = models.DecimalField(max_digits=4, decimal_places=2, default=2.5) # 1:2.5
     breakeven_trigger_r = models.DecimalField(max_digits=4, decimal_places=2, default=1.25) # 1.25 R
+
+    # Setup expiry (PENDING setups that never triggered)
+    setup_lifetime_minutes = models.IntegerField(default=60, help_text="Expire untriggered setups after N minutes (0 = end of session)")
+    session_end_time = models.TimeField(default=datetime.time(15, 15), help_text="All untriggered setups expire at this time")
     
     def __str__(self):
         return f"Settings for {self.user.username}"
 
-class StrategyTrade(models.Model):
+class TradeRecord(models.Model):
     """
     The specific model for Cash Breakdown Strategy.
+    Shared by the hot table (StrategyTrade) and the archive of past sessions.
     """
     STATUS_CHOICES = (
         ('PENDING', 'Monitoring (Wait for Break)'),
@@ -53,6 +76,7 @@ class StrategyTrade(models.Model):
     # Trade Parameters
     entry_level = models.DecimalField(max_digits=10, decimal_places=2) # Trigger price
     stop_loss = models.DecimalField(max_digits=10, decimal_places=2)
+    initial_stop_loss = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True) # Before any breakeven move (1R)
     target_price = models.DecimalField(max_digits=10, decimal_places=2)
     quantity = models.IntegerField(default=0)
     
@@ -67,14 +91,78 @@ class StrategyTrade(models.Model):
     pnl = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     exit_reason = models.CharField(max_length=255, blank=True, null=True)
+    version = models.IntegerField(default=0, help_text="Trade store version last written back (see trading.trade_store)")
+
+    class Meta:
+        abstract = True
 
     def __str__(self):
         return f"{self.symbol} - {self.status}"
 
+class TradeHistoryManager(models.Manager):
+    """Reads the hot table and the archive as one set of trades."""
+
+    def combined(self, *args, **kwargs):
+        """
+        Same filters applied to both tables, UNION ALL'd. The result only supports
+        ordering, slicing and count() (Django restriction on combined querysets).
+        Rows come back as StrategyTrade instances.
+        """
+        hot = self.get_queryset().filter(*args, **kwargs)
+        cold = StrategyTradeArchive.objects.filter(*args, **kwargs)
+        return hot.union(cold, all=True)
+
+class StrategyTrade(TradeRecord):
+    """Live trades and the current session. Older finished trades move to StrategyTradeArchive."""
+    objects = models.Manager()
+    history = TradeHistoryManager()
+
+    class Meta:
+        # One index per hot access pattern (workers, order socket, sweeper, dashboard)
+        indexes = [
+            models.Index(fields=['symbol', 'status'], name='trade_symbol_status_idx'),
+            models.Index(fields=['symbol', 'created_at'], name='trade_symbol_created_idx'),
+            models.Index(fields=['status', 'created_at'], name='trade_status_created_idx'),
+            models.Index(fields=['entry_order_id'], name='trade_entry_order_idx'),
+            models.Index(fields=['exit_order_id'], name='trade_exit_order_idx'),
+            models.Index(fields=['-created_at'], name='trade_created_idx'),
+        ]
+
+class StrategyTradeArchive(TradeRecord):
+    """
+    CLOSED / EXPIRED / FAILED trades from past sessions (see archive_trades).
+    Rows keep the id they had in StrategyTrade and the same column order, so
+    the two tables can be UNION'd.
+    """
+    ARCHIVED_STATUSES = ('CLOSED', 'EXPIRED', 'FAILED')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at'], name='archive_created_idx'),
+            models.Index(fields=['symbol', 'created_at'], name='archive_symbol_created_idx'),
+        ]
+
 class LiveScanResult(models.Model):
     symbol = models.CharField(max_length=50)
     scan_time = models.DateTimeField(auto_now_add=True)
     pattern = models.CharField(max_length=255)
     
     class Meta:
-        ordering = ['-scan_time']
\ No newline at end of file
+        ordering = ['-scan_time']
+        indexes = [
+            models.Index(fields=['-scan_time'], name='scan_time_idx'),
+        ]
+class Instrument(models.Model):
+    """
+    Symbol master (see trading.symbol_master). The primary key is the symbol's
+    stable integer id in stream payloads and caches: rows are deactivated, never deleted.
+    """
+    symbol = models.CharField(max_length=50, unique=True)
+    tick_size = models.DecimalField(max_digits=8, decimal_places=4, default=0.05)
+    lot_size = models.IntegerField(default=1)
+    sector = models.CharField(max_length=100, blank=True, default='')
+    is_active = models.BooleanField(default=True)
+    version = models.IntegerField(default=0, help_text="Master version that last changed this row")
+
+    def __str__(self):
+        return f"{self.id}: {self.symbol}"
@@ -0,0 +1,151 @@
+"""
+Mark-to-market of open positions.
+
+MarkToMarket keeps per-symbol aggregates (short quantity and entry cost) for
+open positions, so a tick updates that symbol's unrealized P&L and the
+portfolio total in O(1). run_mtm_engine feeds it from market_ticks and
+order_events and publishes throttled snapshots:
+
+- mtm:positions  hash  symbol -> JSON {quantity, avg_price, ltp, unrealized}
+- mtm:portfolio  hash  day, unrealized, realized, total, open_positions, ts
+
+The risk engine reads mtm:portfolio for the daily loss limit and the dashboard
+hub merges the snapshot into its positions.
+
+At startup seed_session() takes open positions and the session's realized P&L
+from one read of the Redis trade store (the DB lags it by the write-behind).
+Trades already counted as closed are remembered, so replaying their fills from
+the order_events stream changes nothing.
+"""
+import json
+import time
+from django.db.models import Q
+from django.utils import timezone
+from trading.models import StrategyTrade
+from trading.trade_store import LIVE_STATUSES
+
+MTM_POSITIONS_KEY = "mtm:positions"
+MTM_PORTFOLIO_KEY = "mtm:portfolio"
+MTM_STALE_AFTER = 30 # Seconds; older snapshots are ignored by readers
+POSITION_STATUSES = ('OPEN', 'PENDING_EXIT')
+
+
+class MarkToMarket:
+    """Short positions only (the strategy sells to enter): P&L = (entry - ltp) * qty."""
+
+    def __init__(self):
+        self.positions = {} # trade_id -> (symbol, quantity, entry_price)
+        self.symbols = {} # symbol -> {'quantity', 'cost', 'ltp', 'unrealized'}
+        self.unrealized = 0.0
+        self.realized = 0.0
+        self.closed = set() # Trade ids already in `realized`
+        self.dirty = True
+
+    def open(self, trade_id, symbol, quantity, entry_price, ltp=None):
+        if trade_id in self.positions or trade_id in self.closed or not quantity:
+            return
+        self.positions[trade_id] = (symbol, quantity, entry_price)
+        agg = self.symbols.setdefault(symbol, {'quantity': 0, 'cost': 0.0, 'ltp': ltp or entry_price, 'unrealized': 0.0})
+        agg['quantity'] += quantity
+        agg['cost'] += entry_price * quantity
+        self._mark(agg, agg['ltp'])
+
+    def close(self, trade_id, exit_price):
+        position = self.positions.pop(trade_id, None)
+        if position is None:
+            return
+        symbol, quantity, entry_price = position
+        self.settle(trade_id, (entry_price - exit_price) * quantity)
+        agg = self.symbols[symbol]
+        agg['quantity'] -= quantity
+        agg['cost'] -= entry_price * quantity
+        if agg['quantity'] <= 0:
+            self.unrealized -= agg['unrealized']
+            del self.symbols[symbol]
+        else:
+            self._mark(agg, agg['ltp'])
+        self.dirty = True
+
+    def settle(self, trade_id, pnl):
+        """Count a closed trade's P&L once (later fills of the trade are ignored)."""
+        if trade_id in self.closed:
+            return
+        self.closed.add(trade_id)
+        self.realized += pnl
+        self.dirty = True
+
+    def new_session(self):
+        """Yesterday's realized P&L no longer counts towards the loss limit."""
+        self.realized = 0.0
+        self.closed.clear()
+        self.dirty = True
+
+    def on_tick(self, symbol, ltp):
+        """O(1). Returns False for symbols without an open position."""
+        agg = self.symbols.get(symbol)
+        if agg is None:
+            return False
+        self._mark(agg, ltp)
+        return True
+
+    def _mark(self, agg, ltp):
+        unrealized = agg['cost'] - ltp * agg['quantity']
+        self.unrealized += unrealized - agg['unrealized']
+        agg['unrealized'] = unrealized
+        agg['ltp'] = ltp
+        self.dirty = True
+
+    def snapshot(self):
+        # Re-sum once per snapshot so float drift from incremental updates never accumulates
+        self.unrealized = sum(agg['unrealized'] for agg in self.symbols.values())
+        positions = {
+            symbol: {
+                'quantity': agg['quantity'], 'avg_price': round(agg['cost'] / agg['quantity'], 2),
+                'ltp': agg['ltp'], 'unrealized': round(agg['unrealized'], 2),
+            }
+            for symbol, agg in self.symbols.items()
+        }
+        portfolio = {
+            'day': timezone.localdate().isoformat(),
+            'unrealized': round(self.unrealized, 2), 'realized': round(self.realized, 2),
+            'total': round(self.unrealized + self.realized, 2),
+            'open_positions': len(self.positions), 'ts': time.time(),
+        }
+        self.dirty = False
+        return portfolio, positions
+
+
+def seed_session(mtm, store, now=None):
+    """
+    Open positions and realized P&L of the session from the trade store. Live
+    trades and today's trades are listed from the DB (rows exist from creation);
+    their state comes from Redis, the DB only for trades Redis no longer holds.
+    """
+    day_start = timezone.localtime(now or timezone.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    ids = list(StrategyTrade.objects.filter(Q(status__in=LIVE_STATUSES) | Q(created_at__gte=day_start)).values_list('id', flat=True))
+    trades = store.get_many(ids) if ids else {}
+    for trade in trades.values():
+        if trade['status'] in POSITION_STATUSES:
+            mtm.open(trade['id'], trade['symbol'], trade['quantity'], trade['actual_entry_price'] or trade['entry_level'])
+        elif trade['status'] == 'CLOSED' and trade['pnl'] is not None:
+            mtm.settle(trade['id'], trade['pnl'])
+    gone = StrategyTrade.objects.filter(status='CLOSED', created_at__gte=day_start).exclude(id__in=list(trades))
+    for trade_id, pnl in gone.values_list('id', 'pnl'):
+        mtm.settle(trade_id, float(pnl or 0))
+
+
+def read_portfolio(r):
+    """Latest portfolio snapshot for today, or None if missing or stale."""
+    raw = r.hgetall(MTM_PORTFOLIO_KEY)
+    if not raw:
+        return None
+    portfolio = {k.decode('utf-8'): v.decode('utf-8') for k, v in raw.items()}
+    if portfolio.get('day') != timezone.localdate().isoformat():
+        return None
+    if time.time() - float(portfolio.get('ts', 0)) > MTM_STALE_AFTER:
+        return None
+    return {k: v if k == 'day' else float(v) for k, v in portfolio.items()}
+
+
+def encode_positions(positions):
+    return {symbol: json.dumps(pos) for symbol, pos in positions.items()}
@@ -0,0 +1,265 @@
+"""
+Live diagnostics for the workers, driven over Redis pub/sub.
+
+Hot-path timers: functions wrapped with @timed(name) keep their last
+TIMER_WINDOW durations. Every TIMER_PUBLISH_INTERVAL each worker writes the
+rolling p50 / p99 to the `hotpath_timers` hash (field '<worker>:<name>').
+They cost two perf_counter() calls and no I/O per call.
+
+Sampling profiler: on request a background thread snapshots every thread's
+stack (sys._current_frames) every interval_ms for N seconds. The samples are
+folded into collapsed stacks ('thread;outer;...;inner count' per line, which
+flamegraph.pl and speedscope read as they are) and stored under
+`profile:<id>:<worker>:<pid>` or written to disk; the key or path is pushed
+onto `profile_results:<id>`. Sampling is wall clock: a thread blocked on
+Redis shows up in its wait.
+
+Each worker calls start_control(name) once, which subscribes it to
+CONTROL_CHANNEL. Commands are JSON (see the worker_control command):
+
+    {"cmd": "profile", "id": "...", "seconds": 30, "interval_ms": 10, "dir": null, "worker": "algo_worker"}
+    {"cmd": "profile_stop", "worker": "*"}
+    {"cmd": "timers", "enabled": false}
+
+"worker" picks one worker by name; missing or "*" means all of them.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import functools
+import threading
+from collections import Counter, deque
+from trading.redis_client import r
+
+logger = logging.getLogger('profiling')
+
+CONTROL_CHANNEL = "worker_control"
+TIMERS_KEY = "hotpath_timers"
+PROFILE_KEY = "profile:{}:{}:{}" # id, worker, pid
+PROFILE_RESULTS_KEY = "profile_results:{}"
+PROFILE_TTL = 86400
+TIMER_WINDOW = 2000 # Calls per rolling window
+TIMER_PUBLISH_INTERVAL = 10 # Seconds
+PROFILE_INTERVAL_MS = 10 # Default sampling period (100 Hz)
+PROFILE_MAX_SECONDS = 600
+
+
+# =========================================================================
+# HOT-PATH TIMERS
+# =========================================================================
+def percentiles(samples):
+    """p50 / p99 / max of the samples (any iterable), None when empty. Shared by every latency window."""
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+    return {
+        'p50': ordered[len(ordered) // 2],
+        'p99': ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+        'max': ordered[-1],
+        'n': len(ordered),
+    }
+
+
+class RollingTimer:
+    def __init__(self, name, window=TIMER_WINDOW):
+        self.name = name
+        self.samples = deque(maxlen=window) # ms
+
+    def summary(self):
+        """p50 / p99 / max in ms over the window, None when empty."""
+        return percentiles(self.samples.copy()) # Copied first: @timed appends from other threads
+
+
+class Timers:
+    """Process-wide registry (module global `timers`)."""
+
+    def __init__(self):
+        self.enabled = True
+        self.by_name = {}
+        self.lock = threading.Lock()
+
+    def get(self, name):
+        with self.lock:
+            if name not in self.by_name:
+                self.by_name[name] = RollingTimer(name)
+            return self.by_name[name]
+
+    def summaries(self):
+        with self.lock:
+            timers = list(self.by_name.values())
+        return {t.name: s for t in timers for s in [t.summary()] if s}
+
+
+timers = Timers()
+
+
+def timed(name):
+    """Decorator: record every call's duration under `name` (a no-op while timers are off)."""
+    def decorate(func):
+        samples = timers.get(name).samples
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not timers.enabled:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                samples.append((time.perf_counter() - started) * 1000)
+        return wrapper
+    return decorate
+
+
+# =========================================================================
+# SAMPLING PROFILER
+# =========================================================================
+def frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler(threading.Thread):
+    """Samples every other thread's stack for `seconds` (or until stop()), then hands the collapsed stacks to on_done."""
+
+    def __init__(self, seconds, interval_ms=PROFILE_INTERVAL_MS, on_done=None):
+        super().__init__(name='sampling_profiler', daemon=True)
+        self.seconds = min(float(seconds), PROFILE_MAX_SECONDS)
+        self.interval = max(interval_ms, 1) / 1000
+        self.on_done = on_done
+        self.stopped = threading.Event()
+        self.stacks = Counter()
+        self.samples = 0
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        me = threading.get_ident()
+        names = {}
+        deadline = time.monotonic() + self.seconds
+        while not self.stopped.is_set() and time.monotonic() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                if ident not in names:
+                    names.update((t.ident, t.name) for t in threading.enumerate())
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+            self.stopped.wait(self.interval)
+        if self.on_done:
+            self.on_done(self)
+
+    def collapsed(self):
+        """Flamegraph input: one 'frame;frame;... count' line per distinct stack."""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+# =========================================================================
+# CONTROL CHANNEL
+# =========================================================================
+class WorkerControl:
+    def __init__(self, worker, client=None):
+        self.worker = worker
+        self.r = client or r
+        self.profiler = None
+        self.pid = os.getpid() # A forked child starts its own
+
+    def start(self):
+        threading.Thread(target=self.listen, name='worker_control', daemon=True).start()
+        threading.Thread(target=self.publish_timers, name='timer_publisher', daemon=True).start()
+        return self
+
+    def listen(self):
+        while True:
+            try:
+                pubsub = self.r.pubsub()
+                pubsub.subscribe(CONTROL_CHANNEL)
+                for message in pubsub.listen():
+                    if message['type'] == 'message':
+                        self.handle(json.loads(message['data']))
+            except Exception as e:
+                logger.error(f"Control Listener Error ({self.worker}): {e}")
+                time.sleep(5)
+
+    def handle(self, command):
+        if command.get('worker', '*') not in ('*', self.worker):
+            return
+        cmd = command.get('cmd')
+        if cmd == 'profile':
+            self.start_profile(command)
+        elif cmd == 'profile_stop':
+            if self.profiler:
+                self.profiler.stop()
+        elif cmd == 'timers':
+            timers.enabled = bool(command.get('enabled', True))
+            logger.info(f"Hot-path timers {'on' if timers.enabled else 'off'} ({self.worker}).")
+        else:
+            logger.warning(f"Unknown control command: {command}")
+
+    def start_profile(self, command):
+        if self.profiler and self.profiler.is_alive():
+            logger.warning(f"Profiler already running in {self.worker}. Ignored.")
+            return
+        profile_id = command.get('id') or str(int(time.time()))
+        self.profiler = SamplingProfiler(
+            command.get('seconds', 30), command.get('interval_ms', PROFILE_INTERVAL_MS),
+            on_done=lambda profiler: self.save_profile(profiler, profile_id, command.get('dir')),
+        )
+        self.profiler.start()
+        logger.info(f"Profiling {self.worker} for {self.profiler.seconds:.0f}s (id {profile_id})...")
+
+    def save_profile(self, profiler, profile_id, directory=None):
+        try:
+            result = {'worker': self.worker, 'pid': os.getpid(), 'samples': profiler.samples}
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+                path = os.path.join(directory, f"{self.worker}-{os.getpid()}-{profile_id}.folded")
+                with open(path, 'w') as f:
+                    f.write(profiler.collapsed())
+                result['path'] = path
+            else:
+                result['key'] = PROFILE_KEY.format(profile_id, self.worker, os.getpid())
+                self.r.set(result['key'], profiler.collapsed(), ex=PROFILE_TTL)
+            pipe = self.r.pipeline(transaction=False)
+            pipe.rpush(PROFILE_RESULTS_KEY.format(profile_id), json.dumps(result))
+            pipe.expire(PROFILE_RESULTS_KEY.format(profile_id), PROFILE_TTL)
+            pipe.execute()
+            logger.info(f"Profile {profile_id} of {self.worker}: {profiler.samples} samples -> {result.get('path') or result['key']}")
+        except Exception as e:
+            logger.error(f"Saving profile {profile_id} failed: {e}")
+
+    def publish_timers(self):
+        while True:
+            time.sleep(TIMER_PUBLISH_INTERVAL)
+            try:
+                summaries = timers.summaries()
+                if summaries and timers.enabled:
+                    self.r.hset(TIMERS_KEY, mapping={
+                        f"{self.worker}:{name}": json.dumps({**s, 'pid': os.getpid(), 'at': time.time()})
+                        for name, s in summaries.items()
+                    })
+            except Exception as e:
+                logger.error(f"Timer Publish Error ({self.worker}): {e}")
+
+
+_control = None
+_control_lock = threading.Lock()
+
+
+def start_control(worker, client=None):
+    """
+    Subscribe this process to CONTROL_CHANNEL and publish its timers. The first
+    call names the process; later ones (a worker hosted in another) return it.
+    """
+    global _control
+    with _control_lock:
+        if _control is None or _control.pid != os.getpid():
+            _control = WorkerControl(worker, client).start()
+        return _control
@@ -0,0 +1,88 @@
+"""
+Per-unit query budgets for the workers.
+
+A unit is one processed tick, candle or order event. measure() installs a
+connection.execute_wrapper on the calling thread's DB connection and counts the
+queries and DB time spent inside the block. Breaches are logged with the
+periodic summary; tests call assert_within() to fail instead.
+"""
+import time
+import logging
+from collections import deque
+from contextlib import contextmanager
+from django.db import connection
+
+logger = logging.getLogger('query_budget')
+
+REPORT_INTERVAL = 60 # Seconds between summaries per budget
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryUsage:
+    """Queries and DB time spent inside one measure() block."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_ms = 0.0
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_ms += (time.perf_counter() - started) * 1000
+            self.statements.append(sql)
+
+
+class QueryBudget:
+    def __init__(self, name, max_queries, max_db_ms=None, window=1000):
+        self.name = name
+        self.max_queries = max_queries
+        self.max_db_ms = max_db_ms
+        self.samples = deque(maxlen=window) # (queries, db_ms)
+        self.breaches = 0
+        self.last_report = time.time()
+
+    @contextmanager
+    def measure(self):
+        usage = QueryUsage()
+        with connection.execute_wrapper(usage):
+            yield usage
+        self.samples.append((usage.queries, usage.db_ms))
+        if self.exceeded(usage):
+            self.breaches += 1
+
+    def exceeded(self, usage):
+        if usage.queries > self.max_queries:
+            return True
+        return self.max_db_ms is not None and usage.db_ms > self.max_db_ms
+
+    def assert_within(self, usage):
+        if self.exceeded(usage):
+            limit = f"{self.max_queries} queries" + (f" / {self.max_db_ms}ms" if self.max_db_ms is not None else "")
+            raise QueryBudgetExceeded(
+                f"[{self.name}] {usage.queries} queries / {usage.db_ms:.1f}ms exceeds budget of {limit}:\n"
+                + "\n".join(usage.statements)
+            )
+
+    def maybe_report(self):
+        now = time.time()
+        if now - self.last_report < REPORT_INTERVAL or not self.samples:
+            return
+        n = len(self.samples)
+        queries = sum(q for q, _ in self.samples)
+        db_ms = sum(ms for _, ms in self.samples)
+        worst = max(q for q, _ in self.samples)
+        msg = f"DB [{self.name}] {queries / n:.2f} queries/unit, {db_ms / n:.2f}ms/unit, worst={worst} n={n}"
+        if self.breaches:
+            logger.warning(f"{msg} | {self.breaches} over budget ({self.max_queries} queries)")
+        else:
+            logger.info(msg)
+        self.samples.clear()
+        self.breaches = 0
+        self.last_report = now
@@ -0,0 +1,66 @@
+"""
+Bounded in-memory queue between producer threads and one asyncio consumer.
+
+Used by run_all_in_one in place of Redis streams. put() is a deque append
+(atomic under the GIL, callable from the socket / backfill threads); the
+consumer is only woken through the event loop when it is actually parked, so
+a busy buffer costs no syscalls. A full buffer overwrites the oldest item and
+counts the drop: under overload the strategy sees the freshest prices rather
+than falling further and further behind. capacity=None makes it unbounded, for
+items that must never be dropped (order intents).
+"""
+import asyncio
+from collections import deque
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class RingBuffer:
+    def __init__(self, name, capacity, loop):
+        self.name = name
+        self.items = deque(maxlen=capacity)
+        self.loop = loop
+        self.waiter = None
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def put(self, item):
+        """Any thread."""
+        if self.items.maxlen is not None and len(self.items) == self.items.maxlen:
+            self.dropped += 1
+        self.items.append(item)
+        waiter = self.waiter
+        if waiter is not None:
+            self.waiter = None
+            self.loop.call_soon_threadsafe(_wake, waiter)
+
+    async def get_batch(self, max_items):
+        """
+        Event loop only. Waits for at least one item, returns up to max_items.
+        Always suspends once, so a producer that never lets the buffer drain
+        cannot starve the loop's other tasks.
+        """
+        if self.items:
+            await asyncio.sleep(0)
+        while not self.items:
+            waiter = self.loop.create_future()
+            self.waiter = waiter
+            # A put() between the check above and publishing the waiter must not be missed
+            if self.items:
+                self.waiter = None
+                break
+            await waiter
+        batch = []
+        items = self.items
+        while items and len(batch) < max_items:
+            batch.append(items.popleft())
+        return batch
+
+    def take_dropped(self):
+        dropped, self.dropped = self.dropped, 0
+        return dropped
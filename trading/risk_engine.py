@@ -0,0 +1,224 @@
+"""
+Pre-trade risk checks served from in-process state.
+
+Quota for trades per day, trades per symbol and open notional exposure is
+reserved from Redis in blocks. The Redis counters therefore always hold
+(used + reserved) and can never pass the configured limits, no matter how many
+worker instances are running, while most checks are answered locally without a
+network round trip.
+
+Unused reservations are handed back on shutdown. If a worker dies without
+releasing, at most one block per counter is lost for the day, which errs on the
+side of trading less, never more.
+"""
+import math
+import time
+import logging
+import threading
+from django.utils import timezone
+from trading.mtm import read_portfolio
+
+logger = logging.getLogger('risk_engine')
+
+COUNTER_TTL = 86400
+MTM_CACHE_SECONDS = 1.0 # The MTM engine publishes about once a second
+
+# Reserve up to ARGV[1] units from KEYS[1] without crossing ARGV[2].
+# Returns the number of units granted (0 when the limit is exhausted).
+RESERVE_LUA = """
+local used = tonumber(redis.call('GET', KEYS[1]) or 0)
+local grant = math.min(tonumber(ARGV[1]), tonumber(ARGV[2]) - used)
+if grant <= 0 then
+    return 0
+end
+redis.call('INCRBY', KEYS[1], grant)
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return grant
+"""
+
+# Give back up to ARGV[1] units to KEYS[1] (never below zero).
+RELEASE_LUA = """
+local used = tonumber(redis.call('GET', KEYS[1]) or 0)
+local amount = math.min(tonumber(ARGV[1]), used)
+if amount > 0 then
+    redis.call('DECRBY', KEYS[1], amount)
+end
+return amount
+"""
+
+
+class PreTradeRiskEngine:
+    """
+    Local limit checks for the algo worker, shared by the signal and execution loops.
+
+    Limits come from GlobalTradingSettings:
+    - max_trades_per_day / max_trades_per_symbol (reserved in blocks from Redis)
+    - max_notional_per_trade (pure local check, 0 = no cap)
+    - max_open_exposure (notional reserved in blocks from Redis, 0 = no cap)
+    - max_daily_loss (session P&L from the MTM engine snapshot, 0 = off)
+    """
+
+    def __init__(self, r, settings_db, daily_block=3, exposure_block=100000):
+        self.r = r
+        self.settings_db = settings_db
+        self.daily_block = daily_block
+        self.exposure_block = exposure_block
+
+        # Scripts are loaded once and invoked by SHA (EVALSHA) afterwards
+        self._reserve = r.register_script(RESERVE_LUA)
+        self._release = r.register_script(RELEASE_LUA)
+
+        self.lock = threading.Lock()
+        self.day = None
+        self.mtm_total = None
+        self.mtm_read_at = 0
+        self._start_day(timezone.now().strftime('%Y-%m-%d'))
+
+    # --- Redis Keys (shared with older workers) ---
+    def _daily_key(self):
+        return f"daily_count:{self.day}"
+
+    def _symbol_key(self, symbol):
+        return f"symbol_count:{self.day}:{symbol}"
+
+    def _exposure_key(self):
+        return f"open_exposure:{self.day}"
+
+    def _start_day(self, day):
+        self.day = day
+        self.daily_allowance = 0
+        self.symbol_allowance = {}
+        self.exposure_allowance = 0
+        self.open_positions = {} # trade_id -> reserved notional (rupees)
+
+    def _roll_day(self):
+        today = timezone.now().strftime('%Y-%m-%d')
+        if today != self.day:
+            logger.info(f"Risk Engine: New session {today}. Local quota reset.")
+            self._start_day(today)
+
+    def _reserve_units(self, key, amount, limit):
+        return int(self._reserve(keys=[key], args=[amount, limit, COUNTER_TTL]))
+
+    # =========================================================================
+    # HOT PATH
+    # =========================================================================
+    def check_and_reserve(self, symbol, trade_id, notional):
+        """
+        Returns (True, None) when the trade may be placed, else (False, reason).
+        Only touches Redis when a local allowance has run dry.
+        """
+        s = self.settings_db
+        notional_cap = float(s.max_notional_per_trade or 0)
+        if notional_cap and notional > notional_cap:
+            return False, "Notional Cap Exceeded"
+
+        loss_cap = float(s.max_daily_loss or 0)
+        if loss_cap:
+            total = self._session_pnl()
+            if total is not None and total <= -loss_cap:
+                return False, "Daily Loss Limit Reached"
+
+        with self.lock:
+            self._roll_day()
+
+            if self.daily_allowance <= 0:
+                self.daily_allowance += self._reserve_units(self._daily_key(), self.daily_block, s.max_trades_per_day)
+                if self.daily_allowance <= 0:
+                    return False, "Global Limit Reached"
+
+            if self.symbol_allowance.get(symbol, 0) <= 0:
+                granted = self._reserve_units(self._symbol_key(symbol), 1, s.max_trades_per_symbol)
+                if granted <= 0:
+                    return False, "Symbol Limit Reached"
+                self.symbol_allowance[symbol] = self.symbol_allowance.get(symbol, 0) + granted
+
+            exposure_cap = float(s.max_open_exposure or 0)
+            required = int(math.ceil(notional)) if exposure_cap else 0
+            if required and self.exposure_allowance < required:
+                shortfall = required - self.exposure_allowance
+                self.exposure_allowance += self._reserve_units(
+                    self._exposure_key(), shortfall + self.exposure_block, int(exposure_cap)
+                )
+                if self.exposure_allowance < required:
+                    return False, "Exposure Limit Reached"
+
+            self.daily_allowance -= 1
+            self.symbol_allowance[symbol] -= 1
+            self.exposure_allowance -= required
+            self.open_positions[trade_id] = required
+            return True, None
+
+    def _session_pnl(self):
+        """
+        Realized + unrealized P&L of the session, at most one Redis read per
+        MTM_CACHE_SECONDS. None when the MTM engine is not publishing (the loss
+        limit is then not enforced, and a warning is logged).
+        """
+        now = time.time()
+        if now - self.mtm_read_at >= MTM_CACHE_SECONDS:
+            self.mtm_read_at = now
+            try:
+                portfolio = read_portfolio(self.r)
+            except Exception as e:
+                logger.error(f"Risk Engine: MTM read failed: {e}")
+                portfolio = None
+            if portfolio is None:
+                logger.warning("Risk Engine: No fresh MTM snapshot. Daily loss limit not enforced.")
+            self.mtm_total = portfolio['total'] if portfolio else None
+        return self.mtm_total
+
+    def rollback(self, trade_id, symbol):
+        """Order placement failed: return the units to the local allowance (still reserved in Redis)."""
+        with self.lock:
+            if trade_id not in self.open_positions:
+                return
+            self.daily_allowance += 1
+            self.symbol_allowance[symbol] = self.symbol_allowance.get(symbol, 0) + 1
+            self.exposure_allowance += self.open_positions.pop(trade_id)
+
+    def close_position(self, trade_id):
+        """Position is on its way out: its notional becomes available again."""
+        with self.lock:
+            self.exposure_allowance += self.open_positions.pop(trade_id, 0)
+            excess = self.exposure_allowance - 2 * self.exposure_block
+        if excess > 0:
+            self._give_back(self._exposure_key(), excess, 'exposure_allowance')
+
+    # =========================================================================
+    # OFF THE HOT PATH
+    # =========================================================================
+    def seed_open_positions(self, trades):
+        """
+        Adopt today's positions opened by a previous run (their notional is already
+        counted in Redis), so closing them frees the exposure. `trades` are trade
+        store dicts.
+        """
+        if not float(self.settings_db.max_open_exposure or 0):
+            return
+        with self.lock:
+            for trade in trades:
+                price = trade['actual_entry_price'] or trade['entry_level']
+                self.open_positions[trade['id']] = int(math.ceil(price * trade['quantity']))
+        logger.info(f"Risk Engine: Adopted {len(self.open_positions)} open positions.")
+
+    def _give_back(self, key, amount, attr):
+        with self.lock:
+            amount = min(amount, getattr(self, attr))
+            setattr(self, attr, getattr(self, attr) - amount)
+        if amount > 0:
+            self._release(keys=[key], args=[amount])
+
+    def release_unused(self):
+        """Hand unused reservations back to Redis (called on shutdown)."""
+        try:
+            self._give_back(self._daily_key(), self.daily_allowance, 'daily_allowance')
+            self._give_back(self._exposure_key(), self.exposure_allowance, 'exposure_allowance')
+            with self.lock:
+                symbols = [(sym, n) for sym, n in self.symbol_allowance.items() if n > 0]
+                self.symbol_allowance = {}
+            for sym, n in symbols:
+                self._release(keys=[self._symbol_key(sym)], args=[n])
+            logger.info("Risk Engine: Unused quota released.")
+        except Exception as e:
+            logger.error(f"Risk Engine: Failed to release quota: {e}")
@@ -0,0 +1,7 @@
+from django.urls import path
+from . import consumers
+
+websocket_urlpatterns = [
+    # Live dashboard feed (trades, scans, positions) pushed from Redis
+    path('ws/trading/dashboard/', consumers.DashboardConsumer.as_asgi()),
+]
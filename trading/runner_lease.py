@@ -0,0 +1,85 @@
+"""
+One strategy runner at a time.
+
+run_algo_worker, run_all_in_one and run_strategy_host each read the candle,
+tick and order event streams through their own consumer group: two of them
+running at once would create every setup twice and place every order twice.
+Whichever starts first takes the `strategy_runner` lease (SET NX EX) and renews
+it while it runs; any other runner waits out one TTL (the holder may be a
+crashed dyno) and then refuses to start.
+
+A holder that finds its lease taken over (e.g. Redis was unreachable for longer
+than the TTL and another runner started) exits at once rather than trade next
+to it.
+"""
+import os
+import time
+import socket
+import logging
+import threading
+from trading.redis_client import r
+
+logger = logging.getLogger('runner_lease')
+
+RUNNER_KEY = "strategy_runner"
+LEASE_TTL = 30 # Seconds a lease outlives its last renewal
+RENEW_INTERVAL = 10
+
+# KEYS[1] lease, ARGV[1] holder, ARGV[2] TTL ('' = release). Returns 1 if ARGV[1] holds the lease.
+RENEW_LUA = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+if ARGV[2] == '' then
+    redis.call('DEL', KEYS[1])
+else
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 1
+"""
+
+
+class RunnerLease(threading.Thread):
+    """acquire() once at startup, then start() the renewal thread; release() on a clean exit."""
+
+    def __init__(self, name, client=None, ttl=LEASE_TTL, interval=RENEW_INTERVAL):
+        super().__init__(name='runner_lease', daemon=True)
+        self.r = client or r
+        self.holder = f"{name}:{socket.gethostname()}:{os.getpid()}"
+        self.ttl = ttl
+        self.interval = interval
+        self._renew = self.r.register_script(RENEW_LUA)
+
+    def acquire(self, wait=None):
+        """True once the lease is ours; False if another runner still holds it after `wait` seconds (default: one TTL)."""
+        deadline = time.monotonic() + (self.ttl if wait is None else wait)
+        while True:
+            if self.r.set(RUNNER_KEY, self.holder, nx=True, ex=self.ttl):
+                logger.info(f"Strategy runner lease taken by {self.holder}.")
+                return True
+            holder = self.r.get(RUNNER_KEY)
+            if time.monotonic() >= deadline:
+                logger.critical(f"Another strategy runner is active ({holder.decode('utf-8') if holder else 'unknown'}). Not starting.")
+                return False
+            time.sleep(1)
+
+    def renew(self):
+        return self._renew(keys=[RUNNER_KEY], args=[self.holder, self.ttl]) == 1
+
+    def release(self):
+        try:
+            self._renew(keys=[RUNNER_KEY], args=[self.holder, ''])
+        except Exception as e:
+            logger.error(f"Lease release failed: {e}")
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                held = self.renew()
+            except Exception as e:
+                logger.error(f"Lease renewal failed: {e}")
+                continue
+            if not held:
+                logger.critical(f"Strategy runner lease lost ({self.holder}). Exiting before orders are doubled.")
+                os._exit(1)
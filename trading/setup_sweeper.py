@@ -0,0 +1,83 @@
+"""
+Expiry of stale PENDING setups.
+
+A setup expires when it is older than `setup_lifetime_minutes`, when it was
+created in an earlier session, or once `session_end_time` has passed. Expiry
+goes through the Redis trade store first (so a setup that is being triggered
+right now is never expired under it), then the DB rows are updated in one bulk
+UPDATE.
+"""
+import time
+import logging
+import threading
+from datetime import timedelta
+from django.db import connections
+from django.utils import timezone
+from trading.models import StrategyTrade
+
+logger = logging.getLogger('setup_sweeper')
+
+
+def setup_cutoff(settings_db, now=None):
+    """Setups created before the returned datetime are stale."""
+    now = timezone.localtime(now or timezone.now())
+    session_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    if now.time() >= settings_db.session_end_time:
+        return now
+    if settings_db.setup_lifetime_minutes > 0:
+        return max(session_start, now - timedelta(minutes=settings_db.setup_lifetime_minutes))
+    return session_start
+
+
+def expire_stale_setups(store, settings_db, now=None):
+    """Expire stale PENDING setups. Returns the list of expired trade ids."""
+    cutoff = setup_cutoff(settings_db, now)
+    candidates = list(
+        StrategyTrade.objects.filter(status='PENDING', created_at__lt=cutoff).values_list('id', 'symbol')
+    )
+    if not candidates:
+        return []
+    candidate_ids = [tid for tid, _ in candidates]
+
+    reason = "Setup Expired"
+    # Redis decides: trades already claimed by the execution loop stay untouched
+    expired_ids = store.transition_many(candidates, 'PENDING', 'EXPIRED', exit_reason=reason)
+
+    # Setups that never made it into Redis (e.g. created before recovery) only exist in the DB
+    moved = set(expired_ids)
+    leftover = [tid for tid in candidate_ids if tid not in moved]
+    known = store.known(leftover)
+    expired_ids += [tid for tid in leftover if tid not in known]
+
+    if expired_ids:
+        StrategyTrade.objects.filter(id__in=expired_ids, status='PENDING').update(status='EXPIRED', exit_reason=reason)
+        store.mark_clean(expired_ids)
+        logger.info(f"Sweeper: Expired {len(expired_ids)} stale setups (cutoff {cutoff:%Y-%m-%d %H:%M}).")
+    return expired_ids
+
+
+class SetupSweeper(threading.Thread):
+    """Runs expire_stale_setups every `interval` seconds. `on_expired(ids)` lets the host purge local state."""
+
+    def __init__(self, store, settings_db, interval=60, on_expired=None):
+        super().__init__(name='setup_sweeper', daemon=True)
+        self.store = store
+        self.settings_db = settings_db
+        self.interval = interval
+        self.on_expired = on_expired
+
+    def run(self):
+        try:
+            while True:
+                try:
+                    # Pick up lifetime changes made from the dashboard
+                    self.settings_db.refresh_from_db(fields=['setup_lifetime_minutes', 'session_end_time'])
+                    expired = expire_stale_setups(self.store, self.settings_db)
+                    if expired and self.on_expired:
+                        self.on_expired(expired)
+                except Exception as e:
+                    logger.error(f"Sweeper Error: {e}")
+                time.sleep(self.interval)
+        finally:
+            connections.close_all()
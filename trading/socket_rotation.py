@@ -0,0 +1,124 @@
+"""
+In-place credential rotation for the Fyers websockets.
+
+A new socket is connected and subscribed with the new token while the old one
+keeps delivering; traffic is then cut over and the old socket is closed in the
+background. The handover gap (or overlap, when negative) is logged on every
+rotation.
+
+The SDK socket classes are process-wide singletons (their __new__ hands back one
+cached instance), so every generation gets its own subclass via
+isolated_socket_class() to keep two connections alive side by side.
+"""
+import time
+import logging
+import threading
+
+logger = logging.getLogger('socket_rotation')
+
+
+def isolated_socket_class(base):
+    """Subclass of an SDK socket class with its own singleton slot."""
+    return type(f"{base.__name__}Gen", (base,), {'_instance': None})
+
+
+def format_ws_token(app_id, raw_token):
+    """Fyers WebSockets require 'APP_ID:ACCESS_TOKEN'."""
+    return raw_token if ":" in raw_token else f"{app_id}:{raw_token}"
+
+
+class SocketRotator:
+    """
+    Owns the live socket of one process.
+
+    factory(token, generation) must return a socket that is connected and
+    subscribed, with its callbacks calling accept(generation) before handling a
+    message.
+
+    cut_on_first_message=True  (market data): the new socket becomes active with
+        its first message; until then the old one keeps feeding.
+    cut_on_first_message=False (orders): the new socket becomes active as soon as
+        it is subscribed; the old one keeps being accepted for `grace` seconds so
+        no update in flight is lost (consumers must tolerate duplicates).
+    """
+
+    def __init__(self, name, factory, cut_on_first_message=True, grace=0.0):
+        self.name = name
+        self.factory = factory
+        self.cut_on_first_message = cut_on_first_message
+        self.grace = grace
+
+        self.lock = threading.Lock()
+        self.rotate_lock = threading.Lock()
+        self.active = None # (generation, socket)
+        self.pending = None
+        self.retiring = None # (generation, socket, accept_until)
+        self.last_message_at = None
+        self.rotation_started = None
+        self.generation = 0
+
+    # --- Called from socket callbacks (hot path) ---
+    def accept(self, generation):
+        now = time.time()
+        with self.lock:
+            if self.active and generation == self.active[0]:
+                self.last_message_at = now
+                return True
+            if self.pending and generation == self.pending[0]:
+                self._cutover(now)
+                return True
+            if self.retiring and generation == self.retiring[0]:
+                return now < self.retiring[2]
+        return False
+
+    def is_active(self, generation):
+        with self.lock:
+            return bool(self.active) and self.active[0] == generation
+
+    # --- Rotation ---
+    def start(self, token):
+        self.rotate(token)
+
+    def rotate(self, token):
+        """Connect a new generation with `token` and cut over to it. Blocks until subscribed."""
+        with self.rotate_lock:
+            self.generation += 1
+            generation = self.generation
+            self.rotation_started = time.time()
+            logger.info(f"[{self.name}] Connecting generation {generation}...")
+
+            sock = self.factory(token, generation)
+
+            with self.lock:
+                self.pending = (generation, sock)
+                if self.active is None or not self.cut_on_first_message:
+                    self._cutover(time.time())
+            logger.info(f"[{self.name}] Generation {generation} subscribed in {time.time() - self.rotation_started:.2f}s.")
+
+    def _cutover(self, now):
+        """Caller holds self.lock."""
+        old = self.active
+        self.active, self.pending = self.pending, None
+
+        if old is None:
+            logger.info(f"[{self.name}] Generation {self.active[0]} live.")
+            return
+
+        if self.last_message_at is not None:
+            gap_ms = (now - self.last_message_at) * 1000
+            logger.info(f"[{self.name}] Cutover {old[0]} -> {self.active[0]} | gap since last message on old socket: {gap_ms:.1f}ms")
+        else:
+            logger.info(f"[{self.name}] Cutover {old[0]} -> {self.active[0]} | old socket idle, no gap.")
+        self.last_message_at = now
+
+        self.retiring = (old[0], old[1], now + self.grace)
+        threading.Thread(target=self._retire, args=(old[1],), daemon=True).start()
+
+    def _retire(self, sock):
+        if self.grace:
+            time.sleep(self.grace)
+        try:
+            sock.close_connection()
+        except Exception as e:
+            logger.error(f"[{self.name}] Error closing old socket: {e}")
+        logger.info(f"[{self.name}] Old socket closed.")
@@ -0,0 +1,48 @@
+"""
+Built-in plugins for the strategy host (settings.STRATEGY_PLUGINS).
+
+Both wrap the existing workers' logic, so run_strategy_host behaves like
+run_algo_worker + run_scanner_worker with one stream read and decode between them.
+"""
+from trading.strategy_host import StrategyPlugin
+from trading.management.commands.run_algo_worker import (
+    Command as AlgoWorker, CANDLE_QUERY_BUDGET, TICK_QUERY_BUDGET, ORDER_EVENT_QUERY_BUDGET,
+)
+from trading.management.commands.run_scanner_worker import Command as ScannerWorker, SCAN_QUERY_BUDGET
+
+
+class BreakdownStrategy(StrategyPlugin):
+    """Cash breakdown: setups on candles, entries / exits on ticks, book kept current by order events."""
+    name = 'breakdown'
+    query_budgets = {'on_candle': CANDLE_QUERY_BUDGET, 'on_tick': TICK_QUERY_BUDGET, 'on_order_event': ORDER_EVENT_QUERY_BUDGET}
+
+    def start(self, host):
+        self.worker = AlgoWorker()
+        self.worker.runner = 'strategy_host'
+        self.worker.indicators = host.indicators # Fed by the host
+        return self.worker.initialize()
+
+    def on_candle(self, candle):
+        self.worker.on_candle_record(candle, self.worker.settings_db)
+
+    def on_tick(self, tick):
+        self.worker.on_tick(tick.symbol, tick.ltp, self.worker.fyers, self.worker.settings_db)
+
+    def on_order_event(self, event):
+        self.worker.on_order_event(event)
+
+    def stop(self):
+        self.worker.shutdown()
+
+
+class BreakdownScanner(StrategyPlugin):
+    """Dashboard scan results for breakdown candles."""
+    name = 'scanner'
+    query_budgets = {'on_candle': SCAN_QUERY_BUDGET}
+
+    def start(self, host):
+        self.scanner = ScannerWorker()
+        return True
+
+    def on_candle(self, candle):
+        self.scanner.scan(candle)
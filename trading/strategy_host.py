@@ -0,0 +1,280 @@
+"""
+Strategy plugin host: each stream consumed once, each event decoded once.
+
+The host reads candle_stream_1m, market_ticks and order_events through one
+consumer group, turns every entry into a shared record (Candle, Tick or an
+order event dict) and hands it to every plugin that implements the callback.
+The PDL comparison and turnover are computed once, in decode_candle(), so a
+second strategy costs its own logic only: no extra XREADGROUP, JSON decode or
+PDL lookup.
+
+A plugin subclasses StrategyPlugin and overrides what it needs:
+
+    start(host)          load state; return False to abort startup
+    on_candle(candle)    every finished 1m candle
+    on_tick(tick)        every tick (the host skips the tick stream if no plugin wants it)
+    on_order_event(e)    fills / rejections from run_order_socket
+    stop()               release resources on shutdown
+
+Before the fan-out the host feeds candles and ticks to host.indicators
+(trading.indicators.IndicatorBank, warm-started at boot), so plugins query
+VWAP, relative volume, ATR and the like without keeping their own.
+
+Records are shared by all plugins: treat them as read-only. Every callback
+runs inside its plugin's query budget (query_budgets) and its CPU time is
+accounted per plugin and callback (time.thread_time, so waiting on Redis or
+the DB is not counted); the totals are logged every REPORT_INTERVAL.
+Plugins are listed in settings.STRATEGY_PLUGINS and run by run_strategy_host.
+"""
+import json
+import time
+import logging
+import threading
+from collections import namedtuple, defaultdict
+import redis
+from django.db import connections
+from trading.query_budget import QueryBudget
+from trading.constants import get_strategy_symbols
+from trading.indicators import IndicatorBank, build_indicators
+from trading.symbol_master import decode_symbol
+from trading.trade_store import ORDER_EVENTS_STREAM, decode_order_event
+from trading.redis_client import r, xack_many
+
+logger = logging.getLogger('strategy_host')
+
+GROUP_NAME = "STRATEGY_HOST"
+CONSUMER_NAME = "HOST_1"
+STREAM_CANDLE = "candle_stream_1m"
+STREAM_TICK = "market_ticks"
+REDIS_PDL_KEY = "prev_day_ohlc"
+REPORT_INTERVAL = 60 # Seconds between CPU summaries
+
+# One entry per stream: (callback, start id for a new group, XREADGROUP count)
+STREAMS = {
+    STREAM_CANDLE: ('on_candle', '0', 100),
+    STREAM_TICK: ('on_tick', '$', 50),
+    ORDER_EVENTS_STREAM: ('on_order_event', '$', 100),
+}
+
+Candle = namedtuple('Candle', 'symbol open high low close volume ts backfilled pdl breakdown turnover')
+Candle.__doc__ = """
+One finished 1m candle. ts is the ISO string run_data_engine publishes; pdl is
+the previous day's low (None without PDL data), breakdown = open > pdl > close,
+turnover = volume * close.
+"""
+Tick = namedtuple('Tick', 'symbol ltp ts')
+
+
+def decode_candle(payload, prev_day_data_map):
+    """Candle payload dict (as published by run_data_engine) -> Candle."""
+    open_p, close_p = float(payload['open']), float(payload['close'])
+    volume = float(payload.get('volume', 0))
+    pdl_info = prev_day_data_map.get(payload['symbol'])
+    pdl = float(pdl_info['low']) if pdl_info else None
+    return Candle(
+        payload['symbol'], open_p, float(payload['high']), float(payload['low']), close_p, volume,
+        payload['ts'], payload.get('backfilled', False), pdl,
+        pdl is not None and open_p > pdl and close_p < pdl, volume * close_p,
+    )
+
+
+def load_prev_day(client=None):
+    """prev_day_ohlc hash -> {symbol: {'open', 'high', 'low', 'close', 'volume'}}."""
+    try:
+        cached = (client or r).hgetall(REDIS_PDL_KEY)
+        return {k.decode('utf-8'): json.loads(v) for k, v in cached.items()}
+    except Exception as e:
+        logger.error(f"Failed to load PDL Cache: {e}")
+        return {}
+
+
+class StrategyPlugin:
+    """Base class for strategies hosted by StrategyHost; every callback is optional."""
+    name = None
+    query_budgets = {} # callback name -> SQL allowed per event (see trading.query_budget)
+
+    def start(self, host):
+        return True
+
+    def on_candle(self, candle):
+        pass
+
+    def on_tick(self, tick):
+        pass
+
+    def on_order_event(self, event):
+        pass
+
+    def stop(self):
+        pass
+
+    def wants(self, callback):
+        return getattr(type(self), callback) is not getattr(StrategyPlugin, callback)
+
+
+class CpuAccount:
+    """Thread CPU time per (plugin, callback). Each key is only written by its stream's thread."""
+
+    def __init__(self):
+        self.cpu = defaultdict(float) # seconds
+        self.calls = defaultdict(int)
+
+    def add(self, key, seconds):
+        self.cpu[key] += seconds
+        self.calls[key] += 1
+
+    def take(self):
+        """Totals since the last take(): {(plugin, callback): (calls, cpu seconds)}."""
+        keys = list(self.calls)
+        totals = {k: (self.calls[k], self.cpu[k]) for k in keys}
+        for k in keys:
+            self.calls[k] -= totals[k][0]
+            self.cpu[k] -= totals[k][1]
+        return {k: v for k, v in totals.items() if v[0]}
+
+
+class StrategyHost:
+    def __init__(self, plugins, client=None):
+        self.plugins = plugins
+        self.r = client or r
+        self.prev_day = {}
+        self.indicators = IndicatorBank([], 0) # Replaced by the warm one in start()
+        self.cpu = CpuAccount()
+        self.lags = {}
+        self.budgets = {
+            (p.name, cb): QueryBudget(f"{p.name}.{cb}", p.query_budgets[cb])
+            for p in plugins for cb in p.query_budgets
+        }
+
+    def start(self):
+        """PDL cache, consumer groups and every plugin's start(). Returns False if a plugin refuses to start."""
+        self.prev_day = load_prev_day(self.r)
+        logger.info(f"Loaded PDL Data for {len(self.prev_day)} symbols.")
+        self.indicators = build_indicators(get_strategy_symbols(), client=self.r)
+        for stream, (callback, start_id, _) in STREAMS.items():
+            if not self.subscribers(callback):
+                continue
+            try:
+                self.r.xgroup_create(stream, GROUP_NAME, id=start_id, mkstream=True)
+            except redis.exceptions.ResponseError:
+                pass # Group already exists
+        for plugin in self.plugins:
+            if not plugin.start(self):
+                logger.error(f"Plugin {plugin.name} failed to start.")
+                return False
+            logger.info(f"Plugin {plugin.name} started ({', '.join(cb for cb, *_ in STREAMS.values() if plugin.wants(cb))}).")
+        return True
+
+    def stop(self):
+        for plugin in self.plugins:
+            try:
+                plugin.stop()
+            except Exception as e:
+                logger.error(f"Plugin {plugin.name} stop failed: {e}")
+
+    def subscribers(self, callback):
+        return [p for p in self.plugins if p.wants(callback)]
+
+    # =========================================================================
+    # DECODE (once per entry)
+    # =========================================================================
+    def decode(self, stream, data):
+        if stream == STREAM_TICK:
+            symbol = decode_symbol(data)
+            return Tick(symbol, float(data[b'ltp']), float(data[b'ts'])) if symbol is not None else None
+        if stream == STREAM_CANDLE:
+            return decode_candle(json.loads(data[b'data']), self.prev_day)
+        return decode_order_event(data)
+
+    # =========================================================================
+    # CONSUMER LOOPS (one thread per stream, like run_algo_worker)
+    # =========================================================================
+    def threads(self):
+        from trading.management.commands.run_algo_worker import LoopLag
+        threads = []
+        for stream, (callback, _, count) in STREAMS.items():
+            plugins = self.subscribers(callback)
+            if plugins:
+                self.lags[stream] = LoopLag(stream)
+                threads.append(threading.Thread(
+                    target=self.consume, name=f"host:{stream}", daemon=True, args=(stream, callback, count, plugins)
+                ))
+        return threads
+
+    def consume(self, stream_name, callback, count, plugins):
+        lag = self.lags[stream_name]
+        handlers = [(p.name, getattr(p, callback), self.budgets.get((p.name, callback))) for p in plugins]
+        try:
+            while True:
+                try:
+                    events = self.r.xreadgroup(
+                        groupname=GROUP_NAME, consumername=CONSUMER_NAME,
+                        streams={stream_name: '>'}, count=count, block=1000
+                    )
+                    for stream, messages in events or []:
+                        for msg_id, data in messages:
+                            lag.record(msg_id)
+                            self.dispatch(stream_name, callback, data, handlers)
+                        # Every entry is acked: one plugin failing must not replay it to the others
+                        xack_many(stream, GROUP_NAME, [msg_id for msg_id, _ in messages], client=self.r)
+                    lag.maybe_report()
+                    for _, _, budget in handlers:
+                        if budget:
+                            budget.maybe_report()
+                except redis.exceptions.ConnectionError:
+                    logger.error(f"Redis Connection Lost ({stream_name}). Retrying...")
+                    time.sleep(5)
+                except Exception as e:
+                    logger.error(f"Unhandled Exception in {stream_name} Loop: {e}")
+        finally:
+            connections.close_all()
+
+    def dispatch(self, stream_name, callback, data, handlers):
+        started = time.thread_time()
+        try:
+            record = self.decode(stream_name, data)
+        except Exception as e:
+            logger.error(f"Undecodable entry on {stream_name}: {e}")
+            return
+        finally:
+            self.cpu.add(('host', f"decode:{stream_name}"), time.thread_time() - started)
+        if record is None:
+            return
+        if stream_name != ORDER_EVENTS_STREAM:
+            started = time.thread_time()
+            if stream_name == STREAM_TICK:
+                self.indicators.on_tick(record.symbol, record.ltp)
+            else:
+                self.indicators.on_candle(record)
+            self.cpu.add(('host', 'indicators'), time.thread_time() - started)
+        for name, handler, budget in handlers:
+            started = time.thread_time()
+            try:
+                if budget:
+                    with budget.measure():
+                        handler(record)
+                else:
+                    handler(record)
+            except Exception as e:
+                logger.error(f"Plugin {name} failed in {callback}: {e}")
+            finally:
+                self.cpu.add((name, callback), time.thread_time() - started)
+
+    # =========================================================================
+    # REPORTING
+    # =========================================================================
+    def report(self):
+        totals = self.cpu.take()
+        for (name, callback), (calls, seconds) in sorted(totals.items()):
+            logger.info(f"CPU [{name}.{callback}] {seconds * 1000:.1f}ms over {calls} events ({seconds / calls * 1e6:.0f}us each)")
+        return totals
+
+    def run(self):
+        """Start the consumer threads and report until one of them dies."""
+        threads = self.threads()
+        for thread in threads:
+            thread.start()
+        logger.info(f">>> Strategy Host Started: {', '.join(p.name for p in self.plugins)} on {', '.join(t.name for t in threads)} <<<")
+        while all(t.is_alive() for t in threads):
+            time.sleep(REPORT_INTERVAL)
+            self.report()
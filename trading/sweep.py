@@ -0,0 +1,223 @@
+"""
+Parameter sweep over the strategy knobs of GlobalTradingSettings.
+
+The work is split by what each knob can change:
+- signals, setups and entry triggers depend on none of them
+  (max_trades_per_symbol only decides how many of a day's setups exist, so
+  setups are found once at the largest value in the sweep and kept by rank)
+- exits depend on risk_reward_ratio and breakeven_trigger_r only
+- risk_per_trade_amount, the notional cap, max_trades_per_symbol and
+  max_trades_per_day only scale and select trades
+Each symbol's candles are therefore loaded and its setups found once, on a
+process pool, and backtest.manage_position runs once per (target, breakeven)
+pair in the sweep. Every parameter set is then scored with array operations
+over all symbols at once.
+
+Results are appended to a JSON-lines file as each set is scored; a rerun with
+the same file skips the sets already in it.
+"""
+import json
+import math
+import random
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from trading.analytics import derive
+from trading.backtest import load_candles, find_setups, manage_position, day_layout
+
+SWEEP_KNOBS = (
+    'risk_reward_ratio', 'breakeven_trigger_r', 'risk_per_trade_amount',
+    'max_trades_per_day', 'max_trades_per_symbol',
+)
+INT_KNOBS = ('max_trades_per_day', 'max_trades_per_symbol')
+METRICS = ('trades', 'pnl', 'win_rate', 'avg_pnl', 'profit_factor', 'avg_r', 'max_drawdown', 'sharpe')
+TRADING_DAYS = 250
+
+
+# =========================================================================
+# SEARCH SPACE
+# =========================================================================
+def grid(space):
+    """{knob: [values]} -> every combination."""
+    knobs = list(space)
+    return [dict(zip(knobs, values)) for values in itertools.product(*(space[k] for k in knobs))]
+
+
+def random_search(space, samples, seed=None):
+    """{knob: [values] or (low, high)} -> `samples` random draws (ranges drawn uniformly)."""
+    rng = random.Random(seed)
+    draws = []
+    for _ in range(samples):
+        draw = {}
+        for knob, values in space.items():
+            if isinstance(values, tuple):
+                low, high = values
+                draw[knob] = rng.randint(int(low), int(high)) if knob in INT_KNOBS else round(rng.uniform(low, high), 2)
+            else:
+                draw[knob] = rng.choice(values)
+        draws.append(draw)
+    return draws
+
+
+def param_key(params):
+    return json.dumps([params[k] for k in SWEEP_KNOBS])
+
+
+def load_results(path):
+    results = []
+    try:
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    results.append(json.loads(line))
+    except FileNotFoundError:
+        pass
+    return results
+
+
+# =========================================================================
+# SHARED PASS (one task per symbol)
+# =========================================================================
+def _setup_job(job):
+    """Triggered setups of one symbol and their exits for every (target, breakeven) pair."""
+    data_dir, symbol, base, utc_offset, max_per_symbol, exit_pairs, start_ts, end_ts = job
+    c = load_candles(data_dir, symbol, start_ts, end_ts, utc_offset)
+    if c is None or len(c['ts']) < 2:
+        return symbol, None
+    ts = c['ts']
+    rows, exits = [], []
+    for i, rank, entry, stop, end, e, fill, _ in find_setups(c, base, utc_offset, max_per_symbol):
+        if e is None:
+            continue
+        rows.append((rank, entry, stop, fill, ts[e]))
+        risk = stop - entry
+        row = []
+        for rr, be_r in exit_pairs:
+            j, price, _, _, _ = manage_position(c, e, end, fill, stop, entry - risk * rr, be_r)
+            row.append((price, ts[j] + 60))
+        exits.append(row)
+
+    _, _, day_starts, _ = day_layout(ts, utc_offset)
+    sessions = (ts[day_starts] + utc_offset) // 86400
+    n, pairs = len(rows), len(exit_pairs)
+    rows = np.array(rows, dtype=np.float64).reshape(n, 5)
+    exits = np.array(exits, dtype=np.float64).reshape(n, pairs, 2)
+    return symbol, {
+        'rank': rows[:, 0].astype(np.int64), 'entry': rows[:, 1], 'stop': rows[:, 2], 'fill': rows[:, 3],
+        'entry_time': rows[:, 4].astype(np.int64), 'exit_price': exits[:, :, 0],
+        'exit_time': exits[:, :, 1].astype(np.int64), 'sessions': sessions,
+    }
+
+
+def prepare(symbols, base, data_dir, utc_offset, max_per_symbol, exit_pairs, start_ts=None, end_ts=None, workers=None):
+    """
+    All symbols' triggered setups in one set of arrays, ordered by entry time
+    (the order the live risk engine sees them in). Returns (arrays, symbols without data).
+    """
+    jobs = [(data_dir, s, base, utc_offset, max_per_symbol, exit_pairs, start_ts, end_ts) for s in symbols]
+    parts, missing, sessions = [], [], set()
+    name_order = {s: k for k, s in enumerate(sorted(symbols))} # Same-minute ties broken like backtest.apply_daily_limit
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for symbol, part in pool.map(_setup_job, jobs, chunksize=4):
+            if part is None:
+                missing.append(symbol)
+                continue
+            sessions.update(part.pop('sessions').tolist())
+            part['symbol'] = np.full(len(part['rank']), name_order[symbol])
+            parts.append(part)
+
+    data = {k: np.concatenate([p[k] for p in parts]) for k in parts[0]} if parts else {}
+    if data:
+        order = np.lexsort((data['symbol'], data['entry_time']))
+        data = {k: v[order] for k, v in data.items()}
+        data['day'] = (data['entry_time'] + utc_offset) // 86400
+    data['pairs'] = {pair: p for p, pair in enumerate(exit_pairs)}
+    data['sessions'] = np.array(sorted(sessions), dtype=np.int64)
+    return data, missing
+
+
+# =========================================================================
+# SCORING (one parameter set)
+# =========================================================================
+def score(data, params, notional_cap, utc_offset):
+    """Metrics of one parameter set over the prepared setups (vectorized, no per-trade Python)."""
+    if 'rank' not in data or not len(data['rank']):
+        return derive({}) | {'max_drawdown': 0.0, 'sharpe': None}
+    p = data['pairs'][(params['risk_reward_ratio'], params['breakeven_trigger_r'])]
+    risk = data['stop'] - data['entry']
+    qty = np.maximum(1, np.floor(params['risk_per_trade_amount'] / risk))
+
+    taken = data['rank'] < params['max_trades_per_symbol']
+    if notional_cap:
+        taken &= data['fill'] * qty <= notional_cap
+    # max_trades_per_day across symbols, in entry order; rejected entries use up nothing
+    day = data['day']
+    count = np.cumsum(taken)
+    day_start = np.flatnonzero(np.r_[True, day[1:] != day[:-1]])
+    before = np.r_[0, count][day_start]
+    taken &= count - np.repeat(before, np.diff(np.r_[day_start, len(day)])) <= params['max_trades_per_day']
+
+    fill, entry, qty, risk = data['fill'][taken], data['entry'][taken], qty[taken], risk[taken]
+    pnl = (fill - data['exit_price'][taken, p]) * qty
+    slippage = entry - fill
+    metrics = derive({
+        'trades': len(pnl), 'wins': int((pnl > 0).sum()), 'pnl': pnl.sum(),
+        'gross_win': pnl[pnl > 0].sum(), 'gross_loss': -pnl[pnl < 0].sum(),
+        'r_sum': (pnl / (risk * qty)).sum(), 'r_count': len(pnl),
+        'slippage_sum': slippage.sum(), 'slippage_bps_sum': (slippage / entry * 10000).sum(), 'slippage_count': len(pnl),
+    })
+
+    # Equity curve in exit order, and daily P&L over every session in the data
+    exit_time = data['exit_time'][taken, p]
+    equity = np.r_[0.0, np.cumsum(pnl[np.argsort(exit_time, kind='stable')])]
+    metrics['max_drawdown'] = round(float((np.maximum.accumulate(equity) - equity).max()), 2)
+    sessions = data['sessions']
+    daily = np.zeros(len(sessions))
+    np.add.at(daily, np.searchsorted(sessions, (exit_time + utc_offset) // 86400).clip(0, max(0, len(sessions) - 1)), pnl)
+    std = daily.std()
+    metrics['sharpe'] = round(float(daily.mean() / std * math.sqrt(TRADING_DAYS)), 2) if len(daily) > 1 and std else None
+    return metrics
+
+
+def rank_results(results, order_by):
+    """Django-style ordering: ['-pnl', 'max_drawdown'] = most P&L first, then least drawdown. None sorts last."""
+    def sort_key(result):
+        key = []
+        for field in order_by:
+            descending = field.startswith('-')
+            value = result['metrics'].get(field.lstrip('-'))
+            key.append((value is None, -value if descending and value is not None else value))
+        return key
+    return sorted(results, key=sort_key)
+
+
+def run_sweep(candidates, base, symbols, data_dir, utc_offset, results_path,
+              start_ts=None, end_ts=None, workers=None, on_result=None):
+    """
+    Score every candidate not already in results_path, appending as it goes.
+    Returns (all results, symbols without data).
+    """
+    results = load_results(results_path)
+    done = {param_key(r['params']) for r in results}
+    pending, seen = [], set(done)
+    for params in candidates:
+        params = {k: params.get(k, base[k]) for k in SWEEP_KNOBS}
+        if param_key(params) not in seen:
+            seen.add(param_key(params))
+            pending.append(params)
+    if not pending:
+        return results, []
+
+    exit_pairs = sorted({(p['risk_reward_ratio'], p['breakeven_trigger_r']) for p in pending})
+    max_per_symbol = max(p['max_trades_per_symbol'] for p in pending)
+    data, missing = prepare(symbols, base, data_dir, utc_offset, max_per_symbol, exit_pairs, start_ts, end_ts, workers)
+
+    with open(results_path, 'a') as f:
+        for params in pending:
+            result = {'params': params, 'metrics': score(data, params, base['max_notional_per_trade'], utc_offset)}
+            f.write(json.dumps(result) + '\n')
+            f.flush()
+            results.append(result)
+            if on_result:
+                on_result(result)
+    return results, missing
@@ -0,0 +1,204 @@
+"""
+Symbol master: one stable integer id per symbol, shared by every process.
+
+The Instrument table owns the ids (its primary key) and the metadata; rows are
+deactivated, never deleted, so an id always means the same symbol. sync_symbols
+registers the strategy universe and publishes the master to Redis:
+
+    symbol_master             hash  id -> json {symbol, tick_size, lot_size, sector, active}
+    symbol_master_version     int   bumped whenever a row changes
+
+Each process loads it once (get_master()) into a list indexed by id and a dict
+keyed by symbol, so both directions are O(1) without touching Redis. Ids are
+append-only: a process that meets an id it does not know reloads, at most once
+per REFRESH_INTERVAL, when the published version has moved on.
+
+Hot stream payloads carry the id (`sid`) instead of the 'NSE:XXX-EQ' string;
+decode_symbol() turns either form back into the symbol.
+"""
+import json
+import time
+import logging
+import threading
+from trading.redis_client import r
+
+logger = logging.getLogger('symbol_master')
+
+MASTER_KEY = "symbol_master"
+VERSION_KEY = "symbol_master_version"
+REFRESH_INTERVAL = 5 # Seconds between reloads triggered by unknown ids
+
+
+class SymbolMaster:
+    def __init__(self, rows=(), version=0):
+        """rows = [(id, {symbol, tick_size, lot_size, sector, active}), ...]"""
+        self.version = version
+        rows = sorted(rows)
+        size = rows[-1][0] + 1 if rows else 0
+        self._symbols = [None] * size # id -> symbol
+        self._meta = [None] * size # id -> metadata dict
+        self._ids = {} # symbol -> id
+        for sid, meta in rows:
+            self._symbols[sid] = meta['symbol']
+            self._meta[sid] = meta
+            self._ids[meta['symbol']] = sid
+        self._lock = threading.Lock()
+        self._last_refresh = 0
+
+    def __len__(self):
+        return len(self._ids)
+
+    # =========================================================================
+    # LOOKUPS
+    # =========================================================================
+    def id_of(self, symbol):
+        """Stable id of `symbol`, None if it is not in the master."""
+        return self._ids.get(symbol)
+
+    def symbol_of(self, sid):
+        """'NSE:XXX-EQ' for an id, None if unknown (even after a reload)."""
+        if 0 <= sid < len(self._symbols) and self._symbols[sid] is not None:
+            return self._symbols[sid]
+        if self.refresh():
+            return self.symbol_of(sid)
+        return None
+
+    def info(self, sid):
+        """Metadata dict of an id: symbol, tick_size, lot_size, sector, active."""
+        if 0 <= sid < len(self._meta):
+            return self._meta[sid]
+        return None
+
+    def symbols(self, active_only=True):
+        """Symbols in id order."""
+        return [m['symbol'] for m in self._meta if m and (m['active'] or not active_only)]
+
+    # =========================================================================
+    # LOADING
+    # =========================================================================
+    @classmethod
+    def load(cls, client=None):
+        """The master published in Redis; built from the DB (and published) when Redis has none."""
+        pipe = (client or r).pipeline(transaction=True)
+        pipe.get(VERSION_KEY)
+        pipe.hgetall(MASTER_KEY)
+        version, raw = pipe.execute()
+        if version is None:
+            return cls.from_db(publish=True, client=client)
+        rows = [(int(sid), json.loads(meta)) for sid, meta in raw.items()]
+        return cls(rows, int(version))
+
+    @classmethod
+    def from_db(cls, publish=False, client=None):
+        from django.db.models import Max
+        from trading.models import Instrument
+        instruments = Instrument.objects.all()
+        master = cls(
+            [(i.id, instrument_meta(i)) for i in instruments],
+            instruments.aggregate(v=Max('version'))['v'] or 0,
+        )
+        if publish and len(master):
+            master.publish(client)
+        return master
+
+    def publish(self, client=None):
+        """Replace the Redis copy with this master (one MULTI, so readers never see half of it)."""
+        pipe = (client or r).pipeline(transaction=True)
+        pipe.delete(MASTER_KEY)
+        pipe.hset(MASTER_KEY, mapping={sid: json.dumps(meta) for sid, meta in enumerate(self._meta) if meta})
+        pipe.set(VERSION_KEY, self.version)
+        pipe.execute()
+        logger.info(f"Symbol master v{self.version} published ({len(self)} symbols).")
+
+    def refresh(self, client=None):
+        """Reload in place if Redis holds a newer version. Returns True when something changed."""
+        with self._lock:
+            now = time.time()
+            if now - self._last_refresh < REFRESH_INTERVAL:
+                return False
+            self._last_refresh = now
+            try:
+                version = (client or r).get(VERSION_KEY)
+                if version is None or int(version) <= self.version:
+                    return False
+                fresh = SymbolMaster.load(client)
+            except Exception as e:
+                logger.error(f"Symbol master refresh failed: {e}")
+                return False
+            # Swap whole tables: lock-free readers see the old or the new one, never a mix
+            self._symbols, self._meta, self._ids, self.version = fresh._symbols, fresh._meta, fresh._ids, fresh.version
+            logger.info(f"Symbol master reloaded: v{self.version}, {len(self)} symbols.")
+            return True
+
+
+def sync(universe, metadata=None, client=None):
+    """
+    Make the master match `universe` (symbols in the order new ids are handed
+    out) and `metadata` ({symbol: {tick_size, lot_size, sector}}, partial is fine):
+    unknown symbols get the next ids, symbols no longer listed are deactivated.
+    Changed rows take the next version. Publishes to Redis and returns the master.
+    """
+    from django.db import transaction
+    from django.db.models import Max
+    from trading.models import Instrument
+    metadata = metadata or {}
+    universe = list(dict.fromkeys(universe))
+    listed = set(universe)
+    with transaction.atomic():
+        existing = {i.symbol: i for i in Instrument.objects.select_for_update()}
+        version = (Instrument.objects.aggregate(v=Max('version'))['v'] or 0) + 1
+
+        changed = []
+        for instrument in existing.values():
+            before = instrument_meta(instrument)
+            instrument.is_active = instrument.symbol in listed
+            for field, value in metadata.get(instrument.symbol, {}).items():
+                setattr(instrument, field, value)
+            if instrument_meta(instrument) != before:
+                instrument.version = version
+                changed.append(instrument)
+        Instrument.objects.bulk_update(changed, ['tick_size', 'lot_size', 'sector', 'is_active', 'version'])
+
+        # One at a time, so ids follow the universe order on every backend
+        created = [
+            Instrument.objects.create(symbol=s, version=version, **metadata.get(s, {}))
+            for s in universe if s not in existing
+        ]
+    logger.info(f"Symbol master sync: {len(created)} new, {len(changed)} changed.")
+    master = SymbolMaster.from_db()
+    master.publish(client)
+    return master
+
+
+def instrument_meta(instrument):
+    return {
+        'symbol': instrument.symbol, 'tick_size': float(instrument.tick_size), 'lot_size': instrument.lot_size,
+        'sector': instrument.sector, 'active': instrument.is_active,
+    }
+
+
+def decode_symbol(data, master=None):
+    """Symbol of a raw stream entry carrying either b'sid' or b'symbol'; None if it has neither."""
+    sid = data.get(b'sid')
+    if sid is not None:
+        return (master if master is not None else get_master()).symbol_of(int(sid))
+    symbol = data.get(b'symbol')
+    return symbol.decode('utf-8') if symbol is not None else None
+
+
+_master = None
+_master_lock = threading.Lock()
+
+
+def get_master():
+    """Process-wide master, loaded on first use (an empty one if it cannot be loaded yet)."""
+    global _master
+    if _master is None:
+        with _master_lock:
+            if _master is None:
+                try:
+                    _master = SymbolMaster.load()
+                except Exception as e:
+                    logger.error(f"Symbol master unavailable, payloads keep symbol strings: {e}")
+                    _master = SymbolMaster()
+    return _master
@@ -1,3 +1,900 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import asyncio
+import threading
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from collections import Counter
+from types import SimpleNamespace
+from unittest import mock
+import numpy as np
+import fakeredis
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.test import TestCase
+from django.utils import timezone
 
-# Create your tests here.
+from trading.models import GlobalTradingSettings, StrategyTrade, StrategyTradeArchive, Instrument, LiveScanResult
+from trading.query_budget import QueryBudget, QueryBudgetExceeded
+from trading.ring_buffer import RingBuffer
+from trading.backtest import params_from_settings, simulate_symbol, run_backtest
+from trading.sweep import run_sweep
+from trading.candle_store import open_store
+from trading.trade_store import (
+    TradeBook, TradeStore, LIVE_STATUSES, PLACEMENT_CHANNEL, DIRTY_KEY, DASHBOARD_EVENTS_STREAM, ORDER_EVENTS_STREAM, CLOSED_KEY,
+)
+from trading.analytics import ANALYTICS_BUCKETS_KEY, trade_sums, derive, record_closes, rebuild, summary_json
+from trading.risk_engine import PreTradeRiskEngine
+from trading.mtm import MarkToMarket, seed_session, read_portfolio, MTM_PORTFOLIO_KEY, MTM_STALE_AFTER
+from trading.setup_sweeper import expire_stale_setups
+from trading.runner_lease import RunnerLease, RUNNER_KEY
+from trading.socket_rotation import SocketRotator
+from trading.candle_backfill import GapBackfiller
+from trading.dashboard_feed import DashboardHub
+from trading.symbol_master import SymbolMaster, sync, decode_symbol
+from trading.strategy_host import StrategyHost, StrategyPlugin
+from trading.indicators import IndicatorBank, relative_volume
+from trading.accounts import Account, MirrorFanout, MirrorSweeper, RETRY_KEY, RETRY_ATTEMPTS_KEY, RETRY_BACKOFF_MAX
+from trading.profiling import WorkerControl, timed, timers, PROFILE_KEY
+from trading.management.commands.run_algo_worker import (
+    Command, CANDLE_QUERY_BUDGET, TICK_QUERY_BUDGET, ORDER_EVENT_QUERY_BUDGET,
+)
+from trading.management.commands.benchmark_pipeline import Command as PipelineBenchmark
+from trading.management.commands.run_order_socket import OrderUpdateWriter, MirrorUpdateWriter
+from trading.management.commands.run_data_engine import Command as DataEngine
+from trading.management.commands.run_scanner_worker import Command as ScannerWorker
+
+
+def fake_redis():
+    """A private in-memory Redis (Lua included) per test."""
+    return fakeredis.FakeRedis(server=fakeredis.FakeServer())
+
+
+def create_trade(symbol='SBIN', status='PENDING', **fields):
+    return StrategyTrade.objects.create(
+        symbol=symbol, status=status, candle_timestamp=timezone.now(), candle_open=101, candle_high=101.5,
+        candle_low=99, candle_close=99.5, prev_day_low=100, entry_level=98.98, stop_loss=101.52,
+        initial_stop_loss=101.52, target_price=92.6, quantity=10, **fields
+    )
+
+
+class RiskEngineTests(TestCase):
+    def test_quota_is_shared_and_never_overbooked(self):
+        user = User.objects.create(username='trader')
+        settings_db = GlobalTradingSettings.objects.create(
+            user=user, max_trades_per_day=4, max_trades_per_symbol=1, max_open_exposure=150000,
+        )
+        client = fake_redis()
+        first = PreTradeRiskEngine(client, settings_db, daily_block=3, exposure_block=100000)
+        second = PreTradeRiskEngine(client, settings_db, daily_block=3, exposure_block=100000)
+        count = lambda key: int(client.get(key) or 0)
+
+        self.assertEqual(first.check_and_reserve('SBIN', 1, 1000.4), (True, None))
+        self.assertEqual(count(first._daily_key()), 3) # One block
+        self.assertEqual(count(first._symbol_key('SBIN')), 1)
+        self.assertEqual(count(first._exposure_key()), 101001)
+
+        self.assertEqual(second.check_and_reserve('SBIN', 2, 1000), (False, "Symbol Limit Reached"))
+        self.assertEqual(second.check_and_reserve('TCS', 3, 60000), (False, "Exposure Limit Reached"))
+        self.assertEqual(second.check_and_reserve('INFY', 4, 1000), (True, None))
+        self.assertEqual(count(first._daily_key()), 4) # Only what was left under the limit
+
+        # A failed placement hands the units back locally: the retry needs no new reservation
+        first.rollback(1, 'SBIN')
+        self.assertEqual(first.check_and_reserve('SBIN', 5, 1000), (True, None))
+        self.assertEqual(count(first._symbol_key('SBIN')), 1)
+
+        first.close_position(5)
+        first.release_unused()
+        second.release_unused()
+        self.assertEqual(count(first._daily_key()), 2) # The two trades placed
+        self.assertEqual(count(first._exposure_key()), 1000) # INFY, still open
+
+
+
+class MarkToMarketTests(TestCase):
+    def test_open_tick_close_snapshot(self):
+        mtm = MarkToMarket()
+        mtm.open(1, 'SBIN', 10, 100.0)
+        mtm.open(2, 'SBIN', 30, 104.0)
+        mtm.open(1, 'SBIN', 10, 100.0) # Known trade: ignored
+        self.assertFalse(mtm.on_tick('TCS', 50.0))
+        self.assertTrue(mtm.on_tick('SBIN', 102.0))
+        self.assertAlmostEqual(mtm.unrealized, -20.0 + 60.0)
+
+        mtm.close(2, 101.0)
+        mtm.close(2, 90.0) # Already closed: ignored
+        portfolio, positions = mtm.snapshot()
+        self.assertEqual(positions, {'SBIN': {'quantity': 10, 'avg_price': 100.0, 'ltp': 102.0, 'unrealized': -20.0}})
+        self.assertEqual((portfolio['realized'], portfolio['unrealized'], portfolio['total'], portfolio['open_positions']), (90.0, -20.0, 70.0, 1))
+        self.assertFalse(mtm.dirty)
+
+        mtm.close(1, 98.0)
+        self.assertEqual(mtm.snapshot()[1], {})
+        mtm.new_session()
+        self.assertEqual(mtm.realized, 0.0)
+
+    def test_read_portfolio_ignores_missing_stale_and_old_snapshots(self):
+        client = fake_redis()
+        self.assertIsNone(read_portfolio(client))
+        today = timezone.localdate().isoformat()
+        client.hset(MTM_PORTFOLIO_KEY, mapping={'day': today, 'total': -250.5, 'ts': time.time()})
+        self.assertEqual(read_portfolio(client)['total'], -250.5)
+        client.hset(MTM_PORTFOLIO_KEY, 'ts', time.time() - MTM_STALE_AFTER - 1)
+        self.assertIsNone(read_portfolio(client))
+        client.hset(MTM_PORTFOLIO_KEY, mapping={'day': '2000-01-01', 'ts': time.time()})
+        self.assertIsNone(read_portfolio(client))
+
+    def test_seed_counts_closes_the_db_has_not_seen_once(self):
+        store = TradeStore(fake_redis())
+        open_id = store.put(create_trade(status='OPEN', actual_entry_price=99))['id']
+        closed_id = store.put(create_trade(status='OPEN', actual_entry_price=99))['id']
+        flushed_id = create_trade(status='CLOSED', pnl=-15).id # Closed and flushed before Redis forgot it
+        # Closes between the stream tail and the load: in Redis, not yet written behind
+        store.transition(closed_id, 'SBIN', 'OPEN', 'CLOSED', actual_exit_price=97.0, pnl=20.0)
+
+        mtm = MarkToMarket()
+        seed_session(mtm, store)
+        self.assertEqual((list(mtm.positions), mtm.realized, mtm.closed), ([open_id], 5.0, {closed_id, flushed_id}))
+
+        # Fills after the tail are replayed: the close already counted changes nothing
+        mtm.open(closed_id, 'SBIN', 10, 99.0)
+        mtm.close(closed_id, 97.0)
+        mtm.close(open_id, 98.0)
+        self.assertEqual(mtm.realized, 15.0)
+
+class TradeStoreTests(TestCase):
+    def test_transitions_indexes_and_write_behind(self):
+        client = fake_redis()
+        store = TradeStore(client)
+        trade_id = store.put(create_trade())['id']
+        placements = client.pubsub()
+        placements.subscribe(PLACEMENT_CHANNEL)
+        placements.get_message(timeout=1)
+
+        self.assertTrue(store.transition(trade_id, 'SBIN', 'PENDING', 'PENDING_ENTRY'))
+        self.assertFalse(store.transition(trade_id, 'SBIN', 'PENDING', 'PENDING_ENTRY')) # Already claimed
+        self.assertTrue(store.update(trade_id, 'SBIN', None, entry_order_id='OID1'))
+        self.assertEqual(placements.get_message(timeout=1)['data'], f"OID1:{trade_id}".encode())
+        self.assertEqual(store.trades_for_orders(['OID1', 'OID2']), {'OID1': trade_id})
+        self.assertEqual([t['id'] for t in store.load('SBIN', ['PENDING_ENTRY'])], [trade_id])
+
+        self.assertEqual(store.apply([
+            (trade_id, 'SBIN', 'PENDING_ENTRY', 'OPEN', {'actual_entry_price': 98.9}),
+            (trade_id, 'SBIN', 'OPEN', 'CLOSED', {'actual_exit_price': 96.0, 'pnl': 29.0}),
+            (trade_id, 'SBIN', 'OPEN', 'CLOSED', {'pnl': 0}), # Lost race: changes nothing
+        ]), [True, True, False])
+        self.assertEqual(store.load('SBIN', LIVE_STATUSES), [])
+        self.assertGreater(client.ttl(f"trade:{trade_id}"), 0)
+        self.assertEqual(client.xlen(DASHBOARD_EVENTS_STREAM), 5) # put + 4 transitions
+
+        self.assertEqual(store.flush(), 1)
+        row = StrategyTrade.objects.get(id=trade_id)
+        self.assertEqual((row.status, row.entry_order_id, row.actual_entry_price, row.pnl), ('CLOSED', 'OID1', Decimal('98.90'), Decimal('29.00')))
+        self.assertEqual(client.scard(DIRTY_KEY), 0)
+
+        # A second flusher that read the trade while it was still OPEN lands last: the DB keeps CLOSED
+        client.hset(f"trade:{trade_id}", mapping={'status': 'OPEN', 'version': row.version - 1})
+        client.sadd(DIRTY_KEY, trade_id)
+        self.assertEqual(store.flush(), 1)
+        self.assertEqual(StrategyTrade.objects.get(id=trade_id).status, 'CLOSED')
+
+
+
+class AnalyticsTests(TestCase):
+    def test_closes_are_counted_once_and_rebuild_matches(self):
+        client = fake_redis()
+        store = TradeStore(client)
+        created = timezone.localtime().replace(hour=10, minute=5)
+        ids = [create_trade(symbol=symbol, status='OPEN', actual_entry_price=98.9).id for symbol in ('SBIN', 'SBIN', 'TCS')]
+        StrategyTrade.objects.update(created_at=created)
+        trades = list(StrategyTrade.objects.filter(id__in=ids).order_by('id'))
+        for trade in trades:
+            store.put(trade)
+        for trade, pnl in zip(trades, (29.0, -25.4, 0.0)):
+            store.transition(trade.id, trade.symbol, 'OPEN', 'CLOSED', pnl=pnl)
+
+        self.assertEqual(record_closes(store), 3)
+        client.sadd(CLOSED_KEY, trades[0].id) # Listed again (e.g. a retry after a partial failure)
+        self.assertEqual(record_closes(store), 0)
+
+        summary = json.loads(summary_json(client))
+        self.assertEqual(summary['all'], derive({
+            'trades': 3, 'wins': 1, 'pnl': 3.6, 'gross_win': 29.0, 'gross_loss': 25.4,
+            'r_sum': (29.0 - 25.4) / 25.4, 'r_count': 3,
+            'slippage_sum': 0.08 * 3, 'slippage_bps_sum': 0.08 / 98.98 * 10000 * 3, 'slippage_count': 3,
+        }))
+        self.assertEqual(summary['all']['profit_factor'], 1.14)
+        self.assertEqual((summary['by_symbol']['SBIN']['trades'], summary['by_hour']['10']['trades']), (2, 3))
+
+        # The same numbers recomputed from the DB rows
+        StrategyTrade.objects.filter(id__in=[t.id for t in trades]).update(status='CLOSED')
+        for trade, pnl in zip(trades, (29.0, -25.4, 0.0)):
+            StrategyTrade.objects.filter(id=trade.id).update(pnl=pnl)
+        fields = ['symbol', 'pnl', 'entry_level', 'initial_stop_loss', 'quantity', 'actual_entry_price', 'created_at']
+        self.assertEqual(rebuild(client, StrategyTrade.objects.values(*fields)), 3)
+        self.assertEqual(json.loads(summary_json(client)), summary)
+
+class SetupSweeperTests(TestCase):
+    def test_expires_stale_setups_unless_claimed(self):
+        user = User.objects.create(username='trader')
+        settings_db = GlobalTradingSettings.objects.create(user=user, setup_lifetime_minutes=60)
+        store = TradeStore(fake_redis())
+        now = timezone.localtime().replace(hour=11, minute=0, second=0, microsecond=0)
+
+        def setup(minutes_old, in_redis=True):
+            trade = create_trade()
+            StrategyTrade.objects.filter(id=trade.id).update(created_at=now - timedelta(minutes=minutes_old))
+            if in_redis:
+                store.put(trade)
+            return trade.id
+
+        stale, fresh, db_only = setup(90), setup(30), setup(90, in_redis=False)
+        claimed = setup(90)
+        store.transition(claimed, 'SBIN', 'PENDING', 'PENDING_ENTRY') # The execution loop got there first
+
+        self.assertEqual(sorted(expire_stale_setups(store, settings_db, now)), sorted([stale, db_only]))
+        self.assertEqual(dict(StrategyTrade.objects.values_list('id', 'status')), {
+            stale: 'EXPIRED', fresh: 'PENDING', db_only: 'EXPIRED', claimed: 'PENDING',
+        })
+        self.assertEqual(store.get(stale)['status'], 'EXPIRED')
+        self.assertEqual(store.get(claimed)['status'], 'PENDING_ENTRY')
+        self.assertEqual(store.flush(), 1) # Only the claim is left to write back
+
+
+class OrderUpdateWriterTests(TestCase):
+    def test_updates_survive_failures_and_publish_with_their_transition(self):
+        client = fake_redis()
+        store = TradeStore(client)
+        trade_id = store.put(create_trade())['id']
+        store.transition(trade_id, 'SBIN', 'PENDING', 'PENDING_ENTRY', entry_order_id='OID1')
+        writer = OrderUpdateWriter(store)
+        self.assertEqual(dict(writer.order_index), {'OID1': trade_id})
+        events = lambda: [e[b'event'] for _, e in client.xrange(ORDER_EVENTS_STREAM)]
+
+        # A fill that beats its placement waits; an unknown order is dropped after RESOLVE_TIMEOUT
+        writer.submit('OID9', 2, 50.0)
+        writer.process(writer._drain())
+        self.assertIn('OID9', writer.deferred)
+        writer.deferred['OID9'] = (writer.deferred['OID9'][0], time.monotonic() - 3)
+        writer.process(writer._drain())
+        self.assertEqual(writer.deferred, {})
+
+        # Redis fails mid-batch: the fill is kept and applied on the next round
+        writer.submit('OID1', 2, 98.9)
+        with mock.patch.object(store, 'get_many', side_effect=ConnectionError('down')), \
+                mock.patch('trading.management.commands.run_order_socket.RETRY_DELAY', 0):
+            writer.process(writer._drain())
+        self.assertEqual(events(), [])
+        writer.process(writer._drain())
+        self.assertEqual(store.get(trade_id)['status'], 'OPEN')
+        self.assertEqual(events(), [b'FILLED'])
+        writer.process({'OID1': (2, 98.9, time.time())}) # Duplicate: the transition loses, no event
+        self.assertEqual(events(), [b'FILLED'])
+
+        # The exit order is found through the Redis index; a failed analytics write is retried
+        store.transition(trade_id, 'SBIN', 'OPEN', 'PENDING_EXIT', exit_order_id='OID2')
+        writer.submit('OID2', 2, 96.0)
+        with mock.patch('trading.management.commands.run_order_socket.record_closes', side_effect=ConnectionError('down')):
+            writer.process(writer._drain())
+        self.assertEqual((store.get(trade_id)['status'], client.smembers(CLOSED_KEY)), ('CLOSED', {str(trade_id).encode()}))
+        writer.process({})
+        self.assertEqual((client.scard(CLOSED_KEY), client.hget('analytics:all', 'trades')), (0, b'1'))
+        self.assertEqual(events(), [b'FILLED', b'FILLED'])
+        self.assertEqual(writer.order_index['OID2'], trade_id)
+
+
+class SocketRotatorTests(TestCase):
+    def wait_closed(self, sock):
+        deadline = time.monotonic() + 2
+        while not sock.close_connection.called and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return sock.close_connection.called
+
+    def test_data_socket_cuts_over_on_first_message(self):
+        sockets = {}
+        rotator = SocketRotator('data', lambda token, gen: sockets.setdefault(gen, mock.Mock()))
+        rotator.start('token1')
+        self.assertTrue(rotator.accept(1))
+
+        rotator.rotate('token2')
+        self.assertTrue(rotator.is_active(1)) # Subscribed, but nothing received yet: the old one keeps feeding
+        self.assertTrue(rotator.accept(1))
+        self.assertTrue(rotator.accept(2))
+        self.assertTrue(rotator.is_active(2))
+        self.assertFalse(rotator.accept(1))
+        self.assertTrue(self.wait_closed(sockets[1]))
+
+    def test_order_socket_keeps_old_generation_for_grace(self):
+        sockets = {}
+        rotator = SocketRotator('orders', lambda token, gen: sockets.setdefault(gen, mock.Mock()), cut_on_first_message=False, grace=0.2)
+        rotator.start('token1')
+        rotator.rotate('token2')
+        self.assertTrue(rotator.is_active(2))
+        self.assertTrue(rotator.accept(1)) # Updates in flight on the old socket still count
+        self.assertFalse(sockets[1].close_connection.called)
+        self.assertTrue(self.wait_closed(sockets[1]))
+        self.assertFalse(rotator.accept(1))
+
+
+class GapBackfillTests(TestCase):
+    def test_missed_minutes_are_recovered_once(self):
+        now = timezone.localtime().replace(hour=11, minute=0, second=20, microsecond=0).timestamp()
+        now_min = int(now // 60)
+        engine = DataEngine()
+        engine.lock = threading.Lock()
+        engine.candle_map = {'SBIN': {'minute': now_min - 10}} # Partial from before the gap: dropped
+        engine.last_emitted = {'SBIN': now_min - 4, 'TCS': now_min - 1}
+        engine.backfiller = mock.Mock()
+        with mock.patch('trading.management.commands.run_data_engine.time.time', return_value=now):
+            engine.backfill_gaps()
+        gaps = engine.backfiller.submit.call_args[0][0]
+        self.assertEqual(gaps, {'SBIN': [now_min - 3, now_min - 2, now_min - 1]})
+        self.assertEqual(engine.candle_map, {})
+
+        # One history call per symbol; only the missing minutes are emitted, flagged as backfilled
+        history = mock.Mock(return_value={'s': 'ok', 'candles': [
+            [m * 60, 100.0, 101.0, 99.0, 100.5, 1000] for m in range(now_min - 5, now_min)
+        ]})
+        published = []
+        engine.publish_candles = published.extend
+        GapBackfiller(history, engine.emit_backfilled)._run(gaps)
+        history.assert_called_once()
+        self.assertEqual([datetime.fromisoformat(c['ts']).timestamp() // 60 for c in published], gaps['SBIN'])
+        self.assertTrue(all(c['backfilled'] for c in published))
+        self.assertEqual(engine.last_emitted['SBIN'], now_min - 1)
+
+    def test_only_a_fresh_backfilled_candle_sets_up(self):
+        settings_db = GlobalTradingSettings.objects.create(user=User.objects.create(username='trader'))
+        worker = make_worker()
+        prev_day = {'SBIN': {'low': 100.0}}
+
+        def candle(minutes_ago, backfilled):
+            ts = datetime.fromtimestamp((time.time() // 60 - minutes_ago) * 60).isoformat()
+            return {'symbol': 'SBIN', 'open': 101.0, 'high': 101.5, 'low': 99.0, 'close': 99.5,
+                    'volume': 500000, 'ts': ts, 'backfilled': backfilled}
+
+        worker.on_candle(candle(5, True), settings_db, prev_day)
+        self.assertEqual(len(worker.book), 0) # Minutes old: its breakdown is stale
+        worker.on_candle(candle(1, True), settings_db, prev_day)
+        self.assertEqual(len(worker.book), 1) # Just closed
+
+        # The scanner still lists stale breakdowns
+        with mock.patch('trading.management.commands.run_scanner_worker.publish_scan'):
+            ScannerWorker().scan_payload(candle(5, True), prev_day)
+        self.assertEqual(LiveScanResult.objects.count(), 1)
+
+
+class DashboardHubTests(TestCase):
+    def test_late_client_gets_the_snapshot_without_waiting_for_an_event(self):
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        hub = DashboardHub()
+
+        async def woken(client):
+            for _ in range(100):
+                if client.wake.called:
+                    return True
+                await asyncio.sleep(0.01)
+            return False
+
+        async def scenario():
+            first, late = mock.Mock(), mock.Mock()
+            hub.attach(first)
+            self.assertFalse(late.wake.called)
+            first_woken = await woken(first) # By the hub, once its snapshot is in
+            hub.attach(late)
+            late_woken = late.wake.called # Right away: the stream is quiet
+            task = hub.task
+            hub.detach(first)
+            hub.detach(late)
+            await asyncio.gather(task, return_exceptions=True)
+            return first_woken, late_woken
+
+        with mock.patch('trading.dashboard_feed.get_async_redis', return_value=fakeredis.aioredis.FakeRedis(server=fakeredis.FakeServer())), \
+                mock.patch.object(DashboardHub, 'recent_trades', return_value={}):
+            self.assertEqual(loop.run_until_complete(scenario()), (True, True))
+            leftovers = asyncio.all_tasks(loop) # The fake server's blocking XREAD
+            for task in leftovers:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*leftovers, return_exceptions=True))
+        self.assertFalse(hub.ready)
+
+
+class TradesApiTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+        patcher = mock.patch('trading.api_views.r', fake_redis())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_keyset_pages_and_etag(self):
+        now = timezone.now()
+        ids = []
+        for minutes in (1, 2, 2, 3): # Two rows share a created_at
+            trade = create_trade()
+            StrategyTrade.objects.filter(id=trade.id).update(created_at=now - timedelta(minutes=minutes))
+            ids.append(trade.id)
+        archived = create_trade(status='CLOSED')
+        StrategyTradeArchive.objects.create(id=1000, **{
+            f.name: getattr(archived, f.name) for f in StrategyTrade._meta.concrete_fields if f.name != 'id'
+        })
+        archived.delete()
+        StrategyTradeArchive.objects.filter(id=1000).update(created_at=now - timedelta(days=2)) # auto_now_add
+
+        seen, url = [], '/trading/api/trades/?limit=2&fields=id,status'
+        while url:
+            page = self.client.get(url).json()
+            self.assertTrue(all(set(row) == {'id', 'status'} for row in page['results']))
+            seen += [row['id'] for row in page['results']]
+            url = page['next_cursor'] and f"/trading/api/trades/?limit=2&fields=id,status&cursor={page['next_cursor']}"
+        self.assertEqual(seen, [ids[0], ids[2], ids[1], ids[3], 1000])
+
+        first = self.client.get('/trading/api/trades/?limit=2')
+        create_trade() # Served from the cache until it expires
+        again = self.client.get('/trading/api/trades/?limit=2', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual((again.status_code, again['ETag']), (304, first['ETag']))
+        self.assertEqual(self.client.get('/trading/api/trades/?fields=nope').status_code, 400)
+        self.assertEqual(self.client.get('/trading/api/trades/?cursor=bad').status_code, 400)
+
+
+class QueryBudgetTests(TestCase):
+    def test_counts_queries_inside_block(self):
+        budget = QueryBudget('test', 1)
+        with budget.measure() as usage:
+            list(StrategyTrade.objects.all())
+            StrategyTrade.objects.count()
+        self.assertEqual(usage.queries, 2)
+        self.assertEqual(budget.breaches, 1)
+        with self.assertRaises(QueryBudgetExceeded):
+            budget.assert_within(usage)
+
+
+def make_worker():
+    """An algo worker over a local book, with the store and risk engine mocked out."""
+    worker = Command()
+    worker.book = TradeBook()
+    worker.store = mock.Mock()
+    worker.store.put.side_effect = lambda trade: {
+        'id': trade.id, 'symbol': trade.symbol, 'status': trade.status,
+        'entry_level': float(trade.entry_level), 'stop_loss': float(trade.stop_loss),
+        'target_price': float(trade.target_price), 'quantity': trade.quantity,
+        'is_breakeven_moved': False, 'actual_entry_price': None,
+    }
+    worker.store.transition.return_value = True
+    worker.risk = mock.Mock()
+    worker.risk.check_and_reserve.return_value = (True, None)
+    worker.fill_latency = mock.Mock()
+    worker.indicators = IndicatorBank(['SBIN'], 19800)
+    return worker
+
+
+class WorkerQueryBudgetBenchmark(TestCase):
+    """Fails when a hot path starts issuing more SQL than its budget allows."""
+
+    def setUp(self):
+        user = User.objects.create(username='trader')
+        self.settings_db = GlobalTradingSettings.objects.create(user=user)
+        self.worker = make_worker()
+        self.fyers = mock.Mock()
+        self.fyers.place_order.return_value = {'s': 'ok', 'id': 'OID1'}
+
+    def candle(self, symbol='SBIN'):
+        return {b'data': json.dumps({
+            'symbol': symbol, 'open': 101.0, 'high': 101.5, 'low': 99.0, 'close': 99.5,
+            'volume': 500000, 'ts': '2026-01-05T10:15:00',
+        }).encode('utf-8')}
+
+    def test_candle_within_budget(self):
+        budget = QueryBudget('candle', CANDLE_QUERY_BUDGET)
+        with budget.measure() as usage:
+            self.worker.process_candle(self.candle(), self.settings_db, {'SBIN': {'low': 100.0}})
+        self.assertEqual(len(self.worker.book), 1)
+        budget.assert_within(usage)
+
+    def test_tick_within_budget(self):
+        self.worker.process_candle(self.candle(), self.settings_db, {'SBIN': {'low': 100.0}})
+
+        budget = QueryBudget('tick', TICK_QUERY_BUDGET)
+        for ltp in (99.5, 98.5, 98.0): # no trigger, entry trigger, open position monitoring
+            with budget.measure() as usage:
+                self.worker.process_tick({b'symbol': b'SBIN', b'ltp': str(ltp).encode('utf-8')}, self.fyers, self.settings_db)
+            budget.assert_within(usage)
+        self.fyers.place_order.assert_called_once()
+
+    def test_order_event_within_budget(self):
+        self.worker.process_candle(self.candle(), self.settings_db, {'SBIN': {'low': 100.0}})
+        trade_id = next(iter(self.worker.book.by_id))
+
+        budget = QueryBudget('order_event', ORDER_EVENT_QUERY_BUDGET)
+        event = {
+            b'trade_id': str(trade_id).encode('utf-8'), b'order_id': b'OID1', b'leg': b'entry',
+            b'event': b'FILLED', b'price': b'98.9', b'ts': str(time.time()).encode('utf-8'),
+        }
+        with budget.measure() as usage:
+            self.worker.apply_order_event(event)
+        self.assertEqual(self.worker.book.get(trade_id)['status'], 'OPEN')
+        budget.assert_within(usage)
+
+
+class RingBufferTests(TestCase):
+    def test_wakes_consumer_from_producer_thread_and_drops_oldest(self):
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        ring = RingBuffer('test', 3, loop)
+
+        async def consume():
+            threading.Timer(0.05, ring.put, args=('tick',)).start()
+            first = await asyncio.wait_for(ring.get_batch(10), timeout=2)
+            for i in range(5):
+                ring.put(i)
+            return first, await ring.get_batch(10)
+
+        self.assertEqual(loop.run_until_complete(consume()), (['tick'], [2, 3, 4]))
+        self.assertEqual(ring.take_dropped(), 2)
+
+        orders = RingBuffer('orders', None, loop)
+        for i in range(5000):
+            orders.put(i)
+        self.assertEqual(loop.run_until_complete(orders.get_batch(10000)), list(range(5000)))
+        self.assertEqual(orders.take_dropped(), 0)
+
+
+class BacktestTests(TestCase):
+    def test_signal_entry_breakeven_and_stop(self):
+        day1 = 1735788900 # 2025-01-02 09:15 IST
+        day2 = day1 + 86400
+        bars = [
+            (day1, 100.5, 101.0, 100.0, 100.8, 1000),
+            (day2, 101.0, 101.5, 99.0, 99.5, 500000), # breakdown through PDL 100 on 4.97 Cr
+            (day2 + 60, 99.2, 99.3, 98.5, 98.8, 1000), # triggers entry at 98.98
+            (day2 + 120, 98.0, 98.9, 95.5, 96.0, 1000), # 1.25R in favour: stop to breakeven
+            (day2 + 180, 97.0, 99.5, 96.5, 99.0, 1000), # back through entry: stopped flat
+        ]
+        candles = dict(zip(('ts', 'open', 'high', 'low', 'close', 'volume'), (np.array(col) for col in zip(*bars))))
+        params = params_from_settings(GlobalTradingSettings())
+
+        (trade,) = simulate_symbol('NSE:SBIN-EQ', candles, params, 19800)
+        self.assertEqual((trade['status'], trade['exit_reason'], trade['is_breakeven_moved']), ('CLOSED', 'Stop Loss', True))
+        self.assertAlmostEqual(trade['actual_entry_price'], 99.0 * 0.9998)
+        self.assertAlmostEqual(trade['actual_exit_price'], trade['actual_entry_price'])
+        self.assertEqual(trade['pnl'], 0)
+        self.assertEqual(trade['exit_time'], day2 + 240)
+
+
+class SweepTests(TestCase):
+    def test_score_matches_run_backtest(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        store = open_store(root, 19800)
+        rng = np.random.default_rng(7)
+        symbols = ['NSE:SBIN-EQ', 'NSE:TCS-EQ', 'NSE:INFY-EQ', 'NSE:ITC-EQ']
+        day1 = 1735789500 # 2025-01-02 09:15 IST; six sessions of two hours each
+        ts = (day1 + np.arange(6)[:, None] * 86400 + np.arange(120)[None, :] * 60).ravel()
+        for symbol in symbols:
+            close = 100 * np.exp(np.cumsum(rng.normal(0, 0.004, ts.size)))
+            open_ = np.r_[100.0, close[:-1]]
+            store.write_candles(symbol, {
+                'ts': ts, 'open': open_, 'close': close, 'volume': np.full(ts.size, 200000.0),
+                'high': np.maximum(open_, close) * (1 + rng.uniform(0, 0.002, ts.size)),
+                'low': np.minimum(open_, close) * (1 - rng.uniform(0, 0.002, ts.size)),
+            })
+        store.flush()
+
+        base = params_from_settings(GlobalTradingSettings())
+        candidates = [{}, {'risk_reward_ratio': 3.0, 'max_trades_per_day': 2}, {'max_trades_per_symbol': 1}]
+        results, missing = run_sweep(candidates, base, symbols, root, 19800, os.path.join(root, 'sweep.jsonl'), workers=1)
+        self.assertEqual((len(results), missing), (3, []))
+
+        for candidate, result in zip(candidates, results):
+            trades, _ = run_backtest(symbols, dict(base, **candidate), root, 19800, workers=1)
+            totals = Counter()
+            for trade in trades:
+                if trade['status'] == 'CLOSED':
+                    totals.update(trade_sums(trade))
+            expected = derive(totals)
+            self.assertGreater(expected['trades'], 0)
+            self.assertEqual({k: result['metrics'][k] for k in expected}, expected, candidate)
+
+
+class CandleStoreTests(TestCase):
+    def test_round_trip_and_zero_copy_window(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        store = open_store(root, 19800)
+        day1 = 1735789500 # 2025-01-02 09:15 IST
+        ts = np.array([day1, day1 + 60, day1 + 86400 + 120])
+        bars = {'ts': ts, 'open': np.array([1.0, 2.0, 3.0]), 'high': np.array([1.5, 2.5, 3.5]),
+                'low': np.array([0.5, 1.5, 2.5]), 'close': np.array([1.2, 2.2, 3.2]), 'volume': np.array([10.0, 20.0, 30.0])}
+        self.assertEqual(store.write_candles('NSE:SBIN-EQ', bars), 3)
+        store.write_candles('NSE:TCS-EQ', {k: v[:1] for k, v in bars.items()})
+        store.flush()
+
+        self.assertEqual(store.days(), ['2025-01-02', '2025-01-03'])
+        history = store.history('NSE:SBIN-EQ', day1 + 60)
+        self.assertEqual(history['ts'].tolist(), [day1 + 60, day1 + 86400 + 120])
+        self.assertEqual(history['close'].tolist(), [2.2, 3.2])
+
+        window = store.window('2025-01-02', ['NSE:SBIN-EQ', 'NSE:TCS-EQ'], 0, 2)
+        self.assertTrue(np.shares_memory(window['close'], store.day('2025-01-02')['close']))
+        np.testing.assert_array_equal(window['close'], [[1.2, 2.2], [1.2, np.nan]])
+
+    def test_history_skips_a_session_being_created(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        store = open_store(root, 19800)
+        day1 = 1735789500 # 2025-01-02 09:15 IST
+        store.write_candles('NSE:SBIN-EQ', {f: np.array([1.0]) for f in ('open', 'high', 'low', 'close', 'volume')} | {'ts': np.array([day1])})
+        store.flush()
+
+        # store_candles is mid-way through the next session: the directory and open.npy exist, close.npy not yet
+        os.makedirs(os.path.join(root, '2025-01-03'))
+        np.save(os.path.join(root, '2025-01-03', 'open.npy'), np.ones((1, 375)))
+        reader = open_store(root, 19800)
+        self.assertIsNone(reader.day('2025-01-03'))
+        self.assertEqual(reader.history('NSE:SBIN-EQ')['ts'].tolist(), [day1])
+
+
+class SymbolMasterTests(TestCase):
+    def test_ids_stay_stable_across_syncs(self):
+        redis_client = mock.MagicMock()
+        first = sync(['NSE:SBIN-EQ', 'NSE:TCS-EQ'], client=redis_client)
+        sbin, tcs = first.id_of('NSE:SBIN-EQ'), first.id_of('NSE:TCS-EQ')
+
+        second = sync(['NSE:INFY-EQ', 'NSE:SBIN-EQ'], {'NSE:SBIN-EQ': {'lot_size': 5}}, client=redis_client)
+        self.assertEqual(second.id_of('NSE:SBIN-EQ'), sbin)
+        self.assertEqual(second.symbol_of(tcs), 'NSE:TCS-EQ')
+        self.assertGreater(second.id_of('NSE:INFY-EQ'), tcs)
+        self.assertEqual(second.symbols(), ['NSE:SBIN-EQ', 'NSE:INFY-EQ'])
+        self.assertEqual(second.info(sbin)['lot_size'], 5)
+        self.assertEqual(second.version, first.version + 1)
+        self.assertFalse(Instrument.objects.get(symbol='NSE:TCS-EQ').is_active)
+
+        self.assertEqual(decode_symbol({b'sid': str(sbin).encode(), b'ltp': b'1'}, second), 'NSE:SBIN-EQ')
+        self.assertEqual(decode_symbol({b'symbol': b'NSE:ACC-EQ', b'ltp': b'1'}, SymbolMaster()), 'NSE:ACC-EQ')
+
+
+class IndicatorTests(TestCase):
+    def test_streaming_matches_batch_and_replay(self):
+        rng = np.random.default_rng(7)
+        n = 60
+        open_ts = 1735789500 # 2025-01-02 09:15 IST
+        close = 100 + np.cumsum(rng.normal(0, 0.5, n))
+        high, low = close + rng.uniform(0, 1, n), close - rng.uniform(0, 1, n)
+        volume = rng.integers(1000, 5000, n).astype(float)
+
+        live = IndicatorBank(['NSE:SBIN-EQ'], 19800)
+        for m in range(n):
+            live.update([0], open_ts + m * 60, close[m:m + 1], high[m:m + 1], low[m:m + 1], close[m:m + 1], volume[m:m + 1])
+        live.update([0], open_ts, close[:1], high[:1], low[:1], close[:1], volume[:1]) # Replayed candle: ignored
+        self.assertAlmostEqual(live.relative_volume('NSE:SBIN-EQ'), relative_volume(volume)[-1])
+        self.assertAlmostEqual(live.vwap('NSE:SBIN-EQ'), ((high + low + close) / 3 * volume).sum() / volume.sum())
+        self.assertEqual(live.opening_range('NSE:SBIN-EQ'), (high[:15].max(), low[:15].min()))
+
+        # The whole session replayed as one window (warm start) lands in the same state
+        warm = IndicatorBank(['NSE:TCS-EQ', 'NSE:SBIN-EQ'], 19800)
+        window = {f: np.vstack([np.full(n, np.nan), a]) for f, a in
+                  (('open', close), ('high', high), ('low', low), ('close', close), ('volume', volume))}
+        warm.replay(open_ts, ['NSE:TCS-EQ', 'NSE:SBIN-EQ'], window)
+        for bank in (live, warm):
+            bank.on_tick('NSE:SBIN-EQ', 101.0)
+        self.assertEqual(warm.snapshot('NSE:SBIN-EQ'), live.snapshot('NSE:SBIN-EQ'))
+        self.assertTrue(np.isnan(warm.atr('NSE:TCS-EQ')))
+
+
+class StrategyHostTests(TestCase):
+    def test_one_decode_fanned_out_to_every_plugin(self):
+        seen = []
+
+        class Recorder(StrategyPlugin):
+            def on_candle(self, candle):
+                seen.append((self.name, candle))
+
+        class Broken(StrategyPlugin):
+            name = 'broken'
+
+            def on_candle(self, candle):
+                raise ValueError('boom')
+
+        first, second = Recorder(), Recorder()
+        first.name, second.name = 'first', 'second'
+        host = StrategyHost([first, Broken(), second], client=mock.Mock())
+        host.prev_day = {'NSE:SBIN-EQ': {'low': 100.0}}
+        payload = {'symbol': 'NSE:SBIN-EQ', 'open': 101.0, 'high': 101.5, 'low': 99.0, 'close': 99.5,
+                   'volume': 200000, 'ts': '2026-01-05T10:15:00'}
+        handlers = [(p.name, p.on_candle, None) for p in host.subscribers('on_candle')]
+        self.assertEqual(host.subscribers('on_tick'), [])
+
+        with mock.patch('trading.strategy_host.json.loads', wraps=json.loads) as loads:
+            host.dispatch('candle_stream_1m', 'on_candle', {b'data': json.dumps(payload).encode()}, handlers)
+        loads.assert_called_once()
+        self.assertEqual([name for name, _ in seen], ['first', 'second'])
+        self.assertIs(seen[0][1], seen[1][1])
+        self.assertTrue(seen[0][1].breakdown)
+        self.assertEqual(seen[0][1].turnover, 200000 * 99.5)
+        self.assertEqual({key for key in host.cpu.take()}, {
+            ('host', 'decode:candle_stream_1m'), ('host', 'indicators'),
+            ('first', 'on_candle'), ('broken', 'on_candle'), ('second', 'on_candle'),
+        })
+
+
+
+class RunnerLeaseTests(TestCase):
+    def test_second_runner_refuses_to_start(self):
+        client = fake_redis()
+        algo_worker, all_in_one = RunnerLease('algo_worker', client=client), RunnerLease('all_in_one', client=client)
+        self.assertTrue(algo_worker.acquire())
+        self.assertFalse(all_in_one.acquire(wait=0))
+        self.assertTrue(algo_worker.renew())
+        self.assertGreater(client.ttl(RUNNER_KEY), 0)
+
+        all_in_one.release() # Not the holder: changes nothing
+        self.assertTrue(algo_worker.renew())
+        algo_worker.release()
+        self.assertTrue(all_in_one.acquire(wait=0))
+        self.assertFalse(algo_worker.renew()) # Taken over: the old holder must stop
+
+class MirrorFanoutTests(TestCase):
+    def test_signal_reaches_every_account_in_one_order_time(self):
+        placed = []
+
+        def place(account, symbol, qty, side):
+            time.sleep(0.2) # One broker round trip
+            placed.append((account.id, qty, side, time.monotonic()))
+            return f"OID{account.id}"
+
+        accounts = [
+            Account(SimpleNamespace(id=i, app_id=f"APP{i}", quantity_multiplier=Decimal(m)), client=mock.Mock())
+            for i, m in enumerate(('1', '0.5', '2', '0.01'), 1)
+        ]
+        redis_client = mock.MagicMock()
+        redis_client.pipeline.return_value.execute.return_value = [b'5', 1] # claim(): 5 open
+        fanout = MirrorFanout(accounts, place, client=redis_client)
+
+        started = time.monotonic()
+        fanout.entry(7, 'NSE:SBIN-EQ', 10, -1)
+        self.assertLess(time.monotonic() - started, 0.05) # The strategy waits for none of them
+        fanout.exit(7, 'NSE:SBIN-EQ', 1) # Queued behind the entries
+        fanout.pool.shutdown(wait=True)
+
+        entries = [p for p in placed if p[2] == -1]
+        self.assertEqual({a: qty for a, qty, _, _ in entries}, {1: 10, 2: 5, 3: 20, 4: 1})
+        self.assertLess(max(t for *_, t in entries) - started, 0.4) # Not 4 x 0.2s
+        self.assertEqual(sorted((a, qty) for a, qty, side, _ in placed if side == 1), [(1, 5), (2, 5), (3, 5), (4, 5)])
+
+
+    def test_rejected_exit_is_retried_after_the_primary_closes(self):
+        client = fake_redis()
+        store = TradeStore(client)
+        trade_id = store.put(create_trade(symbol='NSE:SBIN-EQ', status='OPEN'))['id']
+        results = iter(['OID1', 'OID2', None, 'OID3']) # Entry, exit (rejected later), failed retry, retry
+        placed = []
+
+        def place(account, symbol, qty, side):
+            placed.append((symbol, qty, side))
+            return next(results)
+
+        account = Account(SimpleNamespace(id=1, app_id='APP1', quantity_multiplier=Decimal('1')), client=mock.Mock())
+        fanout = MirrorFanout([account], place, client=client, workers=1)
+        drain = lambda: fanout.pool.submit(lambda: None).result() # One worker: everything before it is done
+        sweeper = MirrorSweeper(fanout, store)
+        positions = lambda: client.hgetall(f"mirror_positions:{trade_id}")
+
+        fanout.entry(trade_id, 'NSE:SBIN-EQ', 10, -1)
+        fanout.exit(trade_id, 'NSE:SBIN-EQ', 1)
+        drain()
+        self.assertEqual(positions(), {})
+
+        # The primary's exit fills, then the mirror's exit is rejected: no next exit of the trade will come
+        store.transition(trade_id, 'NSE:SBIN-EQ', 'OPEN', 'CLOSED')
+        writer = MirrorUpdateWriter(fanout.ledger)
+        writer.process({(1, 'OID2'): (5, 0.0)})
+        self.assertEqual(positions(), {b'1': b'10'})
+        self.assertEqual(sweeper.sweep(), []) # Not due yet
+
+        later = time.time() + RETRY_BACKOFF_MAX
+        self.assertEqual(sweeper.sweep(later), [trade_id])
+        drain() # This retry fails to place: back on the ledger
+        self.assertEqual(positions(), {b'1': b'10'})
+        self.assertEqual(client.hget(RETRY_ATTEMPTS_KEY, trade_id), b'2') # Rejection + failed retry: longer backoff
+
+        self.assertEqual(sweeper.sweep(later + 1), [trade_id])
+        drain()
+        self.assertEqual(placed[1:], [('NSE:SBIN-EQ', 10, 1)] * 3)
+        self.assertEqual(positions(), {})
+        self.assertEqual(sweeper.sweep(later + RETRY_BACKOFF_MAX + 1), []) # Flat: nothing left to retry
+        self.assertEqual(client.zcard(RETRY_KEY), 0)
+
+    def test_live_trade_is_left_to_its_next_exit(self):
+        client = fake_redis()
+        store = TradeStore(client)
+        trade_id = store.put(create_trade(status='OPEN'))['id']
+        fanout = MirrorFanout([mock.Mock(id=1)], mock.Mock(), client=client)
+        fanout.ledger.restore(trade_id, 1, 10)
+
+        self.assertEqual(MirrorSweeper(fanout, store).sweep(time.time() + RETRY_BACKOFF_MAX), [])
+        fanout.place.assert_not_called()
+        self.assertEqual(client.zcard(RETRY_KEY), 1)
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+class ProfilingTests(TestCase):
+    def test_timers_and_profile_via_control(self):
+        @timed('test_path')
+        def step():
+            time.sleep(0.001)
+
+        for _ in range(20):
+            step()
+        summary = timers.summaries()['test_path']
+        self.assertEqual(summary['n'], 20)
+        self.assertGreaterEqual(summary['p50'], 1.0)
+        self.assertLessEqual(summary['p50'], summary['p99'])
+
+        redis_client = mock.MagicMock()
+        control = WorkerControl('algo_worker', client=redis_client)
+        control.handle({'cmd': 'profile', 'id': 'other', 'worker': 'data_engine', 'seconds': 1})
+        self.assertIsNone(control.profiler) # Addressed to another worker
+
+        stop = threading.Event()
+        worker = threading.Thread(target=busy_loop, args=(stop,), name='busy')
+        worker.start()
+        try:
+            control.handle({'cmd': 'profile', 'id': 'p1', 'seconds': 0.3, 'interval_ms': 5})
+            control.profiler.join(timeout=5)
+        finally:
+            stop.set()
+            worker.join()
+        key, folded = redis_client.set.call_args[0]
+        self.assertEqual(key, PROFILE_KEY.format('p1', 'algo_worker', os.getpid()))
+        lines = folded.splitlines()
+        self.assertTrue(any(line.startswith('busy;') and 'busy_loop (tests.py:' in line for line in lines))
+        self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit() for line in lines)) # 'stack count'
+
+        control.handle({'cmd': 'timers', 'enabled': False})
+        step()
+        self.assertEqual(timers.summaries()['test_path']['n'], 20)
+        timers.enabled = True
+
+
+class PipelineBenchmarkTests(TestCase):
+    def test_baseline_comparison_fails_on_regression_only(self):
+        baseline = {'throughput': {'processed_per_sec': 1000.0}, 'tick_to_order_ms': {'p50': 2.0, 'p99': 10.0}, 'db_queries_per_tick': 0.01}
+        command = PipelineBenchmark(stdout=StringIO())
+        faster = {'throughput': {'processed_per_sec': 1100.0}, 'tick_to_order_ms': {'p50': 1.5, 'p99': 11.0}, 'db_queries_per_tick': 0.01}
+        command.compare(faster, baseline, 0.2)
+
+        slower = dict(faster, tick_to_order_ms={'p50': 1.5, 'p99': 13.0})
+        with self.assertRaisesMessage(CommandError, 'tick_to_order_ms.p99'):
+            command.compare(slower, baseline, 0.2)
+
+
+class TradeArchiveTests(TestCase):
+    def make_trade(self, status, days_ago):
+        trade = create_trade(status=status)
+        created = timezone.now() - timedelta(days=days_ago)
+        StrategyTrade.objects.filter(id=trade.id).update(created_at=created)
+        return trade.id, created
+
+    def test_archive_moves_finished_past_trades_only(self):
+        old_closed, created = self.make_trade('CLOSED', 2)
+        old_open, _ = self.make_trade('OPEN', 2)
+        today_closed, _ = self.make_trade('CLOSED', 0)
+
+        call_command('archive_trades', stdout=StringIO())
+
+        self.assertEqual(set(StrategyTrade.objects.values_list('id', flat=True)), {old_open, today_closed})
+        archived = StrategyTradeArchive.objects.get()
+        self.assertEqual((archived.id, archived.created_at), (old_closed, created))
+
+        history = StrategyTrade.history.combined(symbol='SBIN').order_by('-created_at')
+        self.assertEqual([t.id for t in history][-1], old_closed)
+        self.assertEqual(StrategyTrade.history.combined(status='CLOSED').count(), 2)
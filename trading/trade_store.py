@@ -0,0 +1,441 @@
+"""
+Redis-first StrategyTrade state.
+
+Live trades are held authoritatively in Redis hashes (`trade:<id>`) and indexed
+per symbol and status (`trades:<STATUS>:<SYMBOL>` sets). Every lifecycle
+transition is a single Lua script call that checks the expected status, so the
+tick path never takes a DB row lock. Changed ids are marked in `trades_dirty`
+and a write-behind thread flushes them to the SQL database with bulk_update.
+Every transition bumps the hash's `version`; the flusher only writes a row
+whose stored version is older, so concurrent flushers can never put an older
+state back over a newer one.
+
+The DB row is still created first (it owns the primary key); after that Redis
+is the source of truth until the trade reaches a terminal status and has been
+flushed.
+"""
+import time
+import logging
+import threading
+from decimal import Decimal
+from django.db import connections, transaction
+from trading.models import StrategyTrade
+
+logger = logging.getLogger('trade_store')
+
+LIVE_STATUSES = ('PENDING', 'PENDING_ENTRY', 'OPEN', 'PENDING_EXIT')
+TERMINAL_TTL = 86400 # Closed trades stay readable in Redis for a day
+
+DIRTY_KEY = "trades_dirty"
+ORDER_INDEX_KEY = "trade_orders"
+PLACEMENT_CHANNEL = "order_placements" # '<order_id>:<trade_id>' published whenever an order id is recorded
+ORDER_EVENTS_STREAM = "order_events" # Fills, rejections and cancels published by the order socket
+ORDER_EVENTS_MAXLEN = 10000
+DASHBOARD_EVENTS_STREAM = "dashboard_events" # Trade ids that changed and scan hits, for the live dashboard
+DASHBOARD_EVENTS_MAXLEN = 5000
+CLOSED_KEY = "trades_closed" # Closed trades not yet counted into the analytics (see trading.analytics)
+
+FLOAT_FIELDS = ('entry_level', 'stop_loss', 'initial_stop_loss', 'target_price', 'actual_entry_price', 'actual_exit_price', 'pnl')
+INT_FIELDS = ('id', 'quantity', 'version')
+BOOL_FIELDS = ('is_breakeven_moved',)
+
+# Fields the write-behind flusher copies back to the DB
+PERSISTED_FIELDS = [
+    'status', 'entry_order_id', 'exit_order_id', 'actual_entry_price', 'actual_exit_price',
+    'stop_loss', 'is_breakeven_moved', 'pnl', 'exit_reason', 'version',
+]
+
+# KEYS[1] trade hash, KEYS[2] dirty set, KEYS[3] order index, KEYS[4] dashboard events stream,
+# KEYS[5..8] the symbol's PENDING, PENDING_ENTRY, OPEN and PENDING_EXIT sets (see _transition_keys),
+# KEYS[9] order events stream, KEYS[10] closed trades awaiting analytics
+# ARGV[1] trade id, ARGV[2] expected status ('' = any), ARGV[3] new status ('' = unchanged)
+# ARGV[4] TTL for terminal trades (order index keeps twice that), ARGV[5] placement channel,
+# ARGV[6] dashboard stream MAXLEN, ARGV[7] order events MAXLEN, ARGV[8] n = number of order event
+# values, ARGV[9..8+n] order event field/value pairs (n = 0: none), then the trade field/value pairs.
+# Returns 1 on success, 0 if the trade is missing or in another status.
+# Recording an entry/exit order id also publishes '<order_id>:<trade_id>' on the placement channel.
+# Every successful call bumps the trade's version, notifies the dashboard, and publishes its order
+# event (if any) in the same step. A move to CLOSED also lists the trade for the analytics.
+TRANSITION_LUA = """
+local sets = {PENDING=KEYS[5], PENDING_ENTRY=KEYS[6], OPEN=KEYS[7], PENDING_EXIT=KEYS[8]}
+local current = redis.call('HGET', KEYS[1], 'status')
+if not current then
+    return 0
+end
+if ARGV[2] ~= '' and current ~= ARGV[2] then
+    return 0
+end
+
+local new_status = ARGV[3]
+if new_status ~= '' and new_status ~= current then
+    if sets[current] then
+        redis.call('SREM', sets[current], ARGV[1])
+    end
+    redis.call('HSET', KEYS[1], 'status', new_status)
+    if sets[new_status] then
+        redis.call('SADD', sets[new_status], ARGV[1])
+    else
+        redis.call('EXPIRE', KEYS[1], ARGV[4])
+    end
+    if new_status == 'CLOSED' then
+        redis.call('SADD', KEYS[10], ARGV[1])
+    end
+end
+
+local event_end = 8 + tonumber(ARGV[8])
+for i = event_end + 1, #ARGV, 2 do
+    redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+    if (ARGV[i] == 'entry_order_id' or ARGV[i] == 'exit_order_id') and ARGV[i + 1] ~= '' then
+        redis.call('HSET', KEYS[3], ARGV[i + 1], ARGV[1])
+        redis.call('EXPIRE', KEYS[3], ARGV[4] * 2)
+        redis.call('PUBLISH', ARGV[5], ARGV[i + 1] .. ':' .. ARGV[1])
+    end
+end
+
+redis.call('HINCRBY', KEYS[1], 'version', 1)
+redis.call('SADD', KEYS[2], ARGV[1])
+redis.call('XADD', KEYS[4], 'MAXLEN', '~', ARGV[6], '*', 'kind', 'trade', 'id', ARGV[1])
+if event_end > 8 then
+    local event = {}
+    for i = 9, event_end do
+        table.insert(event, ARGV[i])
+    end
+    redis.call('XADD', KEYS[9], 'MAXLEN', '~', ARGV[7], '*', unpack(event))
+end
+return 1
+"""
+
+def _encode(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    return str(value)
+
+
+def decode_trade(raw):
+    """HGETALL reply (dict or flat list of bytes) -> dict with typed values."""
+    if isinstance(raw, list):
+        raw = dict(zip(raw[0::2], raw[1::2]))
+    trade = {}
+    for k, v in raw.items():
+        key = k.decode('utf-8') if isinstance(k, bytes) else k
+        val = v.decode('utf-8') if isinstance(v, bytes) else v
+        if key in FLOAT_FIELDS:
+            trade[key] = float(val) if val != '' else None
+        elif key in INT_FIELDS:
+            trade[key] = int(val)
+        elif key in BOOL_FIELDS:
+            trade[key] = val == '1'
+        else:
+            trade[key] = val if val != '' else None
+    return trade
+
+
+def _trade_key(trade_id):
+    return f"trade:{trade_id}"
+
+
+def _status_key(status, symbol):
+    return f"trades:{status}:{symbol}"
+
+
+def _transition_keys(trade_id, symbol):
+    """Every key TRANSITION_LUA may write, in its KEYS order."""
+    return [_trade_key(trade_id), DIRTY_KEY, ORDER_INDEX_KEY, DASHBOARD_EVENTS_STREAM] + [
+        _status_key(status, symbol) for status in LIVE_STATUSES
+    ] + [ORDER_EVENTS_STREAM, CLOSED_KEY]
+
+
+def _transition_args(trade_id, expected, new_status, fields, event=None):
+    event_args = [_encode(x) for k, v in (event or {}).items() for x in (k, v)]
+    args = [
+        trade_id, expected or '', new_status or '', TERMINAL_TTL, PLACEMENT_CHANNEL,
+        DASHBOARD_EVENTS_MAXLEN, ORDER_EVENTS_MAXLEN, len(event_args),
+    ] + event_args
+    for k, v in fields.items():
+        args.extend([k, _encode(v)])
+    return args
+
+
+class TradeStore:
+    """Authoritative trade state in Redis. All methods are safe to call from any thread."""
+
+    def __init__(self, r):
+        self.r = r
+        self._transition = r.register_script(TRANSITION_LUA)
+
+    # --- Writes ---
+    def put(self, trade, pipe=None):
+        """Mirror a StrategyTrade row into Redis (creation and recovery). Returns the stored state."""
+        mapping = {
+            'id': trade.id, 'symbol': trade.symbol, 'status': trade.status,
+            'entry_level': trade.entry_level, 'stop_loss': trade.stop_loss, 'initial_stop_loss': trade.initial_stop_loss,
+            'target_price': trade.target_price, 'quantity': trade.quantity,
+            'entry_order_id': trade.entry_order_id, 'exit_order_id': trade.exit_order_id,
+            'actual_entry_price': trade.actual_entry_price, 'actual_exit_price': trade.actual_exit_price,
+            'is_breakeven_moved': trade.is_breakeven_moved, 'pnl': trade.pnl,
+            'exit_reason': trade.exit_reason, 'version': trade.version,
+            'created_at': trade.created_at.isoformat() if trade.created_at else '',
+        }
+        encoded = {k: _encode(v) for k, v in mapping.items()}
+        p = pipe or self.r.pipeline(transaction=True)
+        p.hset(_trade_key(trade.id), mapping=encoded)
+        if trade.status in LIVE_STATUSES:
+            p.sadd(_status_key(trade.status, trade.symbol), trade.id)
+        for oid in (trade.entry_order_id, trade.exit_order_id):
+            if oid:
+                p.hset(ORDER_INDEX_KEY, oid, trade.id)
+        p.xadd(DASHBOARD_EVENTS_STREAM, {'kind': 'trade', 'id': trade.id}, maxlen=DASHBOARD_EVENTS_MAXLEN, approximate=True)
+        if pipe is None:
+            p.execute()
+        return decode_trade(encoded)
+
+    def transition(self, trade_id, symbol, expected, new_status=None, **fields):
+        """
+        Atomically move a trade from `expected` to `new_status` and set `fields`.
+        Returns False (and changes nothing) if the trade is no longer in `expected`.
+        """
+        result = self._transition(keys=_transition_keys(trade_id, symbol), args=_transition_args(trade_id, expected, new_status, fields))
+        return result == 1
+
+    def update(self, trade_id, symbol, expected, **fields):
+        """Set fields without changing status (e.g. breakeven move)."""
+        return self.transition(trade_id, symbol, expected, None, **fields)
+
+    def apply(self, changes, events=None):
+        """
+        Pipelined batch of transitions: changes = [(trade_id, symbol, expected, new_status, fields), ...].
+        `events` (same order) are order_events entries, each published only if its transition succeeds.
+        Returns a list of booleans in the same order.
+        """
+        if not changes:
+            return []
+        pipe = self.r.pipeline(transaction=False)
+        for (trade_id, symbol, expected, new_status, fields), event in zip(changes, events or [None] * len(changes)):
+            self._transition(
+                keys=_transition_keys(trade_id, symbol), args=_transition_args(trade_id, expected, new_status, fields, event),
+                client=pipe,
+            )
+        return [result == 1 for result in pipe.execute()]
+
+    def transition_many(self, trades, expected, new_status, **fields):
+        """Pipelined transition of many trades, given as (trade_id, symbol) pairs. Returns the ids that actually moved."""
+        results = self.apply([(tid, symbol, expected, new_status, fields) for tid, symbol in trades])
+        return [tid for (tid, _), ok in zip(trades, results) if ok]
+
+    def mark_clean(self, trade_ids):
+        """Drop ids from the dirty set once the caller has written them to the DB itself."""
+        if trade_ids:
+            self.r.srem(DIRTY_KEY, *trade_ids)
+
+    # --- Reads ---
+    def get(self, trade_id):
+        raw = self.r.hgetall(_trade_key(trade_id))
+        return decode_trade(raw) if raw else None
+
+    def load(self, symbol, statuses):
+        """All live trades of `symbol` in `statuses`: SUNION of the status sets, then one pipelined read."""
+        ids = sorted(int(tid) for tid in self.r.sunion([_status_key(s, symbol) for s in statuses]))
+        return list(self.get_many(ids).values())
+
+    def get_many(self, trade_ids):
+        """{trade_id: trade} for the ids that exist, in one round trip."""
+        pipe = self.r.pipeline(transaction=False)
+        for tid in trade_ids:
+            pipe.hgetall(_trade_key(tid))
+        return {tid: decode_trade(raw) for tid, raw in zip(trade_ids, pipe.execute()) if raw}
+
+    def known(self, trade_ids):
+        """Subset of trade_ids that have a hash in Redis."""
+        if not trade_ids:
+            return set()
+        pipe = self.r.pipeline(transaction=False)
+        for tid in trade_ids:
+            pipe.exists(_trade_key(tid))
+        return {tid for tid, found in zip(trade_ids, pipe.execute()) if found}
+
+    def trade_for_order(self, order_id):
+        tid = self.r.hget(ORDER_INDEX_KEY, order_id)
+        return int(tid) if tid else None
+
+    def trades_for_orders(self, order_ids):
+        """{order_id: trade_id} for the order ids present in the index."""
+        if not order_ids:
+            return {}
+        tids = self.r.hmget(ORDER_INDEX_KEY, order_ids)
+        return {oid: int(tid) for oid, tid in zip(order_ids, tids) if tid}
+
+    def order_index(self):
+        """Full order_id -> trade_id map (used to seed in-memory indexes)."""
+        return {k.decode('utf-8'): int(v) for k, v in self.r.hgetall(ORDER_INDEX_KEY).items()}
+
+    # =========================================================================
+    # WRITE-BEHIND & RECOVERY
+    # =========================================================================
+    def flush(self, batch_size=200):
+        """
+        Persist dirty trades to the DB with bulk_update. Returns the number of trades read
+        (rows already holding a newer version are skipped, not rewritten).
+
+        The algo worker and the order socket both flush. SPOP alone does not order
+        them: one flusher may pop and read a trade as OPEN, the trade closes and the
+        other flusher writes CLOSED first. The rows are therefore locked and only
+        written where the DB version is older than the state read from Redis.
+        """
+        ids = self.r.spop(DIRTY_KEY, batch_size)
+        if not ids:
+            return 0
+
+        pipe = self.r.pipeline(transaction=False)
+        for tid in ids:
+            pipe.hgetall(_trade_key(int(tid)))
+        rows = pipe.execute()
+
+        objs = []
+        for raw in rows:
+            if not raw:
+                continue
+            state = decode_trade(raw)
+            obj = StrategyTrade(id=state['id'])
+            for field in PERSISTED_FIELDS:
+                value = state.get(field)
+                if field in FLOAT_FIELDS and value is not None:
+                    value = Decimal(str(value)).quantize(Decimal('0.01'))
+                setattr(obj, field, value)
+            obj.version = obj.version or 0
+            objs.append(obj)
+
+        try:
+            with transaction.atomic():
+                stored = dict(
+                    StrategyTrade.objects.select_for_update()
+                    .filter(id__in=[o.id for o in objs]).values_list('id', 'version')
+                )
+                newer = [o for o in objs if o.id in stored and o.version > stored[o.id]]
+                StrategyTrade.objects.bulk_update(newer, PERSISTED_FIELDS)
+        except Exception:
+            # Put them back so the next flush retries
+            self.r.sadd(DIRTY_KEY, *ids)
+            raise
+        return len(objs)
+
+    def recover(self):
+        """
+        Startup: flush anything Redis holds that the DB hasn't seen, then seed
+        Redis with live DB trades it doesn't know about. Never overwrites Redis state.
+        """
+        while self.flush():
+            pass
+
+        trades = list(StrategyTrade.objects.filter(status__in=LIVE_STATUSES))
+        known = self.known([t.id for t in trades])
+
+        pipe = self.r.pipeline(transaction=False)
+        missing = [t for t in trades if t.id not in known]
+        for t in missing:
+            self.put(t, pipe=pipe)
+        if missing:
+            pipe.execute()
+        logger.info(f"Trade Store: {len(trades)} live trades in DB, {len(missing)} restored to Redis.")
+
+
+def decode_order_event(data):
+    """order_events stream entry -> dict (trade_id, order_id, leg, event, price, ts)."""
+    event = {k.decode('utf-8'): v.decode('utf-8') for k, v in data.items()}
+    event['trade_id'] = int(event['trade_id'])
+    event['price'] = float(event['price'])
+    event['ts'] = float(event['ts'])
+    return event
+
+
+class TradeBook:
+    """
+    In-process mirror of live trades, keyed by symbol.
+
+    Each worker keeps its own book current from its own transitions, from
+    order_events and from the sweeper, so hot paths read no shared state. A
+    transition that fails in Redis means the book is stale for that trade:
+    call refresh() to re-read it.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.by_id = {}
+        self.by_symbol = {}
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def load(self, store):
+        """Seed from the store: live ids come from the DB (just flushed by recover()), state from Redis."""
+        ids = list(StrategyTrade.objects.filter(status__in=LIVE_STATUSES).values_list('id', flat=True))
+        for trade in store.get_many(ids).values() if ids else []:
+            self.add(trade)
+
+    def add(self, trade):
+        if trade.get('status') not in LIVE_STATUSES:
+            self.remove(trade['id'])
+            return
+        with self.lock:
+            self.by_id[trade['id']] = trade
+            self.by_symbol.setdefault(trade['symbol'], {})[trade['id']] = trade
+
+    def remove(self, trade_id):
+        with self.lock:
+            trade = self.by_id.pop(trade_id, None)
+            if trade:
+                trades = self.by_symbol.get(trade['symbol'], {})
+                trades.pop(trade_id, None)
+                if not trades:
+                    self.by_symbol.pop(trade['symbol'], None)
+
+    def set(self, trade_id, **fields):
+        """Apply a successful transition locally. Terminal statuses drop the trade."""
+        if fields.get('status') and fields['status'] not in LIVE_STATUSES:
+            self.remove(trade_id)
+            return
+        with self.lock:
+            trade = self.by_id.get(trade_id)
+            if trade:
+                trade.update(fields)
+
+    def get(self, trade_id):
+        with self.lock:
+            trade = self.by_id.get(trade_id)
+            return dict(trade) if trade else None
+
+    def for_symbol(self, symbol):
+        """Snapshot of the symbol's live trades (safe to iterate while other threads update)."""
+        with self.lock:
+            return [dict(t) for t in self.by_symbol.get(symbol, {}).values()]
+
+    def refresh(self, store, trade_id):
+        trade = store.get(trade_id)
+        if trade:
+            self.add(trade)
+        else:
+            self.remove(trade_id)
+
+
+class TradeWriteBehind(threading.Thread):
+    """Background thread flushing dirty trades to the DB every `interval` seconds."""
+
+    def __init__(self, store, interval=1.0):
+        super().__init__(name='trade_write_behind', daemon=True)
+        self.store = store
+        self.interval = interval
+
+    def run(self):
+        try:
+            while True:
+                try:
+                    written = self.store.flush()
+                    if written:
+                        logger.debug(f"Write-behind: {written} trades persisted.")
+                        continue # Drain backlog without sleeping
+                except Exception as e:
+                    logger.error(f"Write-behind flush failed: {e}")
+                time.sleep(self.interval)
+        finally:
+            connections.close_all()
@@ -1,6 +1,6 @@
 from django.urls import path
 from django.contrib.auth import views as auth_views
-from . import views
+from . import views, api_views
 
 app_name = 'trading'
 
@@ -15,6 +15,12 @@ urlpatterns = [
     # --- Main Interface ---
     # The dashboard view handles both displaying data and processing manual commands (like Square Off)
     path('dashboard/', views.dashboard_view, name='dashboard'),
+    path('analytics/', views.analytics_view, name='analytics'),
+
+    # --- Read-only JSON API (keyset pagination, Redis-cached) ---
+    path('api/trades/', api_views.trades_api, name='api_trades'),
+    path('api/scans/', api_views.scans_api, name='api_scans'),
+    path('api/positions/', api_views.positions_api, name='api_positions'),
     path('fyers/callback/', views.fyers_callback_view, name='fyers_callback'),
 
     # --- Fyers OAuth Flow ---
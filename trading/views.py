@@ -116,6 +116,7 @@
 
 #     return redirect('trading:dashboard')
 import urllib.parse
+from django.http import HttpResponse
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
@@ -123,6 +124,9 @@ from django.conf import settings
 from .models import FyersCredentials, StrategyTrade, LiveScanResult, GlobalTradingSettings
 from .forms import GlobalSettingsForm
 from .fyers_auth_util import generate_auth_url, exchange_auth_code_for_token
+from .redis_client import r
+from .trade_store import TradeStore
+from .analytics import summary_json
 
 def superuser_required(function=None):
     return user_passes_test(lambda u: u.is_active and u.is_superuser)(function)
@@ -156,10 +160,9 @@ def dashboard_view(request):
             trade_id = request.POST.get('trade_id')
             try:
                 trade = StrategyTrade.objects.get(id=trade_id)
-                trade.status = 'PENDING_EXIT'
-                trade.exit_reason = 'Manual Square Off'
-                trade.save()
-                messages.warning(request, f"Square Off Triggered: {trade.symbol}")
+                # Live state is owned by the Redis trade store; the DB row follows via write-behind
+                if TradeStore(r).transition(trade.id, trade.symbol, 'OPEN', 'PENDING_EXIT', exit_reason='Manual Square Off'):
+                    messages.warning(request, f"Square Off Triggered: {trade.symbol}")
             except StrategyTrade.DoesNotExist:
                 pass
             return redirect('trading:dashboard')
@@ -171,7 +174,8 @@ def dashboard_view(request):
         encoded_callback = urllib.parse.quote(callback_url, safe='')
         auth_url = f"https://api.fyers.in/api/v3/generate-authcode?client_id={creds.app_id}&redirect_uri={encoded_callback}&response_type=code&state=sample_state"
 
-    trades = StrategyTrade.objects.all().order_by('-created_at')[:20]
+    # Hot table + archive: the list stays complete right after the nightly archive run
+    trades = StrategyTrade.history.combined().order_by('-created_at')[:20]
     scans = LiveScanResult.objects.all()[:10]
 
     context = { 'credentials': creds, 'auth_url': auth_url, 'callback_url': callback_url, 'settings_form': form, 'trades': trades, 'scans': scans }
@@ -198,4 +202,10 @@ def fyers_callback_view(request):
     else:
         messages.error(request, "Token Exchange Failed.")
 
-    return redirect('trading:dashboard')
\ No newline at end of file
+    return redirect('trading:dashboard')
+
+@login_required
+@superuser_required
+def analytics_view(request):
+    """Win rate, average R, slippage and P&L (overall, by symbol, by hour) from the pre-aggregated counters."""
+    return HttpResponse(summary_json(r), content_type='application/json')